@@ -0,0 +1,94 @@
+"""
+Prompt size per turn of the Investigate Layouts chat over a scripted
+investigation, with the whole conversation and every model name in the
+prompt (buffer), and with the bounded context of layout_chat (window), for
+catalogs scaled up with renamed copies of the units. Tokens are estimated at
+CHARS_PER_TOKEN characters each, without the format instructions, which are
+the same in both.
+
+    python bench/chat_context.py --turns 20 --rooms 4 --catalog-scale 1 10
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from standins import LAYER_DIR, ROOT
+
+sys.path.insert(0, str(LAYER_DIR))
+sys.path.insert(0, str(ROOT / 'src' / 'frontend'))
+import layout_chat  # noqa: E402
+import unit_catalog  # noqa: E402
+
+CHARS_PER_TOKEN = 4
+
+
+def scaled_catalog(scale):
+    records = unit_catalog.load_catalog().records
+    copies = []
+    for copy in range(scale):
+        records = records.copy()
+        if copy:
+            records['unit'] = [f'{name}-{copy}' for name in unit_catalog.load_catalog().records['unit']]
+        copies.append(records)
+    return unit_catalog.UnitCatalog(np.concatenate(copies))
+
+
+def script(turns, catalog, rooms):
+    """
+    The human describes the rooms, then keeps correcting them one at a time.
+    :return: list, the human replies and the AI replies with their notes
+    """
+    names = catalog.names()
+    exchanges, collected = [], {}
+    for turn in range(turns):
+        room = f'room {turn % rooms + 1}'
+        unit = names[(7 * turn) % len(names)]
+        collected[room] = f'{room}: {12 + turn} m2, {unit}'
+        human = f'The {room} is {12 + turn} square meters and has a {unit.lower().replace("-", " ")} installed.'
+        ai = (f'<notes>{"; ".join(collected.values())}</notes>\nNoted, {room} has a {unit}. '
+              f'What is the name and the area of the next room, and which AC units does it have?')
+        exchanges.append((human, ai))
+    return exchanges
+
+
+def history(exchanges):
+    return '\n'.join(f'Human: {human}\nAI: {ai}' for (human, ai) in exchanges)
+
+
+def prompt(strategy, catalog, exchanges, turn):
+    (question, _) = exchanges[turn]
+    if strategy == 'buffer':
+        past, units = exchanges[:turn], str(catalog.names())
+    else:
+        past = [(human, layout_chat.strip_notes(ai)) for (human, ai) in exchanges[max(0, turn - layout_chat.MEMORY_TURNS):turn]]
+        if past:
+            past[-1] = exchanges[turn - 1]
+        units = layout_chat.relevant_units(catalog, question)
+    return layout_chat.TEMPLATE.format(
+        secret_word=layout_chat.SECRET_WORD, format_instructions='',
+        units=units, history=history(past), input=question,
+    )
+
+
+def main(args):
+    for scale in args.catalog_scale:
+        catalog = scaled_catalog(scale)
+        exchanges = script(args.turns, catalog, args.rooms)
+        print(f"catalog of {len(catalog)} units, {args.turns} turns about {args.rooms} rooms")
+        for strategy in ['buffer', 'window']:
+            began = time.perf_counter()
+            tokens = [len(prompt(strategy, catalog, exchanges, turn)) / CHARS_PER_TOKEN for turn in range(args.turns)]
+            seconds = (time.perf_counter() - began) / args.turns
+            shown = ', '.join(f'{turn + 1}: {tokens[turn]:5.0f}' for turn in [1, 4, 9, args.turns - 1] if turn < args.turns)
+            print(f"  {strategy:6}  prompt tokens at turn {shown}  total {sum(tokens):7.0f}  "
+                  f"{1e3 * seconds:5.2f} ms/turn to build")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=20)
+    parser.add_argument('--rooms', type=int, default=4)
+    parser.add_argument('--catalog-scale', type=int, nargs='+', default=[1, 10])
+    main(parser.parse_args())
@@ -0,0 +1,211 @@
+"""
+Compare the ways the code base obtained its DynamoDB handles with the shared
+handles of aws_clients, against a local DynamoDB endpoint answering after
+--latency milliseconds:
+
+- per-call: a new boto3 resource for every request, as insert-jobs-notes.py
+  and the dashboard fallback did
+- default: one boto3 resource with the default configuration
+- shared: aws_clients.resource
+
+reporting the cold start of a fresh interpreter (import, handle creation and
+first request), the latency of sequential GetItem calls, and the wall time
+and connections opened by --concurrency concurrent UpdateItem calls, the
+writes of dynamodb_writes.
+
+    python bench/client_reuse.py --cold 5 --calls 200 --latency 2
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.request import urlopen
+
+from standins import LAYER_DIR
+
+sys.path.insert(0, str(LAYER_DIR))
+import aws_clients  # noqa: E402
+
+PATTERNS = ['per-call', 'default', 'shared']
+TABLE = 'SensorDatabaseTable'
+ITEM = {'id': {'S': '0'}, 'temperature': {'N': '25.5'}, 'timestamp': {'N': '1700000000'}}
+
+
+class Endpoint(BaseHTTPRequestHandler):
+    """
+    Answers GetItem with ITEM and any other operation with an empty result,
+    over keep-alive connections.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Small responses would otherwise wait for delayed ACKs
+    disable_nagle_algorithm = True
+    latency = 0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with Endpoint.lock:
+            Endpoint.connections += 1
+
+    def do_GET(self):
+        body = str(Endpoint.connections).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        operation = self.headers.get('X-Amz-Target', '').split('.')[-1]
+        body = json.dumps({'Item': ITEM} if operation == 'GetItem' else {}).encode('utf-8')
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-amzn-RequestId', 'bench')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(latency):
+    # The child process: the endpoint, apart so that it does not take the GIL
+    # from the clients
+    Endpoint.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Endpoint)
+    server.daemon_threads = True
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+def start_endpoint(latency):
+    process = subprocess.Popen(
+        [sys.executable, __file__, '--serve', '--latency', str(latency)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    return process, f'http://127.0.0.1:{process.stdout.readline().strip()}'
+
+
+def connections(endpoint_url):
+    with urlopen(endpoint_url) as response:
+        return int(response.read())
+
+
+def table_getter(pattern, endpoint_url):
+    """
+    :return: callable, returns the Table handle of a request under the pattern
+    """
+    import boto3
+    if pattern == 'per-call':
+        return lambda: boto3.resource('dynamodb', endpoint_url=endpoint_url).Table(TABLE)
+    if pattern == 'default':
+        table = boto3.resource('dynamodb', endpoint_url=endpoint_url).Table(TABLE)
+    else:
+        table = aws_clients.resource('dynamodb', endpoint_url).Table(TABLE)
+    return lambda: table
+
+
+def cold(pattern, endpoint_url):
+    # The child process: time a cold start like a Lambda initialization
+    started = time.perf_counter()
+    import boto3  # noqa: F401
+    imported = time.perf_counter()
+    get_table = table_getter(pattern, endpoint_url)
+    table = get_table()
+    created = time.perf_counter()
+    table.get_item(Key={'id': '0'})
+    print(json.dumps({
+        'import': 1000 * (imported - started),
+        'create': 1000 * (created - imported),
+        'first': 1000 * (time.perf_counter() - created),
+    }))
+
+
+def cold_starts(pattern, endpoint_url, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', pattern, '--endpoint', endpoint_url],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output))
+    return {key: statistics.median(result[key] for result in results) for key in results[0]}
+
+
+def sequential(get_table, calls):
+    durations = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        get_table().get_item(Key={'id': '0'})
+        durations.append(1000 * (time.perf_counter() - started))
+    durations.sort()
+    return statistics.median(durations), durations[int(0.99 * (len(durations) - 1))]
+
+
+def concurrent(get_table, endpoint_url, writes, concurrency):
+    table = get_table()
+
+    def update(i):
+        table.update_item(
+            Key={'id': str(i % concurrency)},
+            UpdateExpression='SET #t = :t',
+            ExpressionAttributeNames={'#t': 'timestamp'},
+            ExpressionAttributeValues={':t': i},
+        )
+
+    before = connections(endpoint_url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(update, range(writes)))
+    return time.perf_counter() - started, connections(endpoint_url) - before
+
+
+def main(args):
+    (endpoint, endpoint_url) = start_endpoint(args.latency)
+    print(f"endpoint latency {args.latency} ms, {args.concurrency} concurrent writers, "
+          f"pool of {aws_clients.MAX_POOL_CONNECTIONS} connections when shared")
+    for pattern in PATTERNS:
+        aws_clients.reset()
+        startup = cold_starts(pattern, endpoint_url, args.cold)
+        get_table = table_getter(pattern, endpoint_url)
+        get_table().get_item(Key={'id': '0'})
+        (p50, p99) = sequential(get_table, args.calls)
+        (seconds, opened) = concurrent(get_table, endpoint_url, args.writes, args.concurrency)
+        print(f"{pattern:9} cold: import {startup['import']:6.1f} ms  create {startup['create']:6.1f} ms  "
+              f"first call {startup['first']:6.1f} ms | GetItem p50 {p50:6.2f} ms  p99 {p99:6.2f} ms | "
+              f"{args.writes} writes {args.writes / seconds:7.0f}/s  {opened:4d} connections opened")
+    endpoint.terminate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', choices=PATTERNS, help=argparse.SUPPRESS)
+    parser.add_argument('--endpoint', help=argparse.SUPPRESS)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--cold', type=int, default=5, help='cold starts per pattern')
+    parser.add_argument('--calls', type=int, default=200, help='sequential GetItem calls')
+    parser.add_argument('--writes', type=int, default=2000, help='concurrent UpdateItem calls')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=2, help='endpoint latency in milliseconds')
+    args = parser.parse_args()
+    # Requests are signed, though the endpoint ignores the signature
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+    logging.disable(logging.WARNING)
+    if args.serve:
+        serve(args.latency / 1000)
+    elif args.child:
+        cold(args.child, args.endpoint)
+    else:
+        main(args)
@@ -0,0 +1,104 @@
+"""
+Measure cold versus warm latency of the propose_stategies handler through an
+emulated Lambda runtime loop: every cold start is a fresh interpreter that
+initializes the handler, then serves events read from stdin one at a time.
+
+    python bench/cold_start.py --cold 5 --warm 20
+"""
+import argparse
+from contextlib import redirect_stdout
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from standins import ROOT, load_lambda
+
+EVENT_PATH = ROOT / 'test' / 'propose-floor-strategies.json'
+
+
+def runtime():
+    # The child process: initialize, then loop over events like the runtime API
+    started = time.perf_counter()
+    # Only failures reach the stderr of the benchmark
+    logging.disable(logging.WARNING)
+    module = load_lambda('propose_stategies')
+    print(json.dumps({'init': 1000 * (time.perf_counter() - started)}), flush=True)
+
+    for line in sys.stdin:
+        event = json.loads(line)
+        started = time.perf_counter()
+        with redirect_stdout(sys.stderr):
+            response = module.lambda_handler(event, None)
+        print(json.dumps({
+            'duration': 1000 * (time.perf_counter() - started),
+            'server_timing': response.get('headers', {}).get('Server-Timing'),
+        }), flush=True)
+
+
+def event(n):
+    # Vary the temperature so that no invocation hits the strategy cache
+    template = json.loads(EVENT_PATH.read_text())
+    body = json.loads(template['body'])
+    for room in body['rooms']:
+        room['profile']['temperature'] += 0.1 * n
+    return {**template, 'body': json.dumps(body)}
+
+
+def read(process):
+    line = process.stdout.readline()
+    if not line:
+        # The runtime failed, its traceback is on stderr
+        sys.exit(f'the runtime exited with code {process.wait()}')
+    return json.loads(line)
+
+
+def invoke(process, payload):
+    process.stdin.write(json.dumps(payload) + '\n')
+    process.stdin.flush()
+    return read(process)
+
+
+def main(cold, warm, warm_up, method):
+    environment = {**os.environ, 'OPTIMIZE_METHOD': method}
+    inits, firsts, warms = [], [], []
+    for _ in range(cold):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, __file__, '--runtime'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, env=environment, cwd=ROOT / 'src' / 'lambda' / 'propose_stategies',
+        )
+        init = read(process)['init']
+        inits.append((1000 * (time.perf_counter() - started), init))
+        if warm_up:
+            invoke(process, {'warmup': True})
+        first = invoke(process, event(0))
+        firsts.append(first['duration'])
+        warms.extend(invoke(process, event(n + 1))['duration'] for n in range(warm))
+        process.stdin.close()
+        process.wait()
+
+    print(f"interpreter + init  {statistics.median(t for (t, _) in inits):8.2f} ms (median)")
+    print(f"handler init        {statistics.median(init for (_, init) in inits):8.2f} ms (median)")
+    print(f"first invocation    {statistics.median(firsts):8.2f} ms (median), last {first['server_timing']}")
+    if warms:
+        print(f"warm invocations    {statistics.median(warms):8.2f} ms (median)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark cold and warm strategy latency.')
+    parser.add_argument('--runtime', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--cold', type=int, default=5, help='Number of cold starts.')
+    parser.add_argument('--warm', type=int, default=20, help='Warm invocations after every cold start.')
+    parser.add_argument('--warm_up', action='store_true', help='Send a warm-up ping before the first event.')
+    parser.add_argument('--method', choices=['milp', 'fast'], default='milp', help='OPTIMIZE_METHOD of the handler.')
+    args = parser.parse_args()
+
+    if args.runtime:
+        runtime()
+    else:
+        main(args.cold, args.warm, args.warm_up, args.method)
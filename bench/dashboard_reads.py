@@ -0,0 +1,70 @@
+"""
+Compare the ways the dashboard can read the latest reading of every room from
+a SensorDatabaseTable stand-in with a simulated round trip per request.
+
+    python bench/dashboard_reads.py --latency 0.01
+"""
+import argparse
+from boto3.dynamodb.conditions import Key
+import sys
+import time
+
+from standins import FakeDynamoDB, LAYER_DIR
+
+sys.path.insert(0, str(LAYER_DIR))
+import dynamodb_reads  # noqa: E402
+
+TABLE_NAME = 'SensorDatabaseTable'
+
+
+def query_per_room(dynamodb, room_ids):
+    # The former dashboard: one query per room, serially
+    table = dynamodb.Table(TABLE_NAME)
+    items = []
+    for room_id in room_ids:
+        items.extend(table.query(KeyConditionExpression=Key('id').eq(room_id))['Items'])
+    return items
+
+
+def batch_get(dynamodb, room_ids):
+    return dynamodb_reads.read_items(dynamodb, TABLE_NAME, [{'id': room_id} for room_id in room_ids])
+
+
+def parallel_get(dynamodb, room_ids):
+    return dynamodb_reads.parallel_get(lambda: dynamodb.Table(TABLE_NAME), [{'id': room_id} for room_id in room_ids])
+
+
+METHODS = {
+    'query': query_per_room,
+    'batch': batch_get,
+    'parallel': parallel_get,
+}
+
+
+def main(rooms, latency, unprocessed):
+    for count in rooms:
+        dynamodb = FakeDynamoDB(latency=latency, unprocessed=unprocessed)
+        table = dynamodb.Table(TABLE_NAME)
+        room_ids = [str(room_id) for room_id in range(count)]
+        for room_id in room_ids:
+            table.put_item(Item={'id': room_id, 'temperature': 25, 'humidity': 60, 'timestamp': 0})
+
+        results = []
+        for (name, method) in METHODS.items():
+            table.calls.clear()
+            began = time.perf_counter()
+            items = method(dynamodb, room_ids)
+            elapsed = time.perf_counter() - began
+            assert len(items) == count, (name, len(items))
+            requests = sum(table.calls[call] for call in ['query', 'get_item', 'batch_get_item'])
+            results.append(f'{name} {1000 * elapsed:8.2f} ms {requests:4d} requests')
+        print(f'rooms={count:4d} ' + '   '.join(results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, nargs='+', default=[3, 30, 100, 300])
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per request')
+    parser.add_argument('--unprocessed', type=float, default=0, help='share of keys left unprocessed per BatchGetItem')
+    args = parser.parse_args()
+    main(args.rooms, args.latency, args.unprocessed)
@@ -0,0 +1,78 @@
+"""
+Compare one floor-wide strategy request against one request per room.
+
+    python bench/floor_strategy.py --rooms 50
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from standins import load_lambda
+
+CAPACITIES = [2200, 2800, 3600, 4000, 5000, 5600, 6300, 7100, 8000]
+
+
+def random_room(i, rng):
+    return {
+        "name": f"room {i}",
+        "profile": {
+            "time": 14,
+            "uv_index": rng.randint(0, 11),
+            "number_of_people": rng.randint(0, 20),
+            "space_size": rng.uniform(20, 80),
+            "ceiling_height": 2.5,
+            "humidity": rng.uniform(50, 70),
+            "temperature": rng.uniform(27, 33),
+            "month": 7,
+            "target_temperature": 26,
+            "target_time": 15,
+        },
+        "aircons": [
+            {"unit": f"unit {i}-{j}", "capacity": rng.choice(CAPACITIES)}
+            for j in range(rng.randint(1, 4))
+        ],
+    }
+
+
+def invoke(module, body):
+    event = {"pathParameters": {"floor_id": "0"}, "body": json.dumps(body)}
+    response = module.lambda_handler(event, None)
+    assert response["statusCode"] == 200
+    return json.loads(response["body"])
+
+
+def main(count, method):
+    module = load_lambda("propose_stategies")
+    if method:
+        sys.modules["vincent_algorithm"].OPTIMIZE_METHOD = method
+    rng = random.Random(0)
+    rooms = [random_room(i, rng) for i in range(count)]
+
+    with redirect_stdout(StringIO()):
+        start = time.perf_counter()
+        floor = invoke(module, {"rooms": rooms})
+        joint = time.perf_counter() - start
+
+        start = time.perf_counter()
+        singles = [invoke(module, {"rooms": [room]}) for room in rooms]
+        separate = time.perf_counter() - start
+
+    total_y = sum(single["total_y"] for single in singles)
+    print(f"{count} rooms: 1 floor request {1000 * joint:9.2f} ms, "
+          f"{count} room requests {1000 * separate:9.2f} ms "
+          f"(total power {floor['total_y']:.0f} W vs {total_y:.0f} W)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the floor strategy endpoint.")
+    parser.add_argument("--rooms", type=int, default=50, help="Number of rooms on the floor.")
+    parser.add_argument("--method", choices=["milp", "fast"], help="Override OPTIMIZE_METHOD.")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    main(args.rooms, args.method)
@@ -0,0 +1,67 @@
+"""
+Ingest a month of synthetic readings of one sensor into the in-memory history
+table, then compare the rows read by a month-long query at every resolution.
+
+    python bench/history_query.py --interval 60
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from standins import install, kinesis_event, load_lambda
+
+MONTH = 30 * 86400
+
+
+def main(interval, batch_size):
+    module = load_lambda("monitor_sensors")
+    dynamodb = install(module)
+    history_table = dynamodb.Table("SensorHistoryTable")
+
+    end = int(time.time()) // 3600 * 3600
+    start = end - MONTH
+    timestamps = range(start, end, interval)
+
+    began = time.perf_counter()
+    for offset in range(0, len(timestamps), batch_size):
+        payloads = [{
+            "sensor_id": 0,
+            "temperature": round(random.uniform(10, 30), 2),
+            "humidity": round(random.uniform(50, 70), 2),
+            "timestamp": timestamp,
+        } for timestamp in timestamps[offset:offset + batch_size]]
+        module.lambda_handler(kinesis_event(payloads), None)
+    elapsed = time.perf_counter() - began
+    print(f"ingested {len(timestamps)} readings in {elapsed:.2f} s "
+          f"({len(timestamps) / elapsed:.0f} readings/s)")
+
+    for resolution in ["raw", "1m", "15m", "1h", "auto"]:
+        history_table.calls.clear()
+        event = {
+            "httpMethod": "GET",
+            "pathParameters": {"sensor_id": "0"},
+            "queryStringParameters": {
+                "from": str(start),
+                "to": str(end),
+                "resolution": resolution,
+            },
+        }
+        began = time.perf_counter()
+        response = module.lambda_handler(event, None)
+        elapsed = time.perf_counter() - began
+        body = json.loads(response["body"])
+        print(f"resolution={resolution:5} -> {body['resolution']:4} "
+              f"{history_table.calls['items_read']:8d} rows read "
+              f"{len(body['points']):8d} points {1000 * elapsed:9.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark month-long history queries.")
+    parser.add_argument("--interval", type=int, default=60, help="Seconds between synthetic readings.")
+    parser.add_argument("--batch_size", type=int, default=1000, help="Readings per Kinesis batch.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    main(args.interval, args.batch_size)
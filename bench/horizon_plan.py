@@ -0,0 +1,85 @@
+"""
+Plan a floor over a day of 15-minute steps, with a warm afternoon, a UV peak,
+changing occupancy and a peak energy price, and compare the cost of the fast
+and MILP horizon plans against planning every step on its own.
+
+    python bench/horizon_plan.py --rooms 10 --steps 96 --time-limit 10
+"""
+import argparse
+import logging
+import math
+import random
+import time
+
+from standins import load_lambda
+from suite import PROFILE, UNITS
+
+
+def forecast(steps, step_minutes, rng):
+    hours = [(8 + t * step_minutes / 60) % 24 for t in range(steps)]
+    return [{
+        "temperature": round(27 + 4 * max(math.sin((hour - 8) / 12 * math.pi), 0), 1),
+        "uv_index": max(round(10 * math.sin((hour - 6) / 12 * math.pi)), 0),
+        "price": 1.5 if 13 <= hour < 19 else 1.0,
+    } for hour in hours]
+
+
+def horizon_request(rooms, steps, rng, step_minutes=15):
+    return {
+        "step_minutes": step_minutes,
+        "forecast": forecast(steps, step_minutes, rng),
+        "rooms": [{
+            "name": f"room{i}",
+            "profile": {**PROFILE, "time": 8, "target_time": 15},
+            "aircons": [{"unit": unit} for unit in rng.sample(UNITS, rng.randint(2, 4))],
+            "forecast": [{"number_of_people": rng.randint(0, 8)} for _ in range(steps)],
+        } for i in range(rooms)],
+    }
+
+
+def per_step_cost(vincent_algorithm, plan, request):
+    # Every step planned on its own meets its demand without pre-cooling
+    step_hours = plan["step_minutes"] / 60
+    prices = [step.get("price", 1) for step in request["forecast"]]
+    cost = unmet = 0
+    for (room, planned) in zip(request["rooms"], plan["rooms"]):
+        x_values, p_values = vincent_algorithm.resolve_units(room["aircons"])
+        for (t, demand) in enumerate(planned["required_power"]):
+            z = vincent_algorithm.optimize_floor([x_values], [demand], 'fast', [p_values])[0]
+            y = vincent_algorithm.calculate_y(z)
+            cost += prices[t] * step_hours * sum(p * yi for (p, yi) in zip(p_values, y))
+            unmet += max(demand - sum(x_values), 0)
+    return cost, unmet
+
+
+def main(args):
+    vincent_algorithm = load_lambda("propose_stategies").vincent_algorithm
+    request = horizon_request(args.rooms, args.steps, random.Random(args.seed))
+    print(f"{args.rooms} rooms over {args.steps} steps of 15 minutes")
+
+    results = {}
+    for method in ['fast', 'fast', 'milp']:
+        began = time.perf_counter()
+        plan = vincent_algorithm.vincent_algorithm_horizon(
+            {**request, "method": method, "time_limit": args.time_limit})
+        elapsed = time.perf_counter() - began
+        unmet = sum(sum(room["unmet_power"]) for room in plan["rooms"])
+        label = method if method not in results else f"{method} (warm)"
+        results[method] = plan
+        print(f"{label:12} {elapsed:7.2f} s  cost {plan['cost']:10.1f}  {plan['energy_wh']:10.1f} Wh  "
+              f"unmet {unmet:8.1f} W  {plan['status']}")
+
+    cost, unmet = per_step_cost(vincent_algorithm, results['fast'], request)
+    print(f"{'per step':12} {'':9}  cost {cost:10.1f}  {'':13}  unmet {unmet:8.1f} W  "
+          f"({1 - results['fast']['cost'] / cost:.1%} saved by the fast plan)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=96)
+    parser.add_argument('--time-limit', type=float, default=10, help='seconds the MILP may take')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args)
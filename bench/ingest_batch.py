@@ -0,0 +1,102 @@
+"""
+Push synthetic Kinesis batches through the ingestion handlers against an
+in-memory DynamoDB table and report throughput and write requests. Every
+batch is delivered newest half first to check that older readings never
+overwrite newer ones, and the conditional writes are compared against plain
+BatchWriteItem calls under the same request latency.
+
+    python bench/ingest_batch.py --sensors 50 --repeat 20 --latency 0.005
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+from standins import LAYER_DIR, FakeDynamoDB, install, kinesis_event, load_lambda
+
+sys.path.insert(0, str(LAYER_DIR))
+import dynamodb_writes  # noqa: E402
+
+BATCH_SIZES = [10, 100, 1000]
+
+
+def sensor_payloads(count, sensors, now):
+    return [{
+        "sensor_id": random.randrange(sensors),
+        "temperature": round(random.uniform(10, 30), 2),
+        "humidity": round(random.uniform(50, 70), 2),
+        "timestamp": now + i,
+    } for i in range(count)]
+
+
+def activity_payloads(count, rooms, now):
+    return [{
+        "room_id": random.randrange(rooms),
+        "headcount": random.randint(0, 5),
+        "timestamp": now + i,
+    } for i in range(count)]
+
+
+def batch_write(table, items):
+    # The unconditional writes the handlers used before
+    with table.batch_writer(overwrite_by_pkeys=["id"]) as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+
+def compare_writes(items, latency, repeat):
+    timings = {}
+    for (name, write) in [("BatchWriteItem", batch_write), ("conditional", dynamodb_writes.write_newer)]:
+        table = FakeDynamoDB(latency=latency).Table("SensorDatabaseTable")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            write(table, items)
+        timings[name] = (time.perf_counter() - start) / repeat
+    return timings
+
+
+def run(name, make_payloads, key, keys, repeat, latency):
+    module = load_lambda(name)
+    for batch_size in BATCH_SIZES:
+        install(module, FakeDynamoDB(latency=latency))
+        now = int(time.time())
+        newest, elapsed = {}, 0
+        for iteration in range(repeat):
+            payloads = make_payloads(batch_size, keys, now + iteration * batch_size)
+            for payload in payloads:
+                newest[str(payload[key])] = max(newest.get(str(payload[key]), 0), payload["timestamp"])
+            # Deliver the newer half first, as a parallelized shard may
+            half = len(payloads) // 2
+            events = [kinesis_event(payloads[half:]), kinesis_event(payloads[:half])]
+            start = time.perf_counter()
+            for event in events:
+                if event["Records"]:
+                    module.lambda_handler(event, None)
+            elapsed += time.perf_counter() - start
+
+        stored = {item_key[0]: item["timestamp"] for (item_key, item) in module.table.items.items()}
+        assert stored == newest, "older readings overwrote newer ones"
+
+        calls = module.table.calls
+        items = [{"id": str(i), "timestamp": now} for i in range(min(keys, batch_size))]
+        timings = compare_writes(items, latency, repeat)
+        print(f"{name:18} batch={batch_size:5d} "
+              f"{batch_size * repeat / elapsed:10.0f} records/s "
+              f"{1000 * elapsed / repeat:8.2f} ms/batch "
+              f"{calls['update_item'] / repeat:6.1f} UpdateItem "
+              f"{calls['conditional_check_failed'] / repeat:6.1f} stale   "
+              f"writing {len(items)} items: BatchWriteItem {1000 * timings['BatchWriteItem']:7.2f} ms "
+              f"conditional {1000 * timings['conditional']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch ingestion of the Kinesis handlers.")
+    parser.add_argument("--sensors", type=int, default=50, help="Number of distinct sensors/rooms in a batch.")
+    parser.add_argument("--repeat", type=int, default=20, help="Invocations per batch size.")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per DynamoDB request.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    run("monitor_sensors", sensor_payloads, "sensor_id", args.sensors, args.repeat, args.latency)
+    run("detect_activities", activity_payloads, "room_id", args.sensors, args.repeat, args.latency)
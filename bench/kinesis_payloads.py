@@ -0,0 +1,78 @@
+"""
+Compare the JSON payloads with the binary wire format, packing 1 to 500
+readings per record: bytes per reading, the readings a shard accepts per
+second, the decode cost per reading, and the Monitor Sensors handler time
+per reading on the same readings.
+
+    python bench/kinesis_payloads.py --readings 20000 --pack 1 10 100 500
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+
+from standins import LAYER_DIR, FakeDynamoDB, install, kinesis_event, load_lambda
+
+sys.path.insert(0, str(LAYER_DIR))
+import wire_format  # noqa: E402
+
+# Kinesis ingest limits per shard
+SHARD_RECORDS = 1000
+SHARD_BYTES = 1 << 20
+# Records per handler invocation, the default batch size of the event source
+BATCH_SIZE = 100
+
+
+def readings(count, sensors, rng):
+    now = int(time.time())
+    return [{
+        "sensor_id": rng.randrange(sensors),
+        "temperature": round(rng.uniform(10, 30), 2),
+        "humidity": round(rng.uniform(50, 70), 2),
+        "timestamp": now + i // sensors,
+    } for i in range(count)]
+
+
+def encodings(payloads, packs):
+    yield 'json', [json.dumps(payload).encode('utf-8') for payload in payloads]
+    for pack in packs:
+        yield f'binary x{pack}', wire_format.pack(wire_format.SENSOR, payloads, pack)
+
+
+def handler_seconds(records, count):
+    module = load_lambda('monitor_sensors')
+    install(module, FakeDynamoDB())
+    began = time.perf_counter()
+    for start in range(0, len(records), BATCH_SIZE):
+        module.lambda_handler(kinesis_event(records[start:start + BATCH_SIZE]), None)
+    return (time.perf_counter() - began) / count
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    payloads = readings(args.readings, args.sensors, rng)
+    print(f"{args.readings} readings of {args.sensors} sensors")
+    for (name, records) in encodings(payloads, args.pack):
+        size = sum(map(len, records))
+        # A shard is bounded by both its records and its bytes per second
+        per_shard = min(SHARD_RECORDS, SHARD_BYTES / (size / len(records))) * args.readings / len(records)
+        began = time.perf_counter()
+        decoded = sum(len(wire_format.decode(data)) for data in records)
+        decode = (time.perf_counter() - began) / decoded
+        handler = handler_seconds(records, args.readings)
+        print(f"{name:12} {size / args.readings:6.1f} B/reading  {len(records):6d} records  "
+              f"{per_shard:9.0f} readings/s per shard  decode {1e6 * decode:5.2f} us/reading  "
+              f"handler {1e6 * handler:6.1f} us/reading")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readings', type=int, default=20000)
+    parser.add_argument('--sensors', type=int, default=1000)
+    parser.add_argument('--pack', type=int, nargs='+', default=[1, 10, 100, 500], help='readings per binary record')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    main(args)
@@ -0,0 +1,83 @@
+"""
+Re-solve the MILP of one floor as its demands drift, as the strategy of a
+floor is recomputed when its readings change, at the default gap and at a 1%
+gap. Reports the latency per call, the part of it spent building the
+problem, which keeping the problem between calls would save, and the total
+power against the optimum.
+
+    python bench/milp_resolve.py --rooms 1 10 30 --calls 20
+"""
+import argparse
+import logging
+import random
+import statistics
+import time
+
+from standins import load_lambda
+
+load_lambda("propose_stategies")
+import vincent_algorithm  # noqa: E402
+
+# Cooling capacities in W found in data/hitachi-spec-en.csv
+CAPACITIES = [2200, 2800, 3600, 4000, 5000, 5600, 6300, 7100, 8000]
+
+
+def total_power(rooms, loads):
+    return sum(
+        y * x
+        for (x_values, z) in zip(rooms, loads)
+        for (y, x) in zip(vincent_algorithm.calculate_y(z), x_values)
+    )
+
+
+def drifting_demands(rooms, calls, rng):
+    shares = [rng.uniform(0.2, 0.8) for _ in rooms]
+    demands = []
+    for _ in range(calls):
+        shares = [min(max(share + rng.gauss(0, 0.03), 0.05), 0.95) for share in shares]
+        demands.append([share * sum(x_values) for (share, x_values) in zip(shares, rooms)])
+    return demands
+
+
+def run(rooms, demands, **options):
+    latencies, builds, powers = [], [], []
+    for min_values in demands:
+        start = time.perf_counter()
+        model = vincent_algorithm.FloorModel(rooms)
+        built = time.perf_counter()
+        loads = model.solve(min_values, **options)
+        latencies.append(time.perf_counter() - start)
+        builds.append(built - start)
+        powers.append(total_power(rooms, loads))
+    return latencies, builds, powers
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    for count in args.rooms:
+        rooms = [[rng.choice(CAPACITIES) for _ in range(rng.randint(2, 6))] for _ in range(count)]
+        demands = drifting_demands(rooms, args.calls, rng)
+        print(f"{count} rooms, {sum(map(len, rooms))} units, {args.calls} calls")
+        reference = None
+        for (name, options) in [
+            ("default gap", {}),
+            ("1% gap", {"gap": 0.01, "time_limit": 1}),
+        ]:
+            latencies, builds, powers = run(rooms, demands, **options)
+            reference = reference or powers
+            gap = max(power / best - 1 for (power, best) in zip(powers, reference))
+            print(f"  {name:12} p50 {1000 * statistics.median(latencies):8.2f} ms  "
+                  f"mean {1000 * statistics.mean(latencies):8.2f} ms  "
+                  f"building {1000 * statistics.median(builds):6.2f} ms "
+                  f"({sum(builds) / sum(latencies):5.1%})  worst gap {100 * gap:6.3f} %")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 10, 30], help="Rooms of the floor.")
+    parser.add_argument("--calls", type=int, default=20, help="Solves per floor.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    main(args)
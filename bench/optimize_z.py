@@ -0,0 +1,56 @@
+"""
+Compare the fast load solver against the MILP reference on random unit
+sets: total power, gap and solve time.
+
+    python bench/optimize_z.py --units 4 40 400 --trials 5
+"""
+import argparse
+import logging
+import random
+import time
+
+from standins import load_lambda
+
+load_lambda("propose_stategies")
+import vincent_algorithm  # noqa: E402
+
+# Cooling capacities in W found in data/hitachi-spec-en.csv
+CAPACITIES = [2200, 2800, 3600, 4000, 5000, 5600, 6300, 7100, 8000]
+
+
+def total_power(x_values, z):
+    return sum(y * x for (y, x) in zip(vincent_algorithm.calculate_y(z), x_values))
+
+
+def run(units, trials, rng):
+    timings = {"milp": 0.0, "fast": 0.0}
+    worst_gap = 0.0
+    for _ in range(trials):
+        x_values = [rng.choice(CAPACITIES) for _ in range(units)]
+        min_value = rng.uniform(0.05, 0.95) * sum(x_values)
+        powers = {}
+        for method in timings:
+            start = time.perf_counter()
+            z = vincent_algorithm.optimize_z(x_values, min_value, method)
+            timings[method] += time.perf_counter() - start
+            assert abs(sum(zi * x for (zi, x) in zip(z, x_values)) - min_value) < 1
+            powers[method] = total_power(x_values, z)
+        worst_gap = max(worst_gap, powers["fast"] / powers["milp"] - 1)
+
+    print(f"units={units:4d} "
+          f"milp {1000 * timings['milp'] / trials:10.2f} ms "
+          f"fast {1000 * timings['fast'] / trials:8.2f} ms "
+          f"speedup {timings['milp'] / timings['fast']:8.1f}x "
+          f"worst gap {100 * worst_gap:6.3f} %")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the load solvers.")
+    parser.add_argument("--units", type=int, nargs="+", default=[4, 40, 400], help="Unit counts to solve for.")
+    parser.add_argument("--trials", type=int, default=5, help="Random demands per unit count.")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(0)
+    for units in args.units:
+        run(units, args.trials, rng)
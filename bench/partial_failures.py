@@ -0,0 +1,120 @@
+"""
+Replay Kinesis batches holding poison records and throttled writes through
+Monitor Sensors under the two failure modes of the event source mapping:
+
+- whole batch: any failed record fails the invocation, Lambda bisects the
+  batch and retries both halves until the failing records are isolated
+- partial: the handler dead-letters poison records and reports only the
+  records it failed to write, Lambda resumes the batch from the first one
+
+and report the invocations, the records re-delivered and the records lost.
+
+    python bench/partial_failures.py --batches 20 --poison 0.02 --write-failures 0.02
+"""
+import argparse
+from collections import Counter
+import logging
+import random
+import time
+
+from standins import FakeDynamoDB, FakeSQS, install, kinesis_record, load_lambda
+
+
+def sensor_records(count, sensors, poison, offset):
+    now = int(time.time())
+    records = []
+    for i in range(count):
+        payload = {
+            "sensor_id": random.randrange(sensors),
+            "temperature": round(random.uniform(10, 30), 2),
+            "humidity": round(random.uniform(50, 70), 2),
+            "timestamp": now + offset + i,
+        }
+        if random.random() < poison:
+            # A firmware bug sends readings the handler can never store
+            payload = random.choice([
+                {**payload, "temperature": "N/A"},
+                {key: value for (key, value) in payload.items() if key != "humidity"},
+            ])
+        records.append(kinesis_record(payload, offset + i))
+    return records
+
+
+def invoke(module, records, stats):
+    stats['invocations'] += 1
+    stats['delivered'] += len(records)
+    response = module.lambda_handler({'Records': records}, None)
+    failed = {failure['itemIdentifier'] for failure in response['batchItemFailures']}
+    poisoned = module.metrics.counts.get('poison_records', 0)
+    return failed, poisoned
+
+
+def whole_batch(module, records, retries, stats):
+    # Without dead-lettering, a poison record fails its batch like an error
+    failed, poisoned = invoke(module, records, stats)
+    if not failed and not poisoned:
+        return
+    if len(records) > 1:
+        middle = len(records) // 2
+        whole_batch(module, records[:middle], retries, stats)
+        whole_batch(module, records[middle:], retries, stats)
+    elif poisoned:
+        stats['dead_lettered'] += 1  # by the on-failure destination
+    elif retries > 0:
+        whole_batch(module, records, retries - 1, stats)
+    else:
+        stats['lost'] += 1
+
+
+def partial(module, records, retries, stats):
+    for _ in range(retries + 1):
+        failed, _ = invoke(module, records, stats)
+        if not failed:
+            return
+        first = min(i for (i, record) in enumerate(records) if record['kinesis']['sequenceNumber'] in failed)
+        records = records[first:]
+    stats['lost'] += len(records)
+
+
+def run(mode, args):
+    random.seed(args.seed)
+    module = load_lambda('monitor_sensors')
+    sqs = FakeSQS()
+    install(module, FakeDynamoDB(write_failures=args.write_failures), sqs)
+    if mode is whole_batch:
+        module.dead_letters.DEAD_LETTER_QUEUE_URL = None
+    stats = Counter()
+    began = time.perf_counter()
+    for batch in range(args.batches):
+        records = sensor_records(args.batch_size, args.sensors, args.poison, batch * args.batch_size)
+        mode(module, records, args.retries, stats)
+    stats['seconds'] = time.perf_counter() - began
+    # Records re-delivered after a failure may be dead-lettered again
+    stats['dead_lettered'] += len({message['sequenceNumber'] for message in sqs.messages})
+    return stats
+
+
+def main(args):
+    total = args.batches * args.batch_size
+    print(f"{total} records in batches of {args.batch_size}, "
+          f"{args.poison:.1%} poison, {args.write_failures:.1%} throttled writes")
+    for (name, mode) in [('whole batch', whole_batch), ('partial', partial)]:
+        stats = run(mode, args)
+        print(f"{name:12} {stats['invocations']:6d} invocations  "
+              f"{stats['delivered']:7d} records delivered ({stats['delivered'] / total:5.2f}x)  "
+              f"{stats['lost']:4d} lost  {stats['dead_lettered']:4d} dead-lettered  "
+              f"{stats['seconds']:6.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--sensors', type=int, default=50)
+    parser.add_argument('--poison', type=float, default=0.02, help='share of invalid records')
+    parser.add_argument('--write-failures', type=float, default=0.02, help='chance of a write to be throttled')
+    parser.add_argument('--retries', type=int, default=3, help='MaximumRetryAttempts of the event source')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    main(args)
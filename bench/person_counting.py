@@ -0,0 +1,126 @@
+"""
+Frames per second per core of the person counting stage of the Detect
+Activities page, over a folder of sample images or synthetic JPEG frames of
+people walking through a room, with every camera counted on its own and all
+cameras in one batch. Synthetic frames also report the counting error.
+
+    python bench/person_counting.py --cameras 16 --frames 50 --frame-skip 0 2
+    python bench/person_counting.py --images samples/ --cameras 4
+"""
+import argparse
+from io import BytesIO
+from pathlib import Path
+import random
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from standins import ROOT
+
+sys.path.insert(0, str(ROOT / 'src' / 'frontend'))
+import person_counting  # noqa: E402
+
+SIZE = (640, 480)
+# A person at SIZE covers about PERSON_CELLS cells once downscaled to WIDTH
+PERSON = (64, 96)
+
+
+def synthetic_frames(cameras, frames, rng):
+    """
+    :return: tuple, the JPEG frames of every camera and step, and the people
+        they show
+    """
+    (width, height) = SIZE
+    gradient = np.linspace(90, 170, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    batches, headcounts = [], []
+    walkers = [[] for _ in range(cameras)]
+    for step in range(frames):
+        batch, counts = {}, {}
+        for camera in range(cameras):
+            people = walkers[camera]
+            # People enter, leave and walk a few pixels per frame
+            if step >= 2 and rng.random() < 0.1 and len(people) < 4:
+                people.append([rng.randrange(width - PERSON[0]), rng.randrange(height - PERSON[1])])
+            if people and rng.random() < 0.05:
+                people.pop(rng.randrange(len(people)))
+            for person in people:
+                person[0] = min(max(person[0] + rng.randint(-4, 4), 0), width - PERSON[0])
+                person[1] = min(max(person[1] + rng.randint(-4, 4), 0), height - PERSON[1])
+            noise = np.random.default_rng(rng.randrange(1 << 30)).normal(0, 4, (height, width))
+            image = Image.fromarray(np.clip(gradient + noise, 0, 255).astype(np.uint8))
+            draw = ImageDraw.Draw(image)
+            for (x, y) in people:
+                draw.ellipse([x, y, x + PERSON[0], y + PERSON[1]], fill=30)
+            buffer = BytesIO()
+            image.save(buffer, format='JPEG', quality=80)
+            batch[camera], counts[camera] = buffer.getvalue(), len(people)
+        batches.append(batch)
+        headcounts.append(counts)
+    return batches, headcounts
+
+
+def folder_frames(folder, cameras, frames):
+    paths = sorted(path for path in Path(folder).iterdir() if path.suffix.lower() in ['.jpg', '.jpeg', '.png'])
+    images = [path.read_bytes() for path in paths]
+    # Every camera replays the folder from its own offset
+    return [{camera: images[(step + camera) % len(images)] for camera in range(cameras)} for step in range(frames)], None
+
+
+def run(batches, frame_skip, width, batched):
+    counter = person_counting.PersonCounter(frame_skip=frame_skip, width=width)
+    results = []
+    began = time.process_time()
+    for batch in batches:
+        if batched:
+            results.append(counter.count_batch(batch))
+        else:
+            results.append({camera: counter.count(frame, camera) for (camera, frame) in batch.items()})
+    seconds = time.process_time() - began
+    return counter, results, seconds
+
+
+def error(results, headcounts, skip_warmup):
+    errors = [
+        abs(result[camera][0] - counts[camera])
+        for (result, counts) in list(zip(results, headcounts))[skip_warmup:]
+        for camera in counts
+    ]
+    return sum(errors) / len(errors)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    if args.images:
+        batches, headcounts = folder_frames(args.images, args.cameras, args.frames)
+    else:
+        batches, headcounts = synthetic_frames(args.cameras, args.frames, rng)
+    frames = args.cameras * args.frames
+    print(f"{args.cameras} cameras x {args.frames} frames of {len(next(iter(batches[0].values()))) / 1024:.1f} KiB, "
+          f"downscaled to {args.width} px, target {args.target_fps} fps per core")
+    for frame_skip in args.frame_skip:
+        for batched in [False, True]:
+            counter, results, seconds = run(batches, frame_skip, args.width, batched)
+            fps = frames / seconds
+            line = (f"skip {frame_skip}  {'batched' if batched else 'per camera':10}  "
+                    f"{fps:8.1f} fps per core  {counter.processed:5d} processed  {counter.skipped:5d} skipped  "
+                    f"{'ok' if fps >= args.target_fps else 'BELOW TARGET'}")
+            # The error is only measured past the warmup frames
+            if headcounts and args.frames > person_counting.WARMUP_FRAMES:
+                mean_confidence = np.mean([result[camera][1] for result in results[person_counting.WARMUP_FRAMES:] for camera in result])
+                line += (f"  mean error {error(results, headcounts, person_counting.WARMUP_FRAMES):.2f} people"
+                         f"  mean confidence {mean_confidence:.2f}")
+            print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='folder of sample frames, synthetic frames if omitted')
+    parser.add_argument('--cameras', type=int, default=16)
+    parser.add_argument('--frames', type=int, default=50, help='frames per camera')
+    parser.add_argument('--frame-skip', type=int, nargs='+', default=[0, 2])
+    parser.add_argument('--width', type=int, default=person_counting.WIDTH)
+    parser.add_argument('--target-fps', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
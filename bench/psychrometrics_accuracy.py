@@ -0,0 +1,94 @@
+"""
+Check the interpolated psychrometric table against CoolProp and compare the
+latency of both.
+
+    python bench/psychrometrics_accuracy.py --samples 2000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from standins import LAYER_DIR
+
+sys.path.insert(0, str(LAYER_DIR))
+import psychrometrics  # noqa: E402
+
+
+def sample_states(count, rng):
+    axes = psychrometrics.AXES
+    temperatures = rng.uniform(axes[0][0] + 5, axes[0][1], count)
+    humidities = rng.uniform(axes[1][0], axes[1][1], count)
+    pressures = rng.uniform(axes[2][0], axes[2][1], count)
+    return temperatures, humidities, pressures
+
+
+def check_accuracy(count, rng):
+    temperatures, humidities, pressures = sample_states(count, rng)
+    cooled = temperatures - rng.uniform(1, 5, count)
+
+    expected = np.array([
+        psychrometrics.coolprop_properties(*state)
+        for state in zip(temperatures, humidities, pressures)
+    ]).T
+    expected_cooled = np.array([
+        psychrometrics.coolprop_properties(*state)[1]
+        for state in zip(cooled, humidities, pressures)
+    ])
+    actual = np.array(psychrometrics.properties(temperatures, humidities, pressures))
+    actual_cooled = psychrometrics.properties(cooled, humidities, pressures)[1]
+
+    errors = {
+        'humidity ratio (relative)': np.max(np.abs(actual[0] - expected[0]) / np.maximum(expected[0], 1e-6)),
+        'enthalpy (J/kg)': np.max(np.abs(actual[1] - expected[1])),
+        'enthalpy difference (relative)': np.max(np.abs(
+            (actual[1] - actual_cooled) / (expected[1] - expected_cooled) - 1)),
+        'density (relative)': np.max(np.abs(actual[2] - expected[2]) / expected[2]),
+    }
+    limits = {
+        'humidity ratio (relative)': psychrometrics.RELATIVE_TOLERANCE,
+        'enthalpy (J/kg)': psychrometrics.ENTHALPY_TOLERANCE,
+        'enthalpy difference (relative)': psychrometrics.RELATIVE_TOLERANCE,
+        'density (relative)': psychrometrics.RELATIVE_TOLERANCE,
+    }
+    passed = True
+    for (name, error) in errors.items():
+        ok = error <= limits[name]
+        passed &= ok
+        print(f"{name:32} max error {error:10.3g} limit {limits[name]:8.3g} {'ok' if ok else 'FAILED'}")
+    return passed
+
+
+def measure_latency(count, rng):
+    states = list(zip(*sample_states(count, rng)))
+
+    start = time.perf_counter()
+    for state in states:
+        psychrometrics.coolprop_properties(*state)
+    coolprop = (time.perf_counter() - start) / count
+
+    psychrometrics.load_table()
+    start = time.perf_counter()
+    for state in states:
+        psychrometrics.properties(*state)
+    table = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    psychrometrics.properties(*(np.array(axis) for axis in zip(*states)))
+    vectorized = (time.perf_counter() - start) / count
+
+    print(f"CoolProp            {1e6 * coolprop:10.2f} us/state")
+    print(f"table, scalar       {1e6 * table:10.2f} us/state ({coolprop / table:.1f}x)")
+    print(f"table, vectorized   {1e6 * vectorized:10.2f} us/state ({coolprop / vectorized:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the psychrometric lookup table.")
+    parser.add_argument("--samples", type=int, default=2000, help="Number of random states.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    passed = check_accuracy(args.samples, rng)
+    measure_latency(args.samples, rng)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,450 @@
+"""
+In-memory stand-ins for the AWS services touched by the Lambda handlers, so
+the handlers can be driven in-process without an AWS account.
+"""
+import base64
+from botocore.exceptions import ClientError
+from collections import Counter
+import hashlib
+import importlib.util
+import json
+from operator import eq, ge, gt, le, lt, ne
+import os
+from pathlib import Path
+import random
+import re
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+LAMBDA_DIR = ROOT / 'src' / 'lambda'
+LAYER_DIR = ROOT / 'src' / 'layer' / 'python'
+KEY_SCHEMAS = {
+    'SensorHistoryTable': ('series', 'timestamp'),
+}
+
+
+MISSING = object()
+OPERATORS = {
+    '=': eq,
+    '<>': ne,
+    '<': lt,
+    '<=': le,
+    '>': gt,
+    '>=': ge,
+}
+
+
+def evaluate(condition, item):
+    """
+    Evaluate a boto3 condition (Key/Attr expression) against an item.
+    """
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        return evaluate(values[0], item) and evaluate(values[1], item)
+    if operator == 'OR':
+        return evaluate(values[0], item) or evaluate(values[1], item)
+    if operator == 'NOT':
+        return not evaluate(values[0], item)
+
+    actual = item.get(values[0].name, MISSING)
+    if operator == 'attribute_not_exists':
+        return actual is MISSING
+    if operator == 'attribute_exists':
+        return actual is not MISSING
+    if actual is MISSING:
+        return False
+    if operator == 'BETWEEN':
+        return values[1] <= actual <= values[2]
+    return OPERATORS[operator](actual, values[1])
+
+
+def evaluate_expression(expression, item, names, values):
+    """
+    Evaluate a condition expression string made of OR-ed and AND-ed
+    attribute_(not_)exists and comparison terms against an item.
+    """
+    def term(text):
+        match = re.fullmatch(r'(attribute_exists|attribute_not_exists)\((#\w+)\)', text)
+        if match:
+            return (names[match[2]] in item) == (match[1] == 'attribute_exists')
+        left, comparison, right = text.split()
+        actual = item.get(names[left], MISSING)
+        return actual is not MISSING and OPERATORS[comparison](actual, values[right])
+
+    return any(
+        all(term(text.strip()) for text in disjunct.split(' AND '))
+        for disjunct in expression.split(' OR ')
+    )
+
+
+class FakeBatchWriter:
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.pending = {}
+
+    def put_item(self, Item):
+        self.pending[self.table.key_of(Item)] = Item
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        items = list(self.pending.values())
+        for start in range(0, len(items), 25):  # BatchWriteItem limit
+            self.table.calls['batch_write_item'] += 1
+            self.table.wait()
+            for item in items[start:start + 25]:
+                self.table.items[self.table.key_of(item)] = dict(item)
+        self.pending.clear()
+
+
+class FakeTable:
+    def __init__(self, name, key_schema=('id',), latency=0, write_failures=0):
+        self.name = name
+        self.key_schema = key_schema
+        self.latency = latency
+        self.write_failures = write_failures
+        self.items = {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # Emulate the round trip of a request
+        if self.latency:
+            time.sleep(self.latency)
+
+    def key_of(self, item):
+        return tuple(item[name] for name in self.key_schema)
+
+    def put_item(self, Item, **kwargs):
+        self.calls['put_item'] += 1
+        self.items[self.key_of(Item)] = dict(Item)
+
+    def get_item(self, Key, **kwargs):
+        self.calls['get_item'] += 1
+        self.wait()
+        item = self.items.get(self.key_of(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def update_item(self, Key, AttributeUpdates=None, UpdateExpression=None, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self.wait()
+        with self.lock:
+            self.calls['update_item'] += 1
+            if self.write_failures and random.random() < self.write_failures:
+                self.calls['throttled'] += 1
+                raise ClientError({'Error': {
+                    'Code': 'ProvisionedThroughputExceededException',
+                    'Message': 'The level of configured provisioned throughput for the table was exceeded',
+                }}, 'UpdateItem')
+            stored = self.items.get(self.key_of(Key), {})
+            if ConditionExpression is not None and not evaluate_expression(
+                    ConditionExpression, stored, ExpressionAttributeNames, ExpressionAttributeValues):
+                self.calls['conditional_check_failed'] += 1
+                raise ClientError({'Error': {
+                    'Code': 'ConditionalCheckFailedException',
+                    'Message': 'The conditional request failed',
+                }}, 'UpdateItem')
+            item = self.items.setdefault(self.key_of(Key), dict(Key))
+            for name, update in (AttributeUpdates or {}).items():
+                item[name] = update['Value']
+            if UpdateExpression is not None:
+                self.set_attributes(Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+
+    def set_attributes(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        # Only SET name = value assignments, then REMOVE name, are supported
+        item = self.items.setdefault(self.key_of(Key), dict(Key))
+        (assignments, _, removals) = UpdateExpression.removeprefix('SET ').partition(' REMOVE ')
+        for (name, value) in (assignment.split('=') for assignment in assignments.split(',')):
+            item[ExpressionAttributeNames[name.strip()]] = ExpressionAttributeValues[value.strip()]
+        for name in filter(None, removals.split(',')):
+            item.pop(ExpressionAttributeNames[name.strip()], None)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self, overwrite_by_pkeys)
+
+    def scan(self, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self.calls['scan'] += 1
+        self.wait()
+        items = [dict(item) for item in self.items.values()]
+        if ProjectionExpression is not None:
+            names = [(ExpressionAttributeNames or {}).get(name.strip(), name.strip())
+                     for name in ProjectionExpression.split(',')]
+            items = [{name: item[name] for name in names if name in item} for item in items]
+        self.calls['items_read'] += len(items)
+        return {'Items': items, 'Count': len(items)}
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, Limit=None, **kwargs):
+        self.calls['query'] += 1
+        self.wait()
+        items = [
+            dict(item) for item in self.items.values()
+            if evaluate(KeyConditionExpression, item)
+        ]
+        if len(self.key_schema) > 1:
+            items.sort(key=lambda item: item[self.key_schema[1]], reverse=not ScanIndexForward)
+        if Limit is not None:
+            items = items[:Limit]
+        self.calls['items_read'] += len(items)
+        return {'Items': items, 'Count': len(items)}
+
+
+class FakeClient:
+    """
+    The low-level client of the resource, which takes the same Python types.
+    """
+
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+        self.lock = threading.Lock()
+
+    def update_item(self, TableName, **kwargs):
+        return self.dynamodb.tables[TableName].update_item(**kwargs)
+
+    def transact_write_items(self, TransactItems):
+        """
+        Put and Update actions with conditions, applied all or none.
+        """
+        if len(TransactItems) > 100:
+            raise ValueError('TransactWriteItems takes at most 100 actions')
+        with self.lock:
+            reasons = []
+            for action in TransactItems:
+                ((kind, request),) = action.items()
+                table = self.dynamodb.tables[request['TableName']]
+                key = table.key_of(request['Item'] if kind == 'Put' else request['Key'])
+                condition = request.get('ConditionExpression')
+                passed = condition is None or evaluate_expression(
+                    condition, table.items.get(key, {}),
+                    request.get('ExpressionAttributeNames'), request.get('ExpressionAttributeValues'))
+                reasons.append({'Code': 'None' if passed else 'ConditionalCheckFailed'})
+            for table in {self.dynamodb.tables[next(iter(action.values()))['TableName']] for action in TransactItems}:
+                table.calls['transact_write_items'] += 1
+                table.wait()
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise ClientError({
+                    'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                    'CancellationReasons': reasons,
+                }, 'TransactWriteItems')
+            for action in TransactItems:
+                ((kind, request),) = action.items()
+                table = self.dynamodb.tables[request['TableName']]
+                if kind == 'Put':
+                    table.items[table.key_of(request['Item'])] = dict(request['Item'])
+                else:
+                    table.set_attributes(request['Key'], request['UpdateExpression'],
+                                         request['ExpressionAttributeNames'], request['ExpressionAttributeValues'])
+
+
+class FakeDynamoDB:
+    def __init__(self, latency=0, unprocessed=0, write_failures=0):
+        """
+        :param latency: float, the seconds every request takes
+        :param unprocessed: float, the share of the keys of every
+            BatchGetItem left unprocessed, as when throttled
+        :param write_failures: float, the chance of an UpdateItem to be
+            throttled after its retries
+        """
+        self.latency = latency
+        self.unprocessed = unprocessed
+        self.write_failures = write_failures
+        self.tables = {}
+        self.meta = SimpleNamespace(client=FakeClient(self))
+
+    def Table(self, name, key_schema=('id',)):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name, key_schema, self.latency, self.write_failures)
+            self.tables[name].meta = self.meta
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise ValueError('Too many items requested for the BatchGetItem call')
+        responses, unprocessed = {}, {}
+        for (name, request) in RequestItems.items():
+            table = self.tables[name]
+            table.calls['batch_get_item'] += 1
+            table.wait()
+            keys = request['Keys']
+            skipped = int(len(keys) * self.unprocessed)
+            if skipped:
+                keys, unprocessed[name] = keys[:-skipped], {'Keys': keys[-skipped:]}
+            found = [table.items.get(table.key_of(key)) for key in keys]
+            responses[name] = [dict(item) for item in found if item is not None]
+            table.calls['items_read'] += len(responses[name])
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+
+class FakeSQS:
+    """
+    An SQS queue with the limit of SendMessageBatch (10 messages per call).
+    """
+    QUEUE_URL = 'https://sqs.us-west-2.amazonaws.com/000000000000/DeadLetterQueue'
+    MAX_MESSAGES = 10
+
+    def __init__(self):
+        self.messages = []
+        self.calls = Counter()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        if len(Entries) > self.MAX_MESSAGES:
+            raise ValueError('Too many entries in the SendMessageBatch call')
+        self.calls['send_message_batch'] += 1
+        self.messages.extend(json.loads(entry['MessageBody']) for entry in Entries)
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+
+class FakeKinesis:
+    """
+    A Kinesis stream with the limits of PutRecords (500 records and 5 MiB
+    per call) and of provisioned shards (1000 records and 1 MiB per second
+    each), where partition keys are hashed to shards as in Kinesis.
+    """
+    MAX_RECORDS = 500
+    MAX_BYTES = 5 << 20
+
+    def __init__(self, shards=1, latency=0, records_per_shard=1000, bytes_per_shard=1 << 20):
+        self.shards = [f'shardId-{i:012d}' for i in range(shards)]
+        self.latency = latency
+        self.records_per_shard = records_per_shard
+        self.bytes_per_shard = bytes_per_shard
+        self.records = {shard: [] for shard in self.shards}
+        self.usage = Counter()
+        self.sequence_number = 0
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def shard_of(self, partition_key):
+        hashed = int(hashlib.md5(partition_key.encode('utf-8')).hexdigest(), 16)
+        return self.shards[hashed * len(self.shards) >> 128]
+
+    def put(self, data, partition_key):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        shard = self.shard_of(partition_key)
+        second = int(time.time())
+        size = len(data) + len(partition_key)
+        if (self.usage[shard, second, 'records'] + 1 > self.records_per_shard or
+                self.usage[shard, second, 'bytes'] + size > self.bytes_per_shard):
+            self.calls['throttled'] += 1
+            return {
+                'ErrorCode': 'ProvisionedThroughputExceededException',
+                'ErrorMessage': f'Rate exceeded for shard {shard}',
+            }
+        self.usage[shard, second, 'records'] += 1
+        self.usage[shard, second, 'bytes'] += size
+        self.sequence_number += 1
+        self.records[shard].append({
+            'SequenceNumber': str(self.sequence_number),
+            'ApproximateArrivalTimestamp': time.time(),
+            'Data': data,
+            'PartitionKey': partition_key,
+        })
+        return {'ShardId': shard, 'SequenceNumber': str(self.sequence_number)}
+
+    def put_records(self, Records, StreamName=None, **kwargs):
+        if len(Records) > self.MAX_RECORDS:
+            raise ValueError(f'PutRecords takes at most {self.MAX_RECORDS} records')
+        if sum(len(record['Data']) + len(record['PartitionKey']) for record in Records) > self.MAX_BYTES:
+            raise ValueError(f'PutRecords takes at most {self.MAX_BYTES} bytes')
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls['put_records'] += 1
+            results = [self.put(record['Data'], record['PartitionKey']) for record in Records]
+        failed = sum('ErrorCode' in result for result in results)
+        return {'FailedRecordCount': failed, 'Records': results}
+
+    def put_record(self, Data, PartitionKey, StreamName=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls['put_record'] += 1
+            result = self.put(Data, PartitionKey)
+        if 'ErrorCode' in result:
+            raise RuntimeError(result['ErrorMessage'])
+        return result
+
+    def list_shards(self, StreamName=None, **kwargs):
+        return {'Shards': [{'ShardId': shard} for shard in self.shards]}
+
+    def get_shard_iterator(self, ShardId, ShardIteratorType, StreamName=None, **kwargs):
+        position = len(self.records[ShardId]) if ShardIteratorType == 'LATEST' else 0
+        return {'ShardIterator': f'{ShardId}:{position}'}
+
+    def get_records(self, ShardIterator, Limit=10000, **kwargs):
+        shard, position = ShardIterator.rsplit(':', 1)
+        with self.lock:
+            records = self.records[shard][int(position):int(position) + Limit]
+        return {
+            'Records': records,
+            'NextShardIterator': f'{shard}:{int(position) + len(records)}',
+        }
+
+
+def kinesis_record(payload, sequence_number=0):
+    # Payloads already encoded, e.g. in the binary wire format, are kept as is
+    data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    return {
+        'kinesis': {
+            'partitionKey': 'partition_key',
+            'sequenceNumber': str(sequence_number),
+            'data': base64.b64encode(data).decode('ascii'),
+        },
+        'eventSource': 'aws:kinesis',
+    }
+
+
+def kinesis_event(payloads):
+    return {
+        'Records': [kinesis_record(payload, i) for (i, payload) in enumerate(payloads)],
+    }
+
+
+def install(module, dynamodb=None, sqs=None):
+    """
+    Point the table handles of a loaded handler module at a fake DynamoDB,
+    and its dead-letter queue, if any, at a fake SQS.
+    :param module: module, a handler module returned by load_lambda
+    :param dynamodb: FakeDynamoDB, the stand-in to use (a fresh one if omitted)
+    :param sqs: FakeSQS, the stand-in to use (a fresh one if omitted)
+    :return: FakeDynamoDB, the stand-in in use
+    """
+    dynamodb = dynamodb or FakeDynamoDB()
+    module.dynamodb = dynamodb
+    if hasattr(module, 'dead_letters'):
+        module.dead_letters.sqs = sqs or FakeSQS()
+        module.dead_letters.DEAD_LETTER_QUEUE_URL = FakeSQS.QUEUE_URL
+    for (attribute, value) in list(vars(module).items()):
+        if attribute.endswith('table') and hasattr(value, 'name'):
+            key_schema = KEY_SCHEMAS.get(value.name, ('id',))
+            setattr(module, attribute, dynamodb.Table(value.name, key_schema))
+    return dynamodb
+
+
+def load_lambda(name):
+    """
+    Import src/lambda/<name>/app.py under a unique module name.
+    :param name: str, the directory name of the Lambda function
+    :return: module, the imported handler module
+    """
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+    os.environ.setdefault('SENSOR_DATABASE_TABLE', 'SensorDatabaseTable')
+    os.environ.setdefault('SENSOR_HISTORY_TABLE', 'SensorHistoryTable')
+    os.environ.setdefault('ACTIVITY_DATABASE_TABLE', 'ActivityDatabaseTable')
+    os.environ.setdefault('STRATEGY_TABLE', 'StrategyTable')
+    path = LAMBDA_DIR / name
+    # Ahead of bench/ even when PYTHONPATH already lists them, so that no
+    # bench script shadows a module of the layer or the function
+    for directory in [LAYER_DIR, path]:
+        if str(directory) in sys.path:
+            sys.path.remove(str(directory))
+        sys.path.insert(0, str(directory))
+    spec = importlib.util.spec_from_file_location(f'{name}_app', path / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,151 @@
+"""
+Simulate an hour of sensor and occupancy readings of a floor and count the
+solves of its strategy when it is computed on every dashboard page view, as
+before, and when the DynamoDB streams recompute it on meaningful changes.
+
+Temperatures drift by a few hundredths of a degree between readings, with an
+occasional step as a window opens or a unit switches, and headcounts change
+every few minutes. The error is the mean distance between the temperature of
+a room and the one its strategy was computed for.
+
+    python bench/strategy_recompute.py --rooms 10 --view-interval 10
+"""
+import argparse
+from boto3.dynamodb.types import TypeSerializer
+from decimal import Decimal
+import json
+import logging
+import random
+import time
+
+from standins import install, load_lambda
+from suite import PROFILE, UNITS
+
+READING_INTERVAL = 5
+# Readings of this window arrive in one stream batch
+BATCHING_WINDOW = 5
+
+serializer = TypeSerializer()
+
+
+def stream_record(item):
+    return {
+        'eventName': 'MODIFY',
+        'eventSource': 'aws:dynamodb',
+        'dynamodb': {'NewImage': {name: serializer.serialize(value) for (name, value) in item.items()}},
+    }
+
+
+class Room:
+    def __init__(self, room_id, rng):
+        self.room_id = str(room_id)
+        self.rng = rng
+        self.temperature = rng.uniform(27, 31)
+        self.humidity = rng.uniform(55, 65)
+        self.headcount = rng.randint(0, 5)
+
+    def step(self, seconds):
+        rng = self.rng
+        self.temperature += rng.gauss(0, 0.03)
+        self.humidity += rng.gauss(0, 0.2)
+        if rng.random() < seconds / 900:
+            self.temperature += rng.choice([-1.5, 1])
+        changed_headcount = rng.random() < seconds / 300
+        if changed_headcount:
+            self.headcount = max(self.headcount + rng.choice([-2, -1, 1, 2]), 0)
+        return changed_headcount
+
+    def sensor_item(self, now):
+        return {
+            'id': self.room_id,
+            'temperature': Decimal(str(round(self.temperature, 2))),
+            'humidity': Decimal(str(round(self.humidity, 2))),
+            'timestamp': int(now),
+        }
+
+    def profile(self):
+        return {**PROFILE, 'temperature': self.temperature, 'humidity': self.humidity,
+                'number_of_people': self.headcount}
+
+
+def layout(rooms, rng):
+    return [{
+        'room_id': room.room_id,
+        'name': f'room{room.room_id}',
+        'profile': PROFILE,
+        'aircons': [{'unit': unit} for unit in rng.sample(UNITS, rng.randint(2, 4))],
+    } for room in rooms]
+
+
+def on_page_views(module, rooms, rooms_layout, args):
+    solves, error, views = 0, 0.0, 0
+    solved = {}
+    for second in range(0, args.duration, READING_INTERVAL):
+        for room in rooms:
+            room.step(READING_INTERVAL)
+        if second % args.view_interval:
+            continue
+        body = {'rooms': [{**room, 'profile': rooms[i].profile()} for (i, room) in enumerate(rooms_layout)]}
+        response = module.lambda_handler({'pathParameters': {'floor_id': '0'}, 'body': json.dumps(body)}, None)
+        assert response['statusCode'] == 200, response
+        if module.metrics.counts.get('cache_miss'):
+            solves += 1
+            solved = {room.room_id: room.temperature for room in rooms}
+        error += sum(abs(room.temperature - solved[room.room_id]) for room in rooms)
+        views += 1
+    return solves, error / (views * len(rooms))
+
+
+def on_changes(module, rooms, rooms_layout, args):
+    table = module.table
+    table.put_item(Item={'id': '0', 'version': 1, 'layout': json.dumps(rooms_layout)})
+    solves = 0
+
+    def optimize(request):
+        nonlocal solves
+        solves += 1
+        return module.vincent_algorithm.vincent_algorithm_floor(request)
+
+    error, samples, records = 0.0, 0, []
+    began = time.time()
+    for second in range(0, args.duration, READING_INTERVAL):
+        now = began + second
+        for room in rooms:
+            if room.step(READING_INTERVAL):
+                records.append(stream_record({'id': room.room_id, 'headcount': room.headcount, 'timestamp': int(now)}))
+            records.append(stream_record(room.sensor_item(now)))
+        if (second + READING_INTERVAL) % BATCHING_WINDOW == 0:
+            module.strategy_triggers.handle(table, records, optimize, now)
+            records = []
+        inputs = json.loads(table.items[('0',)].get('inputs', '{}'))
+        if second % args.view_interval == 0 and inputs:
+            error += sum(abs(room.temperature - inputs[room.room_id]['temperature'])
+                         for room in rooms if room.room_id in inputs)
+            samples += len(inputs)
+    return solves, error / max(samples, 1)
+
+
+def main(args):
+    module = load_lambda('propose_stategies')
+    install(module)
+    print(f"{args.rooms} rooms over {args.duration} s, readings every {READING_INTERVAL} s, "
+          f"dashboard viewed every {args.view_interval} s")
+    for (name, simulate) in [('page views', on_page_views), ('changes', on_changes)]:
+        rng = random.Random(args.seed)
+        rooms = [Room(i, rng) for i in range(args.rooms)]
+        rooms_layout = layout(rooms, rng)
+        began = time.perf_counter()
+        solves, error = simulate(module, rooms, rooms_layout, args)
+        print(f"{name:10} {solves:5d} solves  {error:5.2f} °C mean error  "
+              f"{time.perf_counter() - began:6.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--duration', type=int, default=3600, help='simulated seconds')
+    parser.add_argument('--view-interval', type=int, default=10, help='seconds between dashboard page views')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args)
@@ -0,0 +1,252 @@
+"""
+End-to-end benchmark of the Lambda handlers, run in-process against the
+Kinesis and DynamoDB stand-ins.
+
+Every workload reports the p50/p95/p99 latency of an invocation, the records
+(readings, headcounts or rooms) handled per second and the peak memory
+allocated, each the median of ROUNDS rounds over all the workloads in turn,
+so that a slow spell of the machine only skews one round. Results are written
+as JSON; given a baseline, the run fails when a workload's peak memory, or
+p50/p95 latency once the workload takes at least NOISE_FLOOR_MS, regressed
+beyond the threshold.
+
+Latencies are only comparable on the machine that measured them, so the
+baseline is recorded per machine, by `make bench-baseline`, and not
+committed.
+
+    python bench/suite.py --output bench_baseline.json
+    python bench/suite.py --output bench_results.json --baseline bench_baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from standins import ROOT, install, kinesis_event, load_lambda
+
+# Metrics that fail the run when they grow beyond the threshold
+GATED = ['p50_ms', 'p95_ms', 'peak_memory_kb']
+LATENCIES = ['p50_ms', 'p95_ms']
+# Shorter invocations vary up to 2x between runs, their latency is not gated
+NOISE_FLOOR_MS = 10
+# Rounds over every workload, whose median is reported
+ROUNDS = 3
+# Invocations of every workload whose peak memory is traced
+MEMORY_ITERATIONS = 3
+
+PROFILE = {
+    "time": 14,
+    "uv_index": 7,
+    "number_of_people": 5,
+    "space_size": 50,
+    "ceiling_height": 2.5,
+    "humidity": 60,
+    "temperature": 30,
+    "co2_concentration": 500,
+    "stress_index": 40,
+    "air_quality": 50,
+    "building_material": 70,
+    "month": 7,
+    "target_temperature": 26,
+    "target_time": 12,
+    "pressure": 101325,
+}
+UNITS = ['RAS-28NJP', 'RAS-36NJP', 'RAS-40NJP', 'RAS-50NJP', 'RAS-63NJP', 'RAS-71NJP']
+
+
+def sensor_event(size, sensors=50):
+    now = int(time.time())
+    return kinesis_event([{
+        "sensor_id": random.randrange(sensors),
+        "temperature": round(random.uniform(10, 30), 2),
+        "humidity": round(random.uniform(50, 70), 2),
+        "timestamp": now + i,
+    } for i in range(size)])
+
+
+def activity_event(size, rooms=50):
+    now = int(time.time())
+    return kinesis_event([{
+        "room_id": random.randrange(rooms),
+        "headcount": random.randint(0, 5),
+        "timestamp": now + i,
+    } for i in range(size)])
+
+
+def floor_event(size, rng=random):
+    # Random temperatures miss the strategy cache on every invocation
+    return {
+        "pathParameters": {"floor_id": "0"},
+        "body": json.dumps({"rooms": [{
+            "name": f"room{i}",
+            "profile": {**PROFILE, "temperature": round(rng.uniform(27, 31), 1)},
+            "aircons": [{"unit": unit} for unit in rng.sample(UNITS, rng.randint(2, 4))],
+        } for i in range(size)]}),
+    }
+
+
+def cached_floor_event(size):
+    # The same floor on every invocation, served from the strategy cache
+    return floor_event(size, random.Random(size))
+
+
+# handler -> workload -> (event factory, sizes, invocations per size)
+WORKLOADS = {
+    'monitor_sensors': {
+        'kinesis': (sensor_event, [10, 100, 500], 50),
+    },
+    'detect_activities': {
+        'kinesis': (activity_event, [10, 100, 500], 50),
+    },
+    'propose_stategies': {
+        'floor': (floor_event, [1, 10, 50], 30),
+        'floor_cached': (cached_floor_event, [50], 100),
+    },
+}
+
+
+def invoke_all(module, events):
+    latencies = []
+    for event in events:
+        began = time.perf_counter()
+        response = module.lambda_handler(event, None)
+        latencies.append(1000 * (time.perf_counter() - began))
+        assert response is None or response.get('statusCode', 200) == 200, response
+    return latencies
+
+
+def measure(module, make_event, size, iterations):
+    install(module)
+    # Events are built ahead so that only the handlers are timed
+    invoke_all(module, [make_event(size) for _ in range(MEMORY_ITERATIONS)])
+    events = [make_event(size) for _ in range(iterations)]
+    latencies = invoke_all(module, events)
+
+    tracemalloc.start()
+    invoke_all(module, [make_event(size) for _ in range(MEMORY_ITERATIONS)])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'iterations': iterations,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'records_per_s': round(size * iterations / (sum(latencies) / 1000), 1),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def median(rounds):
+    result = {'iterations': rounds[0]['iterations'], 'rounds': len(rounds)}
+    for metric in ['p50_ms', 'p95_ms', 'p99_ms', 'records_per_s', 'peak_memory_kb']:
+        result[metric] = round(float(np.median([measured[metric] for measured in rounds])), 3)
+    return result
+
+
+def run(handlers, scale, rounds):
+    modules = {handler: load_lambda(handler) for handler in WORKLOADS if not handlers or handler in handlers}
+    measured = {}
+    for _ in range(rounds):
+        for (handler, module) in modules.items():
+            for (workload, (make_event, sizes, iterations)) in WORKLOADS[handler].items():
+                for size in sizes:
+                    measured.setdefault((handler, workload, size), []).append(
+                        measure(module, make_event, size, max(int(iterations * scale), 1)))
+
+    results = []
+    for ((handler, workload, size), measures) in measured.items():
+        result = {
+            'handler': handler,
+            'workload': workload,
+            'size': size,
+            **median(measures),
+        }
+        print(f"{handler:18} {workload:13} size={size:4d}  "
+              f"p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms  {result['records_per_s']:10.1f} records/s  "
+              f"peak {result['peak_memory_kb']:9.1f} KiB")
+        results.append(result)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: list, a description of every regression beyond the threshold
+    """
+    previous = {(r['handler'], r['workload'], r['size']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['handler'], result['workload'], result['size']))
+        if before is None:
+            continue
+        for metric in GATED:
+            if metric in LATENCIES and before['p50_ms'] < NOISE_FLOOR_MS:
+                continue
+            ratio = result[metric] / before[metric] if before[metric] else 1
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f"{result['handler']} {result['workload']} size={result['size']} "
+                    f"{metric} {before[metric]} -> {result[metric]} ({ratio:.2f}x)")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    random.seed(0)
+    os.environ.setdefault('OPTIMIZE_METHOD', 'fast')  # as deployed by template.yaml
+    results = run(args.handlers, args.scale, args.rounds)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'node': platform.node(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, record one with `make bench-baseline`")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('node') != platform.node():
+            print(f"The baseline was recorded on {baseline.get('node')}, latencies may not compare")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:.0%} against {args.baseline} ({baseline.get('commit')})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', nargs='*', choices=list(WORKLOADS), help='handlers to run, all if omitted')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier of the invocations per workload')
+    parser.add_argument('--rounds', type=int, default=ROUNDS, help='rounds over every workload')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.5, help='tolerated relative regression')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    main(args)
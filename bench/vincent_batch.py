@@ -0,0 +1,106 @@
+"""
+Compare the throughput of the vectorized intensity and cooling power
+functions against a per-profile loop.
+
+    python bench/vincent_batch.py --profiles 10000
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from standins import load_lambda
+
+load_lambda("propose_stategies")
+import CoolProp.CoolProp as CP  # noqa: E402
+import vincent_algorithm  # noqa: E402
+
+
+def random_profiles(count, rng):
+    return {
+        "time": rng.integers(0, 24, count),
+        "uv_index": rng.integers(0, 12, count),
+        "number_of_people": rng.integers(0, 20, count),
+        "space_size": rng.uniform(20, 200, count),
+        "ceiling_height": rng.uniform(2.4, 3.5, count),
+        "humidity": rng.uniform(40, 80, count),
+        "temperature": rng.uniform(26, 35, count),
+        "co2_concentration": rng.uniform(400, 1000, count),
+        "stress_index": rng.uniform(0, 100, count),
+        "air_quality": rng.uniform(0, 100, count),
+        "building_material": rng.uniform(0, 100, count),
+        "month": rng.integers(1, 13, count),
+        "target_temperature": rng.uniform(22, 26, count),
+        "target_time": rng.uniform(5, 30, count),
+        "pressure": np.full(count, 101325.0),
+    }
+
+
+def coolprop_cooling_power(data):
+    # The per-request CoolProp evaluation the lookup table replaced
+    pressure = data["pressure"]
+    current = data["current_temperature"] + 273.15
+    target = data["target_temperature"] + 273.15
+    relative_humidity = data["current_relative_humidity"] / 100
+    current_humidity_ratio = CP.HAPropsSI('W', 'T', current, 'P', pressure, 'RH', relative_humidity)
+    current_enthalpy = CP.HAPropsSI('H', 'T', current, 'P', pressure, 'W', current_humidity_ratio)
+    target_humidity_ratio = CP.HAPropsSI('W', 'T', target, 'P', pressure, 'RH', relative_humidity)
+    target_enthalpy = CP.HAPropsSI('H', 'T', target, 'P', pressure, 'W', target_humidity_ratio)
+    density = CP.PropsSI('D', 'T', current, 'P', pressure, 'Air')
+    required_energy = data["volume"] * density * (current_enthalpy - target_enthalpy)
+    return required_energy / (data["target_time"] * 60) * (data["alpha_value"] / 2 + 1)
+
+
+def loop(rows, cooling_power):
+    results = []
+    for row in rows:
+        intensity = vincent_algorithm.calculate_ac_intensity(dict(row))
+        results.append(cooling_power({
+            "volume": row["space_size"] * row["ceiling_height"],
+            "current_relative_humidity": row["humidity"],
+            "current_temperature": row["temperature"],
+            "target_temperature": row["target_temperature"],
+            "target_time": row["target_time"],
+            "alpha_value": intensity,
+            "pressure": row["pressure"],
+        }))
+    return np.array(results)
+
+
+def main(count):
+    rng = np.random.default_rng(0)
+    profiles = random_profiles(count, rng)
+    rows = [
+        {key: values[i].item() for (key, values) in profiles.items()}
+        for i in range(count)
+    ]
+
+    timings = {}
+    start = time.perf_counter()
+    expected = loop(rows, coolprop_cooling_power)
+    timings["loop, CoolProp"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scalar = loop(rows, vincent_algorithm.calculate_cooling_power)
+    timings["loop, scalar wrappers"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, batch = vincent_algorithm.calculate_required_power_batch(profiles)
+    timings["batch"] = time.perf_counter() - start
+
+    assert np.allclose(scalar, batch)
+    error = np.max(np.abs(batch / expected - 1))
+    for (name, elapsed) in timings.items():
+        print(f"{name:24} {elapsed * 10000 / count:9.4f} s per 10k profiles "
+              f"{count / elapsed:12.0f} profiles/s")
+    print(f"max relative deviation from CoolProp {error:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized strategy inputs.")
+    parser.add_argument("--profiles", type=int, default=10000, help="Number of random room profiles.")
+    args = parser.parse_args()
+
+    logging.disable(logging.DEBUG)
+    main(args.profiles)
@@ -1,13 +1,16 @@
-import boto3
 from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'src' / 'layer' / 'python'))
+import aws_clients  # noqa: E402
 
 # Write python method to insert into DynamoDB table with columns column jobId, jobDescription, status, notes, assignedTo
 
 
 def insert_data_dynamodb(job_id, job_description, status, completion_date, notes, assigned_to):
-    # Initialize DynamoDB client
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table("JobsTable")
+    # The DynamoDB resource is shared by every insert
+    table = aws_clients.resource('dynamodb').Table("JobsTable")
 
     # Define the item to be inserted
     item = {
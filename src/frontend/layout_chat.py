@@ -0,0 +1,82 @@
+"""
+Prompt and bounded context of the Investigate Layouts chat.
+
+Sending the whole conversation and every model name of the catalog made each
+turn's prompt grow with the turns and with the catalog. Instead, the prompt
+holds the last MEMORY_TURNS turns, and only the catalog units matching the
+models mentioned in the human's reply, found with the fuzzy index of
+unit_catalog. So that the facts of older turns survive the window, the AI
+starts every reply with notes of everything collected so far, which are kept
+in the memory but not shown to the human. Only the notes of the last reply
+are kept, so the prompt grows with the facts collected, not with the turns.
+"""
+import re
+
+SECRET_WORD = "Here is the output in the requested JSON format"
+# Turns of the conversation kept verbatim in the prompt
+MEMORY_TURNS = 3
+NOTES = re.compile(r'\s*<notes>(.*?)</notes>\s*', re.DOTALL)
+TEMPLATE = """
+AI needs to help a zero-knowledge human to investigate their rooms informations:
+the area and the AC units. The investigation should be step-by-step,
+so just propose one proper question to user every time.
+
+1. If the rooms are unknown, ask human about the rooms and how to name them.
+2. If the rooms are known, ask human about the first room that the ACs are
+   still unknown.
+3. If human respond an AC not recognized, confirm with human. Skip those
+   unrecognized AC units in the following dialogs.
+4. If collected enough info, confirm with user and output the conclusion in
+   JSON format. Attach the sentence "{secret_word}" (case-sensitive) before
+   the JSON code and put the JSON code in code blocks. Always use metric system
+   in the JSON code.
+5. Only the last turns of the conversation are kept, so start every reply with
+   the rooms, areas and AC units collected so far, briefly, between <notes>
+   and </notes>.
+
+{format_instructions}
+
+Recognized AC units similar to those in the human's reply:
+{units}
+Current conversation:
+{history}
+Here is the human's next reply:
+{input}
+AI:
+"""
+
+
+def relevant_units(catalog, text):
+    """
+    :param catalog: unit_catalog.UnitCatalog
+    :param text: str, the human's reply
+    :return: str, the recognized units it may mention, for the prompt
+    """
+    return ', '.join(catalog.search(text)) or 'none'
+
+
+def split_notes(response):
+    """
+    :param response: str, the reply of the AI
+    :return: tuple, the notes and the reply without them
+    """
+    match = NOTES.search(response)
+    if match is None:
+        return None, response
+    return match.group(1).strip(), strip_notes(response)
+
+
+def strip_notes(response):
+    return NOTES.sub('\n', response, count=1).strip()
+
+
+def prune(messages):
+    """
+    Bound the memory to the turns in the prompt, keeping the notes of the
+    last reply only, as the older ones are outdated.
+    :param messages: list, the messages of the chat memory, changed in place
+    """
+    del messages[:-2 * MEMORY_TURNS]
+    for message in messages[:-1]:
+        if message.type == 'ai':
+            message.content = strip_notes(message.content)
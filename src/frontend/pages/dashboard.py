@@ -2,23 +2,29 @@ import streamlit as st
 from streamlit.logger import get_logger
 from st_pages import add_page_title
 
-import boto3
-from boto3.dynamodb.conditions import Key
-import itertools
+import aws_clients
+from botocore.exceptions import ClientError
+import dynamodb_reads
 import json
 import logging
-import time
+import unit_catalog
 
 logger = get_logger(__name__)
 logger.setLevel(logging.DEBUG)
 
 add_page_title()
 
-lambda_client = boto3.client("lambda")
+lambda_client = aws_clients.client("lambda")
 PROPOSE_STRATEGIES_NAME = "air-conditioner-strategy-ProposeStrategies-2t2LAjv0qfzw"
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table("SensorDatabaseTable")
+SENSOR_DATABASE_TABLE = "SensorDatabaseTable"
+# Sensor readings arrive every few seconds, so reruns within this reuse them
+SENSOR_CACHE_TTL = 5
+# Strategies are recomputed by ProposeStrategies when the readings change
+STRATEGY_TABLE = "StrategyTable"
+FLOOR_ID = "0"
+
+dynamodb = aws_clients.resource("dynamodb")
 
 
 def invoke_propose_strategies(request: dict):
@@ -37,6 +43,65 @@ def invoke_propose_strategies(request: dict):
     return json.loads(payload["body"])
 
 
+@st.cache_data(ttl=SENSOR_CACHE_TTL, show_spinner=False)
+def load_sensors(room_ids: tuple):
+    # One BatchGetItem per hundred rooms rather than a query per room
+    items = dynamodb_reads.read_items(
+        dynamodb, SENSOR_DATABASE_TABLE,
+        [{"id": room_id} for room_id in room_ids],
+        make_table=lambda: dynamodb.Table(SENSOR_DATABASE_TABLE),
+    )
+    return {item["id"]: item for item in items}
+
+
+@st.cache_data(ttl=SENSOR_CACHE_TTL, show_spinner=False)
+def load_strategy(floor_id: str):
+    item = dynamodb.Table(STRATEGY_TABLE).get_item(Key={"id": floor_id}).get("Item")
+    if item is None or "strategy" not in item:
+        return None
+    return json.loads(item["strategy"])
+
+
+def save_layout(floor_id: str, rooms: list, catalog: unit_catalog.UnitCatalog):
+    # The strategy of the previous layout is dropped, the next change of any
+    # room computes the one of this layout. Every session saves the layout it
+    # shows, so the strategy is only dropped when the layout differs.
+    layout = [
+        {"room_id": str(room_id), **room}
+        for (room_id, room) in enumerate(floor_request(rooms, catalog)["rooms"])
+    ]
+    try:
+        dynamodb.Table(STRATEGY_TABLE).update_item(
+            Key={"id": floor_id},
+            UpdateExpression="SET #layout = :layout REMOVE #inputs, #strategy ADD #version :one",
+            ConditionExpression="attribute_not_exists(#layout) OR #layout <> :layout",
+            ExpressionAttributeNames={
+                "#layout": "layout",
+                "#inputs": "inputs",
+                "#strategy": "strategy",
+                "#version": "version",
+            },
+            ExpressionAttributeValues={":layout": json.dumps(layout, sort_keys=True), ":one": 1},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        logger.debug("The layout of the floor %s is unchanged", floor_id)
+        return
+    load_strategy.clear()
+
+
+def floor_request(rooms: list, catalog: unit_catalog.UnitCatalog):
+    # The strategy resolves the specs of the units from the catalog by name
+    return {
+        "rooms": [{
+            "name": room["name"],
+            "profile": {**profile, "space_size": room.get("area", profile["space_size"])},
+            "aircons": [{"unit": unit} for unit in room["aircons"] if unit in catalog],
+        } for room in rooms]
+    }
+
+
 profile = {
     "time": 14,
     "uv_index": 7,
@@ -62,32 +127,35 @@ if st.session_state.conclusion is None:
     st.info("Room layouts have not been set up yet!")
 else:
     conclusion = st.session_state.conclusion
-    with st.spinner("Thinking..."):
-        strategy = invoke_propose_strategies(profile)
-        time.sleep(2)  # Our efficiency is far too great
-    percents = itertools.chain(
-        strategy["optimized_percentages"].values(),
-        itertools.repeat(0.0)  # avoid iterator end exception
-    )
-
-    for (room_id, room) in enumerate(conclusion["rooms"]):
+    catalog = unit_catalog.load_catalog()
+    layout = json.dumps(conclusion["rooms"], sort_keys=True)
+    if st.session_state.get("saved_layout") != layout:
+        save_layout(FLOOR_ID, conclusion["rooms"], catalog)
+        st.session_state.saved_layout = layout
+
+    strategy = load_strategy(FLOOR_ID)
+    if strategy is None or len(strategy["rooms"]) != len(conclusion["rooms"]):
+        with st.spinner("Thinking..."):
+            # Until the readings first change, one request optimizes every room of the floor
+            strategy = invoke_propose_strategies(floor_request(conclusion["rooms"], catalog))
+    sensors = load_sensors(tuple(str(room_id) for room_id in range(len(conclusion["rooms"]))))
+
+    for (room_id, (room, room_strategy)) in enumerate(zip(conclusion["rooms"], strategy["rooms"])):
         st.subheader(room["name"])
 
+        percents = iter(room_strategy["optimized_percentages"])
         columns = st.columns(3)
         for (column, unit) in zip(columns, room["aircons"]):
-            number = int(100 * next(percents))
+            # Units missing from the catalog are not optimized
+            number = int(100 * next(percents)["percentage"]) if unit in catalog else 0
             column.metric(label=unit, value=f"{number} %")
 
-        response = table.query(
-            TableName="SensorDatabaseTable",
-            KeyConditionExpression=Key("id").eq(str(room_id)),
-        )
-        items = response["Items"]
-        if len(items) == 0:
+        item = sensors.get(str(room_id))
+        if item is None:
             st.write("Sensor disconnected")
         else:
-            temperature = items[0]["temperature"]
-            humidity = items[0]["humidity"]
+            temperature = item["temperature"]
+            humidity = item["humidity"]
             st.write(f"Temperature {temperature:.1f}°C and humidity {humidity:.1f}%")
 
         st.divider()
@@ -2,16 +2,17 @@ import streamlit as st
 from streamlit.logger import get_logger
 from st_pages import add_page_title
 
-import boto3
-import json
+import aws_clients
+from kinesis_producer import KinesisProducer
 import logging
-import random
+import person_counting
 import time
+import wire_format
 
 logger = get_logger(__name__)
 logger.setLevel(logging.DEBUG)
 
-kinesis_client = boto3.client('kinesis')
+kinesis_client = aws_clients.client('kinesis')
 DEFAULT_ARN = "air-conditioner-strategy-ActivityKinesisStream-o2Vb8ujOT4Nl"
 
 add_page_title()
@@ -22,23 +23,29 @@ if enabled:
     st.info("Upload data to kinesis when taking photos.", icon="🤖")
 
 stream_arn = st.text_input("Kinesis Stream ARN", DEFAULT_ARN)
+# The background of the camera is learnt from the photos taken so far
+if "person_counter" not in st.session_state:
+    st.session_state.person_counter = person_counting.PersonCounter(warmup_frames=1)
+counter = st.session_state.person_counter
+st.caption("Take the first photo of the empty room to learn its background.")
 picture = st.camera_input("Infrared Sensor")
 headcount = 0
 
 if picture:
-    headcount = random.randint(0, 2)
-    logger.info(f"Infrared sensor detects {headcount} people")
+    headcount, confidence = counter.count(picture.getvalue())
+    logger.info(f"Infrared sensor detects {headcount} people with confidence {confidence}")
+    st.progress(confidence, text=f"Confidence {confidence:.0%}")
     if enabled:
         data = {
             "room_id": 0,
             "headcount": headcount,
+            "confidence": confidence,
             "timestamp": int(time.time()),
         }
-        response = kinesis_client.put_record(
-            StreamName=stream_arn,
-            Data=json.dumps(data),
-            PartitionKey='partition_key',
-        )
-        logger.debug(f"Pushed data {data} to kinesis with response {response}")
+        # A photo is sent right away, through the producer the simulator uses
+        producer = KinesisProducer(kinesis_client, stream_arn, wire_format.ACTIVITY, linger_seconds=0)
+        producer.put(data, str(data["room_id"]))
+        producer.close()
+        logger.debug(f"Pushed data {data} to kinesis: {dict(producer.counts)}")
 
 headcount = st.number_input("Number of People", value=headcount, min_value=0)
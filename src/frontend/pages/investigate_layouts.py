@@ -2,16 +2,19 @@ import streamlit as st
 from streamlit.logger import get_logger
 from st_pages import add_page_title
 
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+from langchain.chains import LLMChain
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import PromptTemplate
 from langchain_aws import ChatBedrock
+from langchain_core.callbacks import BaseCallbackHandler
 
 import json
+import layout_chat
+from layout_chat import SECRET_WORD
 import logging
-import pandas as pd
 from pydantic import BaseModel, Field
+import unit_catalog
 
 logger = get_logger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -29,32 +32,15 @@ class Layout(BaseModel):
     rooms: list[Room]
 
 
-SECRET_WORD = "Here is the output in the requested JSON format"
-TEMPLATE = """
-AI needs to help a zero-knowledge human to investigate their rooms informations:
-the area and the AC units. The investigation should be step-by-step,
-so just propose one proper question to user every time.
+class TokenUsage(BaseCallbackHandler):
+    """
+    Keeps the token counts Bedrock reported for the last call.
+    """
+    def __init__(self):
+        self.usage = {}
 
-1. If the rooms are unknown, ask human about the rooms and how to name them.
-2. If the rooms are known, ask human about the first room that the ACs are
-   still unknown.
-3. If human respond an AC not recognized, confirm with human. Skip those
-   unrecognized AC units in the following dialogs.
-4. If collected enough info, confirm with user and output the conclusion in
-   JSON format. Attach the sentence "{secret_word}" (case-sensitive) before
-   the JSON code and put the JSON code in code blocks. Always use metric system
-   in the JSON code.
-
-{format_instructions}
-
-Recognized AC units:
-{units}
-Current conversation:
-{history}
-Here is the human's next reply:
-{input}
-AI:
-"""
+    def on_llm_end(self, response, **kwargs):
+        self.usage = (response.llm_output or {}).get("usage", {})
 
 
 def extract_json_from_markdown(content):
@@ -90,26 +76,28 @@ expander = st.expander("Evaluated Room Layouts")
 
 
 if "chain" not in st.session_state:
-    datasheet = pd.read_csv("data/hitachi-spec-en.csv")
     parser = PydanticOutputParser(pydantic_object=Layout)
+    token_usage = TokenUsage()
     llm = ChatBedrock(
         model_id="anthropic.claude-v2:1",
         model_kwargs={"temperature": 0},
+        callbacks=[token_usage],
     )
-    memory = ConversationBufferMemory()
+    # The prompt stays as large at the twentieth turn as at the second
+    memory = ConversationBufferWindowMemory(k=layout_chat.MEMORY_TURNS, input_key="input")
     prompt = PromptTemplate(
-        template=TEMPLATE,
-        input_variables=["history", "input"],
+        template=layout_chat.TEMPLATE,
+        input_variables=["history", "input", "units"],
         partial_variables={
-            "units": str(datasheet.unit.unique().tolist()),
             "format_instructions": parser.get_format_instructions(),
             "secret_word": SECRET_WORD,
         }
     )
-    conversation = ConversationChain(
+    conversation = LLMChain(
         llm=llm, memory=memory, prompt=prompt, verbose=True
     )
     st.session_state.chain = conversation
+    st.session_state.token_usage = token_usage
 
 if "messages" not in st.session_state or reset_button:
     conversation = st.session_state.chain
@@ -124,9 +112,15 @@ if "conclusion" not in st.session_state:
     st.session_state.conclusion = None
 
 
+def write_usage(usage):
+    if usage:
+        st.caption(f"{usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion tokens")
+
+
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
+        write_usage(message.get("usage"))
 
 if question := st.chat_input("write here"):
     with st.chat_message("user"):
@@ -137,14 +131,21 @@ if question := st.chat_input("write here"):
 
     with st.chat_message("assistant"):
         conversation = st.session_state.chain
+        units = layout_chat.relevant_units(unit_catalog.load_catalog(), question)
         with st.spinner("Thinking..."):
-            response = conversation.predict(input=question)
+            response = conversation.predict(input=question, units=units)
             logger.debug(f"Obtained response {response} from chatbot")
-        st.write(response)
+        # The notes stay in the memory only
+        notes, reply = layout_chat.split_notes(response)
+        layout_chat.prune(conversation.memory.chat_memory.messages)
+        logger.debug(f"Collected notes {notes}")
+        usage = dict(st.session_state.token_usage.usage)
+        st.write(reply)
+        write_usage(usage)
         if SECRET_WORD in response:
             st.session_state.conclusion = extract_json_from_markdown(response)
 
-    ai_message = {"role": "assistant", "content": response}
+    ai_message = {"role": "assistant", "content": reply, "usage": usage}
     st.session_state.messages.append(ai_message)
 
 
@@ -2,52 +2,114 @@ import streamlit as st
 from streamlit.logger import get_logger
 from st_pages import add_page_title
 
-import asyncio
-import boto3
-import json
+import aws_clients
+from kinesis_producer import KinesisProducer
 import logging
 import random
+import threading
 import time
+import wire_format
 
 logger = get_logger(__name__)
 logger.setLevel(logging.DEBUG)
 
-kinesis_client = boto3.client('kinesis')
+kinesis_client = aws_clients.client('kinesis')
 DEFAULT_ARN = "air-conditioner-strategy-SensorKinesisStream-NpM7rD086C1n"
 
 add_page_title()
 
 
-async def heartbeat():
-    while st.session_state.keep_running:
-        data = {
-            "sensor_id": 0,
-            "temperature": random.uniform(*st.session_state.temperature_range),
-            "humidity": random.uniform(*st.session_state.humidity_range),
-            "timestamp": int(time.time()),
-        }
-        response = kinesis_client.put_record(
-            StreamName=st.session_state.stream_arn,
-            Data=json.dumps(data),
-            PartitionKey='partition_key',
-        )
-        logger.debug(f"Pushed data {data} to kinesis with response {response}")
-        time.sleep(1)
+class HeartbeatPublisher(threading.Thread):
+    """
+    Background thread generating a reading of every virtual sensor each
+    second into an aggregating producer, which sends them within the flush
+    interval, so the Streamlit script never blocks on Kinesis.
+    """
+
+    def __init__(self, client):
+        super().__init__(daemon=True)
+        self.client = client
+        self.settings = {}
+        self.producer = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def configure(self, **settings):
+        # The thread cannot read st.session_state, so the page hands over
+        # the widget values on every rerun
+        with self.lock:
+            self.settings = settings
+
+    def producer_for(self, settings):
+        # Another stream or flush interval takes a new producer
+        producer = self.producer
+        if producer is None or (producer.stream_name, producer.linger_seconds) != (settings["stream_arn"], settings["flush_interval"]):
+            if producer is not None:
+                producer.close()
+            self.producer = KinesisProducer(
+                self.client, settings["stream_arn"], wire_format.SENSOR, linger_seconds=settings["flush_interval"],
+            )
+        return self.producer
+
+    def generate(self, producer, settings):
+        timestamp = int(time.time())
+        for sensor_id in range(settings["sensors"]):
+            producer.put({
+                "sensor_id": sensor_id,
+                "temperature": random.uniform(*settings["temperature_range"]),
+                "humidity": random.uniform(*settings["humidity_range"]),
+                "timestamp": timestamp,
+            }, str(sensor_id))
+
+    def run(self):
+        next_reading = time.time()
+        while not self.stopped.is_set():
+            with self.lock:
+                settings = dict(self.settings)
+            self.generate(self.producer_for(settings), settings)
+            next_reading += 1
+            self.stopped.wait(max(next_reading - time.time(), 0))
+        # Send what is left before exiting
+        if self.producer is not None:
+            self.producer.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=10)
 
 
 keep_running = st.checkbox("Enable")
+flush_interval = st.number_input("Flush Interval (seconds)", value=5.0, min_value=1.0)
 if keep_running:
-    st.info("Upload data to kinesis every second.", icon='🤖')
+    st.info(f"Upload data to kinesis every {flush_interval:.0f} seconds.", icon='🤖')
 
 stream_arn = st.text_input("Sensor Kinesis Stream ARN", DEFAULT_ARN)
+sensors = st.number_input("Virtual Sensors", value=1, min_value=1, max_value=10000)
 temperature_range = st.slider("Temperature", -20.0, 60.0, (10.0, 30.0))
 humidity_range = st.slider("Relative Humidity", 0.0, 100.0, (50.0, 70.0))
 
-st.session_state.keep_running = keep_running
-st.session_state.stream_arn = stream_arn
-st.session_state.temperature_range = temperature_range
-st.session_state.humidity_range = humidity_range
-
+publisher = st.session_state.get("publisher")
 if keep_running:
-    # THE CODE IS STUCK HERE
-    asyncio.run(heartbeat())
+    if publisher is None or not publisher.is_alive():
+        publisher = st.session_state.publisher = HeartbeatPublisher(kinesis_client)
+    publisher.configure(
+        stream_arn=stream_arn,
+        sensors=sensors,
+        temperature_range=temperature_range,
+        humidity_range=humidity_range,
+        flush_interval=flush_interval,
+    )
+    if not publisher.is_alive():
+        publisher.start()
+elif publisher is not None:
+    publisher.stop()
+    st.session_state.publisher = None
+
+if publisher is not None and publisher.producer is not None:
+    producer = publisher.producer
+    columns = st.columns(5)
+    columns[0].metric("Sent", producer.counts["readings_sent"])
+    columns[1].metric("Records", producer.counts["records_sent"])
+    columns[2].metric("Buffered", producer.buffered)
+    columns[3].metric("Throttled", producer.counts["throttled"])
+    columns[4].metric("Errors", producer.counts["errors"] + producer.counts["failed"])
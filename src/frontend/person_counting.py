@@ -0,0 +1,184 @@
+"""
+CPU-only person counting of camera frames by background subtraction.
+
+Frames are decoded straight to grayscale at a fraction of their size (JPEG
+frames are downscaled by the decoder itself) and compared against a running
+background of their camera. The foreground is reduced to a coarse grid of
+cells, and every connected blob of occupied cells counts as as many people
+as its area holds. Frames of many cameras are compared in one batch, and a
+camera only processes one frame out of every frame_skip + 1, repeating its
+last count in between.
+
+The confidence of a count falls while the background is still being learnt
+and when blobs are far from whole multiples of a person.
+"""
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# Width in pixels the frames are downscaled to
+WIDTH = 160
+# Side in pixels of the cells the foreground is counted in
+CELL = 8
+# Gray level difference from the background that makes a pixel foreground
+FOREGROUND_THRESHOLD = 25
+# Share of foreground pixels that makes a cell occupied
+CELL_OCCUPANCY = 0.3
+# Occupied cells of one person at WIDTH, and of the smallest blob counted
+PERSON_CELLS = 6
+MIN_BLOB_CELLS = 2
+# Rate the background follows the frames at where they are not foreground
+BACKGROUND_RATE = 0.05
+# Frames the background is learnt from before counts are fully trusted
+WARMUP_FRAMES = 5
+# Above this share of foreground the lighting changed, not the people
+MAX_FOREGROUND = 0.6
+
+
+def decode(frame, width=WIDTH):
+    """
+    :param frame: bytes, an encoded image
+    :param width: int, the width to downscale to
+    :return: numpy.ndarray, the grayscale frame as float32, its height a
+        multiple of CELL
+    """
+    image = Image.open(BytesIO(frame))
+    height = max(CELL, round(image.height * width / image.width / CELL) * CELL)
+    # JPEG decodes at 1/2, 1/4 or 1/8 of its size when asked in advance
+    image.draft('L', (width, height))
+    image = image.convert('L').resize((width, height), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32)
+
+
+def blobs(occupied):
+    """
+    :param occupied: numpy.ndarray, the occupied cells of a frame
+    :return: list, the number of cells of every 4-connected blob
+    """
+    unvisited = set(zip(*(indices.tolist() for indices in np.nonzero(occupied))))
+    sizes = []
+    while unvisited:
+        stack = [unvisited.pop()]
+        size = 0
+        while stack:
+            (row, column) = stack.pop()
+            size += 1
+            for neighbour in [(row - 1, column), (row + 1, column), (row, column - 1), (row, column + 1)]:
+                if neighbour in unvisited:
+                    unvisited.remove(neighbour)
+                    stack.append(neighbour)
+        sizes.append(size)
+    return sizes
+
+
+def estimate(sizes, person_cells):
+    """
+    :param sizes: list, the cells of every blob of a frame
+    :param person_cells: float, the cells of one person
+    :return: tuple, the headcount and how well the blobs fit whole people
+    """
+    headcount, fits = 0, []
+    for size in sizes:
+        if size < MIN_BLOB_CELLS:
+            continue
+        people = size / person_cells
+        count = max(1, round(people))
+        headcount += count
+        fits.append(max(0.0, 1 - abs(people - count) / count))
+    return headcount, (sum(fits) / len(fits) if fits else 1.0)
+
+
+class Camera:
+    def __init__(self):
+        self.background = None
+        self.learnt = 0
+        self.frames = 0
+        self.result = (0, 0.0)
+
+
+class PersonCounter:
+    """
+    Count the people in the frames of many cameras, keeping the background
+    of every camera between calls.
+    """
+
+    def __init__(self, frame_skip=0, width=WIDTH, person_cells=PERSON_CELLS, warmup_frames=WARMUP_FRAMES):
+        """
+        :param frame_skip: int, the frames skipped after every processed one
+        :param width: int, the width frames are downscaled to
+        :param person_cells: float, the cells of one person at WIDTH
+        :param warmup_frames: int, the frames before the background is trusted
+        """
+        self.frame_skip = frame_skip
+        self.width = width // CELL * CELL
+        # Areas scale with the square of the width
+        self.person_cells = person_cells * (width / WIDTH) ** 2
+        self.warmup_frames = warmup_frames
+        self.cameras = {}
+        self.processed = 0
+        self.skipped = 0
+
+    def count(self, frame, camera_id=0):
+        """
+        :param frame: bytes, an encoded image
+        :return: tuple, the headcount and its confidence between 0 and 1
+        """
+        return self.count_batch({camera_id: frame})[camera_id]
+
+    def count_batch(self, frames):
+        """
+        :param frames: dict, the encoded image of every camera
+        :return: dict, the headcount and its confidence of every camera
+        """
+        results, due = {}, {}
+        for (camera_id, frame) in frames.items():
+            camera = self.cameras.setdefault(camera_id, Camera())
+            camera.frames += 1
+            if (camera.frames - 1) % (self.frame_skip + 1):
+                self.skipped += 1
+                results[camera_id] = camera.result
+            else:
+                due[camera_id] = decode(frame, self.width)
+        self.processed += len(due)
+
+        # Frames of the same size are compared against their backgrounds at once
+        by_shape = {}
+        for (camera_id, image) in due.items():
+            background = self.cameras[camera_id].background
+            if background is None or background.shape != image.shape:
+                self.cameras[camera_id].background = image
+                self.cameras[camera_id].learnt = 1
+                results[camera_id] = self.cameras[camera_id].result = (0, 0.0)
+            else:
+                by_shape.setdefault(image.shape, []).append(camera_id)
+        for (shape, camera_ids) in by_shape.items():
+            results.update(self.compare(shape, camera_ids, [due[camera_id] for camera_id in camera_ids]))
+        return results
+
+    def compare(self, shape, camera_ids, images):
+        (height, width) = shape
+        images = np.stack(images)
+        backgrounds = np.stack([self.cameras[camera_id].background for camera_id in camera_ids])
+        foreground = np.abs(images - backgrounds) > FOREGROUND_THRESHOLD
+        cells = foreground.reshape(len(camera_ids), height // CELL, CELL, width // CELL, CELL).mean(axis=(2, 4))
+        occupied = cells > CELL_OCCUPANCY
+        # The background follows the frames only where they show no people
+        rate = np.where(foreground, 0, BACKGROUND_RATE).astype(np.float32)
+        backgrounds += rate * (images - backgrounds)
+
+        results = {}
+        for (i, camera_id) in enumerate(camera_ids):
+            camera = self.cameras[camera_id]
+            if foreground[i].mean() > MAX_FOREGROUND:
+                # Relearn the background after a change of lighting
+                camera.background, camera.learnt = images[i], 1
+                camera.result = (0, 0.0)
+            else:
+                camera.background = backgrounds[i]
+                camera.learnt += 1
+                (headcount, fit) = estimate(blobs(occupied[i]), self.person_cells)
+                warm = min(1.0, (camera.learnt - 1) / self.warmup_frames)
+                camera.result = (headcount, round(warm * fit, 3))
+            results[camera_id] = camera.result
+        return results
@@ -1,14 +1,16 @@
-import base64
-import boto3
+import aws_clients
+import dead_letters
+import dynamodb_writes
 import json
-import logging
+import instrumentation
+import kinesis_records
+from instrumentation import metrics
 from decimal import Decimal
 import os
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger = instrumentation.get_logger()
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = aws_clients.resource('dynamodb')
 ACTIVITY_DATABASE_TABLE = os.environ.get('ACTIVITY_DATABASE_TABLE')
 table = dynamodb.Table(ACTIVITY_DATABASE_TABLE)
 
@@ -35,16 +37,16 @@ def bad_request(message: str):
 
 
 def handle_api_event(event, context):
-    logger.debug(f'RESTful API triggered event {event}')
+    logger.debug('RESTful API triggered event %s', event)
     path_parameters = event.get('pathParameters', {})
     room_id = path_parameters.get('room_id', None)
-    logger.info(f'API queries the room {room_id}')
+    logger.info('API queries the room %s', room_id)
 
     if room_id is None:
         return bad_request('missing path parameter room_id')
 
     response = Room('diner', 0).to_dict()
-    logger.info(f'API replies the room data {response}')
+    logger.info('API replies the room data %s', response)
 
     return {
         'statusCode': 200,
@@ -52,36 +54,67 @@ def handle_api_event(event, context):
     }
 
 
-def handle_kinesis_event(event):
-    logger.debug(f'Kinesis stream triggered event {event}')
-    assert len(event['Records']) > 0
+def validate(payload):
+    # Payloads failing here can never be stored, however often retried
+    if not isinstance(payload, dict):
+        raise TypeError('payload is not an object')
+    for field in ["room_id", "headcount", "timestamp"]:
+        if field not in payload:
+            raise ValueError(f'missing field {field}')
+    for field in ["headcount", "confidence", "timestamp"]:
+        if field not in payload:
+            continue  # confidence is only sent by the person counting stage
+        if isinstance(payload[field], bool) or not isinstance(payload[field], (int, Decimal)):
+            raise TypeError(f'field {field} is not a number')
+    return payload
 
-    record = event['Records'][-1]
-    data = base64.b64decode(record['kinesis']['data']).decode('utf-8')
-    payload = json.loads(data, parse_float=Decimal)
-    logger.info(f'Kinesis pushed payload {payload}')
 
-    key = {
-        "id": str(payload["room_id"]),
-    }
-    attributes = {
-        "headcount": {
-            "Value": payload["headcount"],
-            "Action": "PUT"
-        },
-        "timestamp": {
-            "Value": payload["timestamp"],
-            "Action": "PUT"
-        }
-    }
-    table.update_item(Key=key, AttributeUpdates=attributes)
+def merge_latest(payloads):
+    # Keep only the newest headcount of every room in the batch
+    latest = {}
+    for payload in payloads:
+        room_id = str(payload["room_id"])
+        if room_id not in latest or payload["timestamp"] >= latest[room_id]["timestamp"]:
+            latest[room_id] = payload
+    return latest
+
 
+def handle_kinesis_event(event):
+    logger.debug('Kinesis stream triggered %d records', len(event['Records']))
+
+    with metrics.timed('decode'):
+        valid, poison = kinesis_records.decode_records(event['Records'], validate)
+        payloads = [payload for (_, payload) in valid]
+        latest = merge_latest(payloads)
+    metrics.count('records', len(payloads))
+    metrics.count('poison_records', len(poison))
+    logger.info('Kinesis pushed %d payloads of %d rooms', len(payloads), len(latest))
+
+    # Poison records are set aside rather than retried
+    failures = dead_letters.send('DetectActivities', poison)
+
+    with metrics.timed('db_write'):
+        written, stale, failed = dynamodb_writes.write_newer(table, [{
+            "id": room_id,
+            "headcount": payload["headcount"],
+            # A headcount without confidence must not keep the previous one
+            "confidence": payload.get("confidence"),
+            "timestamp": payload["timestamp"],
+        } for (room_id, payload) in latest.items()])
+    metrics.count('items_written', written)
+    metrics.count('stale_writes', stale)
+    failed_ids = {item["id"] for item in failed}
+    failures += [record for (record, payload) in valid if str(payload["room_id"]) in failed_ids]
+
+    metrics.count('failed_records', len(failures))
     return {
         'statusCode': 200,
-        'body': 'records uploaded to database',
+        'body': f'{written} records uploaded to database',
+        'batchItemFailures': kinesis_records.batch_item_failures(failures),
     }
 
 
+@instrumentation.handler('DetectActivities')
 def lambda_handler(event, context):
     if 'httpMethod' in event:
         return handle_api_event(event)
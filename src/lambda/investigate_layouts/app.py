@@ -1,8 +1,7 @@
+import instrumentation
 import json
-import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger = instrumentation.get_logger()
 
 
 class Room:
@@ -34,10 +33,11 @@ def bad_request(message: str):
     }
 
 
+@instrumentation.handler('InvestigateLayouts')
 def lambda_handler(event, context):
     path_parameters = event.get('pathParameters', {})
     floor_id = path_parameters.get('floor_id', None)
-    logger.info(f'API queries the floor {floor_id}')
+    logger.info('API queries the floor %s', floor_id)
 
     if floor_id is None:
         return bad_request('missing path parameter floor_id')
@@ -45,7 +45,7 @@ def lambda_handler(event, context):
     room1 = Room('diner')
     room2 = Room('kitchen')
     response = Floor([room1, room2]).to_dict()
-    logger.info(f'API replies the floor data {response}')
+    logger.info('API replies the floor data %s', response)
 
     return {
         'statusCode': 200,
@@ -1,16 +1,24 @@
-import base64
-import boto3
+import aws_clients
+from botocore.exceptions import BotoCoreError, ClientError
+import dead_letters
 from decimal import Decimal
+import dynamodb_writes
 import json
-import logging
+import history
+import instrumentation
+import kinesis_records
+from instrumentation import metrics
 import os
+import time
+import window
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger = instrumentation.get_logger()
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = aws_clients.resource('dynamodb')
 SENSOR_DATABASE_TABLE = os.environ.get('SENSOR_DATABASE_TABLE')
 table = dynamodb.Table(SENSOR_DATABASE_TABLE)
+SENSOR_HISTORY_TABLE = os.environ.get('SENSOR_HISTORY_TABLE')
+history_table = dynamodb.Table(SENSOR_HISTORY_TABLE)
 
 
 class Sensor:
@@ -34,17 +42,37 @@ def bad_request(message: str):
     }
 
 
+def not_found(message: str):
+    return {
+        'statusCode': 404,
+        'body': json.dumps({
+            'error': message,
+        }),
+    }
+
+
 def handle_api_event(event):
-    logger.debug(f'RESTful API triggered event {event}')
+    logger.debug('RESTful API triggered event %s', event)
     path_parameters = event.get('pathParameters', {})
     sensor_id = path_parameters.get('sensor_id', None)
-    logger.info(f'API queries the sensor {sensor_id}')
+    logger.info('API queries the sensor %s', sensor_id)
 
     if sensor_id is None:
         return bad_request('missing path parameter session_id')
 
-    response = Sensor(30.0, 50.0).to_dict()
-    logger.info(f'API replies the sensor data {response}')
+    query_parameters = event.get('queryStringParameters') or {}
+    if query_parameters:
+        return handle_history_query(sensor_id, query_parameters)
+
+    with metrics.timed('db_read'):
+        item = table.get_item(Key={'id': sensor_id}).get('Item')
+    if item is None:
+        return not_found(f'no reading of the sensor {sensor_id}')
+
+    response = Sensor(float(item['temperature']), float(item['humidity'])).to_dict()
+    response['timestamp'] = int(item['timestamp'])
+    response['window'] = window.summarize(window.from_item(item.get('window')), int(time.time()))
+    logger.info('API replies the sensor data %s', response)
 
     return {
         'statusCode': 200,
@@ -52,40 +80,96 @@ def handle_api_event(event):
     }
 
 
-def handle_kinesis_event(event):
-    logger.debug(f'Kinesis stream triggered event {event}')
-    assert len(event['Records']) > 0
+def handle_history_query(sensor_id, query_parameters):
+    try:
+        end = int(query_parameters.get('to', time.time()))
+        start = int(query_parameters.get('from', end - 3600))
+    except ValueError:
+        return bad_request('query parameters from and to must be epoch seconds')
+    resolution = query_parameters.get('resolution', 'auto')
 
-    record = event['Records'][-1]
-    data = base64.b64decode(record['kinesis']['data']).decode('utf-8')
-    payload = json.loads(data, parse_float=Decimal)
-    logger.info(f'Kinesis pushed payload {payload}')
+    if start > end:
+        return bad_request('query parameter from is later than to')
+    if resolution not in ['auto', 'raw', *history.RESOLUTIONS]:
+        return bad_request(f'unknown resolution {resolution}')
 
-    key = {
-        "id": str(payload["sensor_id"]),
-    }
-    attributes = {
-        "temperature": {
-            "Value": payload["temperature"],
-            "Action": "PUT"
-        },
-        "humidity": {
-            "Value": payload["humidity"],
-            "Action": "PUT"
-        },
-        "timestamp": {
-            "Value": payload["timestamp"],
-            "Action": "PUT"
-        }
+    with metrics.timed('db_read'):
+        resolution, points = history.query(history_table, sensor_id, start, end, resolution)
+    metrics.count('points', len(points))
+    logger.info('API replies %d points of the sensor %s at %s', len(points), sensor_id, resolution)
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'sensor_id': sensor_id,
+            'resolution': resolution,
+            'points': points,
+        }),
     }
-    table.update_item(Key=key, AttributeUpdates=attributes)
 
+
+def validate(payload):
+    # Payloads failing here can never be stored, however often retried
+    if not isinstance(payload, dict):
+        raise TypeError('payload is not an object')
+    for field in ["sensor_id", "temperature", "humidity", "timestamp"]:
+        if field not in payload:
+            raise ValueError(f'missing field {field}')
+    for field in ["temperature", "humidity", "timestamp"]:
+        if isinstance(payload[field], bool) or not isinstance(payload[field], (int, Decimal)):
+            raise TypeError(f'field {field} is not a number')
+    return payload
+
+
+def handle_kinesis_event(event):
+    logger.debug('Kinesis stream triggered %d records', len(event['Records']))
+
+    with metrics.timed('decode'):
+        valid, poison = kinesis_records.decode_records(event['Records'], validate)
+        payloads = [payload for (_, payload) in valid]
+    metrics.count('records', len(payloads))
+    metrics.count('poison_records', len(poison))
+    logger.info('Kinesis pushed %d payloads', len(payloads))
+
+    # Poison records are set aside rather than retried
+    failures = dead_letters.send('MonitorSensors', poison)
+
+    # The latest reading of every sensor is written with its window
+    try:
+        with metrics.timed('db_write'):
+            written, stale, failed = window.update(dynamodb, table, payloads)
+    except (BotoCoreError, ClientError):
+        # Reading the stored windows failed; sensors already written skip
+        # their readings when retried
+        logger.exception('Failed to update the windows of %d readings', len(payloads))
+        written, stale, failed = 0, 0, [{"id": str(payload["sensor_id"])} for payload in payloads]
+    metrics.count('items_written', written)
+    metrics.count('stale_writes', stale)
+    failed_ids = {item["id"] for item in failed}
+    failures += [record for (record, payload) in valid if str(payload["sensor_id"]) in failed_ids]
+
+    try:
+        with metrics.timed('history_write'):
+            unrecorded = history.record(dynamodb, history_table, payloads)
+    except (BotoCoreError, ClientError):
+        logger.exception('Failed to record the history of %d readings', len(payloads))
+        unrecorded = payloads
+    # Only the records of the readings left unrecorded are retried
+    unrecorded_keys = {(str(payload["sensor_id"]), payload["timestamp"]) for payload in unrecorded}
+    failures += [
+        record for (record, payload) in valid
+        if (str(payload["sensor_id"]), payload["timestamp"]) in unrecorded_keys
+    ]
+
+    metrics.count('failed_records', len(failures))
     return {
         'statusCode': 200,
-        'body': 'records uploaded to database',
+        'body': f'{written} records uploaded to database',
+        'batchItemFailures': kinesis_records.batch_item_failures(failures),
     }
 
 
+@instrumentation.handler('MonitorSensors')
 def lambda_handler(event, context):
     if 'httpMethod' in event:
         return handle_api_event(event)
@@ -0,0 +1,311 @@
+"""
+History of every sensor: the raw readings, partitioned by day, and rollups
+of their count, sums, minimum and maximum at several resolutions.
+
+Kinesis retries records and parallel batches may hold readings of the same
+sensor, so the rollups are neither blindly overwritten nor added to. The
+consecutive readings of a sensor are written in transactions with the
+rollups they fall in:
+
+- every raw reading is put only if it does not exist yet, so a reading
+  already recorded cancels the transaction and is dropped from the retry,
+  and the rollups count every reading once
+- every rollup is set to the stored one combined with the new readings, only
+  if its count is still the one read, so concurrent updates are retried on
+  the fresh item rather than lost
+
+Transactional writes cost twice the write units of plain ones.
+"""
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import BotoCoreError, ClientError
+from decimal import Decimal
+from dynamodb_reads import batch_get
+import dynamodb_writes
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Raw points are partitioned by day so no single series grows without bound
+RAW_BUCKET_SECONDS = 86400
+# Rollup resolutions and their bucket widths in seconds
+RESOLUTIONS = {
+    '1m': 60,
+    '15m': 900,
+    '1h': 3600,
+}
+# The finest resolution whose point count stays under this budget is picked
+MAX_POINTS = 1000
+FIELDS = ['temperature', 'humidity']
+# TransactWriteItems takes at most 100 actions, one per rollup and reading
+MAX_TRANSACTION_ITEMS = 100
+# Attempts of a transaction, with exponential backoff
+WRITE_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+
+def raw_series(sensor_id, timestamp):
+    return f'{sensor_id}#raw#{int(timestamp) // RAW_BUCKET_SECONDS}'
+
+
+def rollup_series(sensor_id, resolution):
+    return f'{sensor_id}#{resolution}'
+
+
+def bucket_start(timestamp, width):
+    return int(timestamp) // width * width
+
+
+def rollup_keys(payload):
+    return [
+        (rollup_series(payload['sensor_id'], resolution), bucket_start(payload['timestamp'], width))
+        for (resolution, width) in RESOLUTIONS.items()
+    ]
+
+
+def aggregate(payloads):
+    """
+    Fold the readings of a batch into partial rollups.
+    :param payloads: list, the decoded sensor readings
+    :return: dict, partial rollups keyed by (series, bucket start)
+    """
+    partials = {}
+    for payload in payloads:
+        for key in rollup_keys(payload):
+            partial = partials.get(key)
+            if partial is None:
+                partial = partials[key] = {'count': 0}
+                for field in FIELDS:
+                    partial[f'{field}_sum'] = Decimal(0)
+                    partial[f'{field}_min'] = payload[field]
+                    partial[f'{field}_max'] = payload[field]
+            partial['count'] += 1
+            for field in FIELDS:
+                value = payload[field]
+                partial[f'{field}_sum'] += Decimal(str(value))
+                partial[f'{field}_min'] = min(partial[f'{field}_min'], value)
+                partial[f'{field}_max'] = max(partial[f'{field}_max'], value)
+    return partials
+
+
+def combine(stored, partial):
+    if stored is None:
+        return dict(partial)
+    merged = {'count': stored['count'] + partial['count']}
+    for field in FIELDS:
+        merged[f'{field}_sum'] = stored[f'{field}_sum'] + partial[f'{field}_sum']
+        merged[f'{field}_min'] = min(stored[f'{field}_min'], partial[f'{field}_min'])
+        merged[f'{field}_max'] = max(stored[f'{field}_max'], partial[f'{field}_max'])
+    return merged
+
+
+def groups(payloads):
+    """
+    Split the readings into the groups written by one transaction each,
+    consecutive readings of a sensor packed up to MAX_TRANSACTION_ITEMS
+    readings and rollups.
+    :return: dict, the lists of groups of every sensor
+    """
+    readings = {}
+    for payload in payloads:
+        # The same reading may be delivered twice
+        readings[(str(payload['sensor_id']), payload['timestamp'])] = payload
+    sensors = {}
+    for ((sensor_id, _), payload) in sorted(readings.items()):
+        sensor_groups = sensors.setdefault(sensor_id, [])
+        keys = set(rollup_keys(payload))
+        if sensor_groups:
+            (group, group_keys) = sensor_groups[-1]
+            if len(group) + 1 + len(group_keys | keys) <= MAX_TRANSACTION_ITEMS:
+                group.append(payload)
+                group_keys |= keys
+                continue
+        sensor_groups.append(([payload], keys))
+    return {
+        sensor_id: [group for (group, _) in sensor_groups]
+        for (sensor_id, sensor_groups) in sensors.items()
+    }
+
+
+def raw_item(payload):
+    return {
+        'series': raw_series(payload['sensor_id'], payload['timestamp']),
+        'timestamp': payload['timestamp'],
+        'temperature': payload['temperature'],
+        'humidity': payload['humidity'],
+    }
+
+
+def transaction(table, group, partials, stored):
+    """
+    :param group: list, readings of a sensor
+    :param partials: dict, their partial rollups, as aggregate returns
+    :param stored: dict, the stored rollups by (series, bucket start)
+    :return: list, the TransactWriteItems actions, the raw readings first
+    """
+    actions = [{'Put': {
+        'TableName': table.name,
+        'Item': raw_item(payload),
+        'ConditionExpression': 'attribute_not_exists(#timestamp)',
+        'ExpressionAttributeNames': {'#timestamp': 'timestamp'},
+    }} for payload in group]
+    for (key, partial) in partials.items():
+        previous = stored.get(key)
+        item = combine(previous, partial)
+        names = {f'#a{i}': name for (i, name) in enumerate(item)}
+        values = {f':a{i}': value for (i, value) in enumerate(item.values())}
+        update = {
+            'TableName': table.name,
+            'Key': {'series': key[0], 'timestamp': key[1]},
+            'UpdateExpression': 'SET ' + ', '.join(f'{name} = {value}' for (name, value) in zip(names, values)),
+            'ExpressionAttributeNames': {**names, '#count': 'count'},
+            'ExpressionAttributeValues': values,
+        }
+        if previous is None:
+            update['ConditionExpression'] = 'attribute_not_exists(#count)'
+        else:
+            update['ConditionExpression'] = '#count = :previous'
+            update['ExpressionAttributeValues'] = {**values, ':previous': previous['count']}
+        actions.append({'Update': update})
+    return actions
+
+
+def write_group(table, group, stored):
+    """
+    Write the readings and rollups of a group, dropping the readings already
+    recorded and re-reading the rollups updated concurrently.
+    :param stored: dict, the stored rollups by (series, bucket start),
+        updated in place
+    :return: bool, whether every reading is recorded
+    """
+    client = table.meta.client
+    delay = RETRY_DELAY
+    for attempt in range(WRITE_ATTEMPTS):
+        partials = aggregate(group)
+        try:
+            client.transact_write_items(TransactItems=transaction(table, group, partials, stored))
+            for (key, partial) in partials.items():
+                stored[key] = combine(stored.get(key), partial)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+        recorded = {
+            i for (i, reason) in enumerate(reasons[:len(group)]) if reason == 'ConditionalCheckFailed'
+        }
+        group = [payload for (i, payload) in enumerate(group) if i not in recorded]
+        if not group:
+            return True
+        # The rollups were updated by another batch, or the readings of a
+        # retry are already in them
+        for key in aggregate(group):
+            item = table.get_item(Key={'series': key[0], 'timestamp': key[1]}, ConsistentRead=True).get('Item')
+            if item is None:
+                stored.pop(key, None)
+            else:
+                stored[key] = item
+        if not recorded and attempt < WRITE_ATTEMPTS - 1:
+            time.sleep(delay)
+            delay *= 2
+    return False
+
+
+def record(dynamodb, table, payloads):
+    """
+    Append the raw readings and fold them into the rollups, once each
+    however often the readings are delivered.
+    :param dynamodb: the DynamoDB service resource
+    :param table: the history table
+    :param payloads: list, the decoded sensor readings
+    :return: list, the readings that failed to be recorded
+    """
+    keys = {key for payload in payloads for key in rollup_keys(payload)}
+    keys = [{'series': series, 'timestamp': start} for (series, start) in keys]
+    stored = {
+        (item['series'], int(item['timestamp'])): item
+        for item in batch_get(dynamodb, table.name, keys)
+    }
+
+    def write(sensor_groups):
+        # The groups of a sensor may share rollups, so they are written in
+        # turn
+        failed = []
+        for group in sensor_groups:
+            try:
+                if not write_group(table, group, stored):
+                    logger.warning('Rollups of %d readings are still contended', len(group))
+                    failed += group
+            except (BotoCoreError, ClientError):
+                logger.exception('Failed to record %d readings', len(group))
+                failed += group
+        return failed
+
+    sensors = groups(payloads)
+    if len(sensors) <= 1:
+        outcomes = map(write, sensors.values())
+    else:
+        outcomes = dynamodb_writes.executor().map(write, sensors.values())
+    return [payload for failed in outcomes for payload in failed]
+
+
+def pick_resolution(start, end):
+    for (resolution, width) in RESOLUTIONS.items():
+        if (end - start) / width <= MAX_POINTS:
+            return resolution
+    return '1h'
+
+
+def query_series(table, series, start, end):
+    condition = Key('series').eq(series) & Key('timestamp').between(start, end)
+    response = table.query(KeyConditionExpression=condition)
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = table.query(
+            KeyConditionExpression=condition,
+            ExclusiveStartKey=response['LastEvaluatedKey'],
+        )
+        items.extend(response['Items'])
+    return items
+
+
+def query(table, sensor_id, start, end, resolution='auto'):
+    """
+    Read the readings of a sensor within a time range.
+    :param table: the history table
+    :param sensor_id: str, the sensor to query
+    :param start: int, the range start in epoch seconds (inclusive)
+    :param end: int, the range end in epoch seconds (inclusive)
+    :param resolution: str, one of 'raw', '1m', '15m', '1h' or 'auto'
+    :return: tuple, the resolution used and the list of points
+    """
+    if resolution == 'auto':
+        resolution = pick_resolution(start, end)
+
+    points = []
+    if resolution == 'raw':
+        for day in range(start // RAW_BUCKET_SECONDS, end // RAW_BUCKET_SECONDS + 1):
+            series = f'{sensor_id}#raw#{day}'
+            for item in query_series(table, series, start, end):
+                points.append({
+                    'timestamp': int(item['timestamp']),
+                    'temperature': float(item['temperature']),
+                    'humidity': float(item['humidity']),
+                })
+        return resolution, points
+
+    width = RESOLUTIONS[resolution]
+    series = rollup_series(sensor_id, resolution)
+    for item in query_series(table, series, bucket_start(start, width), end):
+        point = {
+            'timestamp': int(item['timestamp']),
+            'count': int(item['count']),
+        }
+        for field in FIELDS:
+            point[field] = {
+                'mean': float(item[f'{field}_sum'] / item['count']),
+                'min': float(item[f'{field}_min']),
+                'max': float(item[f'{field}_max']),
+            }
+        points.append(point)
+    return resolution, points
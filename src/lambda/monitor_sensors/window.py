@@ -0,0 +1,246 @@
+"""
+Sliding-window aggregates of every sensor, updated as readings stream in.
+
+The window is split into BUCKETS buckets of BUCKET_SECONDS, each holding the
+count, sums, minimum and maximum of its readings and the sums a least-squares
+trend needs. A reading updates one bucket and evicts the expired ones, and
+the aggregates merge at most BUCKETS buckets, so both take constant time and
+the state stays a few kilobytes, small enough to be stored with the latest
+reading as a binary attribute. The window thus slides by whole buckets. An
+exponentially weighted moving average (EWMA) with a time constant of
+EWMA_SECONDS is kept alongside.
+
+The states written by this container are cached, and every write requires
+the stored reading to still be the one the state was derived from, so that
+the table is only read when another container wrote the sensor in between.
+"""
+from dynamodb_reads import batch_get
+import dynamodb_writes
+import math
+import struct
+
+WINDOW_SECONDS = 300
+BUCKET_SECONDS = 30
+BUCKETS = WINDOW_SECONDS // BUCKET_SECONDS
+EWMA_SECONDS = 60
+FIELDS = ['temperature', 'humidity']
+BUCKET_FIELDS = ['start', 'count', 't_sum', 't2_sum'] + [
+    f'{field}_{statistic}' for field in FIELDS for statistic in ['sum', 't_sum', 'min', 'max']
+]
+# Packed as doubles, a full window takes less than one write unit (1 KB)
+VERSION = 1
+HEADER = struct.Struct('<B' + 'd' * (1 + len(FIELDS)))
+BUCKET = struct.Struct('<' + 'd' * len(BUCKET_FIELDS))
+# Attempts to write a state before it is left to the next batch
+WRITE_ATTEMPTS = 2
+
+# sensor id -> (timestamp of the stored reading, window state)
+cache = {}
+
+
+def new_state():
+    return {'buckets': [], 'ewma': {}, 'ewma_timestamp': None}
+
+
+def new_bucket(start):
+    bucket = {'start': start, 'count': 0, 't_sum': 0.0, 't2_sum': 0.0}
+    for field in FIELDS:
+        bucket[f'{field}_sum'] = 0.0
+        bucket[f'{field}_t_sum'] = 0.0
+        bucket[f'{field}_min'] = math.inf
+        bucket[f'{field}_max'] = -math.inf
+    return bucket
+
+
+def oldest_bucket(timestamp):
+    # The start of the first bucket of the window ending at timestamp
+    return timestamp // BUCKET_SECONDS * BUCKET_SECONDS - (BUCKETS - 1) * BUCKET_SECONDS
+
+
+def fold(state, payload):
+    """
+    Add a reading to the window state in place. Readings must be folded in
+    time order.
+    :param state: dict, the window state of the sensor
+    :param payload: dict, the decoded sensor reading
+    """
+    timestamp = int(payload['timestamp'])
+    start = timestamp // BUCKET_SECONDS * BUCKET_SECONDS
+    buckets = state['buckets']
+    if not buckets or buckets[-1]['start'] < start:
+        oldest = oldest_bucket(timestamp)
+        while buckets and buckets[0]['start'] < oldest:
+            buckets.pop(0)
+        buckets.append(new_bucket(start))
+    bucket = buckets[-1]
+
+    # Times are relative to the bucket start to keep the sums precise
+    t = timestamp - start
+    bucket['count'] += 1
+    bucket['t_sum'] += t
+    bucket['t2_sum'] += t * t
+    for field in FIELDS:
+        value = float(payload[field])
+        bucket[f'{field}_sum'] += value
+        bucket[f'{field}_t_sum'] += t * value
+        bucket[f'{field}_min'] = min(bucket[f'{field}_min'], value)
+        bucket[f'{field}_max'] = max(bucket[f'{field}_max'], value)
+
+    previous = state['ewma_timestamp']
+    alpha = 1 if previous is None else 1 - math.exp((previous - timestamp) / EWMA_SECONDS)
+    for field in FIELDS:
+        value = float(payload[field])
+        ewma = state['ewma'].get(field, value)
+        state['ewma'][field] = ewma + alpha * (value - ewma)
+    state['ewma_timestamp'] = timestamp
+
+
+def summarize(state, now=None):
+    """
+    Merge the buckets of the window into its aggregates.
+    :param state: dict, the window state of the sensor
+    :param now: int, the end of the window in epoch seconds, the latest
+        reading if omitted
+    :return: dict, the count, and the mean, min, max, EWMA and slope per
+        minute of every field
+    """
+    buckets = state['buckets']
+    if now is not None:
+        buckets = [bucket for bucket in buckets if bucket['start'] >= oldest_bucket(now)]
+    count = sum(bucket['count'] for bucket in buckets)
+    summary = {'window_seconds': WINDOW_SECONDS, 'count': count}
+    if count == 0:
+        return summary
+
+    # Shift the bucket-relative sums to a common origin
+    origin = buckets[0]['start']
+    t_sum = t2_sum = 0.0
+    for bucket in buckets:
+        shift = bucket['start'] - origin
+        t_sum += bucket['t_sum'] + bucket['count'] * shift
+        t2_sum += bucket['t2_sum'] + 2 * shift * bucket['t_sum'] + bucket['count'] * shift * shift
+    variance = count * t2_sum - t_sum * t_sum
+
+    summary['from'] = origin
+    for field in FIELDS:
+        y_sum = sum(bucket[f'{field}_sum'] for bucket in buckets)
+        ty_sum = sum(bucket[f'{field}_t_sum'] + (bucket['start'] - origin) * bucket[f'{field}_sum'] for bucket in buckets)
+        slope = (count * ty_sum - t_sum * y_sum) / variance if variance > 0 else 0.0
+        summary[field] = {
+            'mean': round(y_sum / count, 3),
+            'min': min(bucket[f'{field}_min'] for bucket in buckets if bucket['count']),
+            'max': max(bucket[f'{field}_max'] for bucket in buckets if bucket['count']),
+            'ewma': round(state['ewma'][field], 3),
+            'slope_per_minute': round(60 * slope, 4),
+        }
+    return summary
+
+
+def to_item(state):
+    """
+    :param state: dict, the window state of the sensor
+    :return: bytes, the packed state: a header with the version, the EWMA
+        timestamp and the EWMA of every field, then the buckets
+    """
+    ewma_timestamp = state['ewma_timestamp']
+    header = HEADER.pack(
+        VERSION,
+        math.nan if ewma_timestamp is None else ewma_timestamp,
+        *(state['ewma'].get(field, math.nan) for field in FIELDS),
+    )
+    return header + b''.join(
+        BUCKET.pack(*(bucket[name] for name in BUCKET_FIELDS)) for bucket in state['buckets']
+    )
+
+
+def from_item(data):
+    state = new_state()
+    if data is None:
+        return state
+    data = bytes(data)  # boto3 wraps binary attributes
+    (version, ewma_timestamp, *ewma) = HEADER.unpack_from(data)
+    if version != VERSION:
+        return state  # the window refills within WINDOW_SECONDS
+    if not math.isnan(ewma_timestamp):
+        state['ewma_timestamp'] = int(ewma_timestamp)
+        state['ewma'] = dict(zip(FIELDS, ewma))
+    for values in BUCKET.iter_unpack(data[HEADER.size:]):
+        bucket = dict(zip(BUCKET_FIELDS, values))
+        bucket['start'] = int(bucket['start'])
+        bucket['count'] = int(bucket['count'])
+        state['buckets'].append(bucket)
+    return state
+
+
+def load(dynamodb, table, sensor_ids):
+    keys = [{'id': sensor_id} for sensor_id in sensor_ids]
+    stored = {item['id']: item for item in batch_get(dynamodb, table.name, keys)}
+    for sensor_id in sensor_ids:
+        item = stored.get(sensor_id)
+        if item is None:
+            cache[sensor_id] = (0, new_state())
+        else:
+            cache[sensor_id] = (int(item['timestamp']), from_item(item.get('window')))
+
+
+def update(dynamodb, table, payloads):
+    """
+    Fold the readings of a batch into the windows of their sensors and write
+    the windows together with the latest readings.
+    :param dynamodb: the DynamoDB service resource
+    :param table: the sensor table
+    :param payloads: list, the decoded sensor readings
+    :return: tuple, the numbers of items written and of sensors with no new
+        reading, and the items that failed to be written
+    """
+    readings = {}
+    for payload in sorted(payloads, key=lambda payload: payload['timestamp']):
+        readings.setdefault(str(payload['sensor_id']), []).append(payload)
+
+    written, failed, pending = 0, [], list(readings)
+    for _ in range(WRITE_ATTEMPTS):
+        missing = [sensor_id for sensor_id in pending if sensor_id not in cache]
+        if missing:
+            load(dynamodb, table, missing)
+
+        items, since, states = [], [], []
+        for sensor_id in pending:
+            # The cached state is updated in place, and evicted unless written
+            (stored, state) = cache[sensor_id]
+            # Readings up to the stored one are already in the window
+            fresh = [payload for payload in readings[sensor_id] if payload['timestamp'] > stored]
+            if not fresh:
+                continue
+            for payload in fresh:
+                fold(state, payload)
+            latest = fresh[-1]
+            items.append({
+                "id": sensor_id,
+                "temperature": latest["temperature"],
+                "humidity": latest["humidity"],
+                "timestamp": latest["timestamp"],
+                "window": to_item(state),
+            })
+            since.append(stored)
+            states.append(state)
+
+        outcomes = dynamodb_writes.update_all(table, items, since=since)
+        pending, conflicts = [], []
+        for (item, state, outcome) in zip(items, states, outcomes):
+            if outcome is True:
+                cache[item['id']] = (int(item['timestamp']), state)
+                written += 1
+            elif outcome is False:
+                # Written by another container since, read it again
+                cache.pop(item['id'], None)
+                pending.append(item['id'])
+                conflicts.append(item)
+            else:
+                cache.pop(item['id'], None)
+                failed.append(item)
+        if not pending:
+            break
+    else:
+        # Still contended, the readings are retried with the next batch
+        failed += conflicts
+    return written, len(readings) - written - len(failed), failed
@@ -1,10 +1,47 @@
+import aws_clients
 from enum import Enum
+import importlib
+import instrumentation
+from instrumentation import metrics
 import json
-import logging
-from vincent_algorithm import vincent_algorithm_test
+import os
+from strategy_cache import StrategyCache, cache_key, canonicalize
+import strategy_triggers
+import time
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger = instrumentation.get_logger()
+
+# Heavy modules are imported explicitly so that their cost is measured
+init_started = time.perf_counter()
+vincent_algorithm = importlib.import_module('vincent_algorithm')
+
+STRATEGY_CACHE_TTL = float(os.environ.get('STRATEGY_CACHE_TTL', 300))
+STRATEGY_CACHE_SIZE = int(os.environ.get('STRATEGY_CACHE_SIZE', 256))
+STRATEGY_CACHE_TABLE = os.environ.get('STRATEGY_CACHE_TABLE')
+STRATEGY_TABLE = os.environ.get('STRATEGY_TABLE')
+
+
+def shared_cache_table():
+    if not STRATEGY_CACHE_TABLE:
+        return None
+    return aws_clients.resource('dynamodb').Table(STRATEGY_CACHE_TABLE)
+
+
+def strategy_table():
+    if not STRATEGY_TABLE:
+        return None
+    return aws_clients.resource('dynamodb').Table(STRATEGY_TABLE)
+
+
+cache = StrategyCache(STRATEGY_CACHE_TTL, STRATEGY_CACHE_SIZE, shared_cache_table())
+table = strategy_table()
+
+# Provisioned concurrency runs the initialization ahead of any request
+if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency':
+    vincent_algorithm.warm_up()
+
+INIT_DURATION = 1000 * (time.perf_counter() - init_started)
+cold_start = True
 
 
 class Mode(Enum):
@@ -45,18 +82,104 @@ def bad_request(message: str):
     }
 
 
+def is_warm_up(event):
+    return event.get('warmup', False) or event.get('source') == 'aws.events'
+
+
+def server_timing(timings):
+    return ', '.join(f'{phase};dur={duration:.2f}' for (phase, duration) in timings.items())
+
+
+def is_horizon_request(input_data):
+    # Forecasts ask for a plan over the next steps rather than the current loads
+    return 'forecast' in input_data or any('forecast' in room for room in input_data['rooms'])
+
+
+def is_stream_event(event):
+    records = event.get('Records')
+    return bool(records) and records[0].get('eventSource') == 'aws:dynamodb'
+
+
+def handle_stream_event(event, timings):
+    logger.debug('DynamoDB stream triggered %d records', len(event['Records']))
+    if table is None:
+        return bad_request('missing environment variable STRATEGY_TABLE')
+
+    def optimize(request):
+        metrics.count('rooms', len(request['rooms']))
+        return vincent_algorithm.vincent_algorithm_floor(canonicalize(request), timings)
+
+    outcomes = strategy_triggers.handle(table, event['Records'], optimize)
+    for (outcome, floors) in outcomes.items():
+        metrics.count(outcome, floors)
+    logger.info('Stream changes of %d records led to %s', len(event['Records']), outcomes)
+    return {
+        'statusCode': 200,
+        'body': json.dumps(outcomes),
+    }
+
+
+@instrumentation.handler('ProposeStrategies')
 def lambda_handler(event, context):
+    global cold_start
+    timings = metrics.timings
+    if cold_start:
+        timings['init'] = INIT_DURATION
+        cold_start = False
+
+    if is_warm_up(event):
+        vincent_algorithm.warm_up()
+        logger.info('Warmed up with timings %s', timings)
+        return {
+            'statusCode': 200,
+            'headers': {'Server-Timing': server_timing(timings)},
+            'body': json.dumps({'warm': True}),
+        }
+
+    if is_stream_event(event):
+        return handle_stream_event(event, timings)
+
     path_parameters = event.get('pathParameters', {})
     floor_id = path_parameters.get('floor_id', None)
-    logger.info(f'API queries the floor {floor_id}')
+    logger.info('API queries the floor %s', floor_id)
 
     if floor_id is None:
         return bad_request('missing path parameter floor_id')
 
     input_data = json.loads(event.get('body', '{}'))
-    output_data = vincent_algorithm_test(input_data)
+    if 'rooms' in input_data and not isinstance(input_data['rooms'], list):
+        return bad_request('rooms must be a list')
+    if 'forecast' in input_data and not isinstance(input_data['forecast'], list):
+        return bad_request('forecast must be a list')
+
+    # Strategies are computed from and cached under the quantized profiles
+    input_data = canonicalize(input_data)
+    key = cache_key({'floor_id': floor_id, 'body': input_data})
+    output_data, tier = cache.get(key)
+    metrics.count('cache_hit', int(output_data is not None))
+    metrics.count('cache_miss', int(output_data is None))
+    if output_data is None:
+        if 'rooms' in input_data:
+            metrics.count('rooms', len(input_data['rooms']))
+            logger.info('API optimizes %d rooms of the floor %s', len(input_data['rooms']), floor_id)
+            try:
+                if is_horizon_request(input_data):
+                    output_data = vincent_algorithm.vincent_algorithm_horizon(input_data, timings)
+                else:
+                    output_data = vincent_algorithm.vincent_algorithm_floor(input_data, timings)
+            except ValueError as e:
+                return bad_request(str(e))
+            output_data['floor_id'] = floor_id
+        else:
+            output_data = vincent_algorithm.vincent_algorithm_test(input_data, timings)
+        cache.put(key, output_data)
+
+    with metrics.timed('serialization'):
+        body = json.dumps({**output_data, 'cache': cache.metadata(tier)})
+    logger.info('Replied with timings %s', timings)
 
     return {
         'statusCode': 200,
-        'body': json.dumps(output_data),
+        'headers': {'Server-Timing': server_timing(timings)},
+        'body': body,
     }
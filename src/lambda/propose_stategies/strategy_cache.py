@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Resolution of the profile values in the cache key; profiles that agree at
+# this resolution share one strategy
+QUANTA = {
+    'temperature': 0.1,
+    'target_temperature': 0.1,
+    'humidity': 1,
+    'number_of_people': 1,
+    'time': 1,
+    'month': 1,
+    'uv_index': 1,
+    'co2_concentration': 10,
+    'stress_index': 1,
+    'air_quality': 1,
+    'building_material': 1,
+    'pressure': 100,
+}
+DEFAULT_QUANTUM = 0.01
+
+
+def quantize(value, quantum):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    # The second rounding drops floating point noise such as 30.000000000000004
+    return round(round(value / quantum) * quantum, 6)
+
+
+def canonicalize(data, key=None):
+    """
+    Quantize every number of a request according to its key.
+    :param data: the decoded request body
+    :param key: str, the key the data is stored under
+    :return: the request with quantized numbers
+    """
+    if isinstance(data, dict):
+        return {name: canonicalize(value, name) for (name, value) in data.items()}
+    if isinstance(data, list):
+        return [canonicalize(value, key) for value in data]
+    return quantize(data, QUANTA.get(key, DEFAULT_QUANTUM))
+
+
+def cache_key(data):
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class StrategyCache:
+    """
+    Two-tier cache of strategies: a TTL/LRU dictionary that lives as long as
+    the Lambda container, and an optional DynamoDB table shared by all
+    containers whose items expire through the table TTL.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, table=None, shared_ttl: float = 3600):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.table = table
+        self.shared_ttl = shared_ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        :return: tuple, the cached strategy (None on miss) and the tier hit
+        """
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], 'memory'
+
+        if self.table is not None:
+            try:
+                item = self.table.get_item(Key={'id': key}).get('Item')
+            except Exception:
+                logger.exception('Failed to read strategy %s from the shared cache', key)
+                item = None
+            if item is not None and item['expires_at'] > now:
+                value = json.loads(item['result'])
+                self.remember(key, value, now)
+                self.hits += 1
+                return value, 'dynamodb'
+
+        self.misses += 1
+        return None, None
+
+    def remember(self, key: str, value, now: float):
+        self.entries[key] = (now + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def put(self, key: str, value):
+        now = time.time()
+        self.remember(key, value, now)
+        if self.table is not None:
+            try:
+                self.table.put_item(Item={
+                    'id': key,
+                    'result': json.dumps(value),
+                    'expires_at': int(now + self.shared_ttl),
+                })
+            except Exception:
+                # The shared tier is an optimization, never fail the request
+                logger.exception('Failed to store strategy %s in the shared cache', key)
+
+    def metadata(self, tier):
+        return {
+            'hit': tier is not None,
+            'tier': tier,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
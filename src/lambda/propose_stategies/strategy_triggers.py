@@ -0,0 +1,171 @@
+"""
+Recompute the strategies of floors when the readings of their rooms change.
+
+The DynamoDB streams of the sensor and activity tables invoke this function
+with the new readings. A floor is optimized again only when the temperature,
+humidity or headcount of one of its rooms moved past its delta since the
+inputs of the current strategy, and that room did not already trigger a
+recomputation within DEBOUNCE_SECONDS. Readings within the deltas or the
+debounce period are compared again on the next change of the room.
+
+Every floor is an item of the strategy table, which the dashboard reads
+directly, holding as JSON its layout (written by the dashboard), the inputs
+of its strategy and the strategy itself. Rooms are identified by the id of
+their sensor, as on the dashboard.
+"""
+from boto3.dynamodb.types import TypeDeserializer
+import dynamodb_writes
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# The change of a reading that is worth a new strategy
+DELTAS = {
+    'temperature': float(os.environ.get('TEMPERATURE_DELTA', 0.5)),
+    'humidity': float(os.environ.get('HUMIDITY_DELTA', 5)),
+    'headcount': float(os.environ.get('HEADCOUNT_DELTA', 1)),
+}
+DEBOUNCE_SECONDS = float(os.environ.get('STRATEGY_DEBOUNCE_SECONDS', 60))
+# The profile field fed by every reading
+PROFILE_FIELDS = {
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'headcount': 'number_of_people',
+}
+# Floors are laid out rarely, so the rooms of every floor are rescanned at most this often
+FLOORS_TTL = 60
+PROJECTION_NAMES = {'#id': 'id', '#layout': 'layout'}
+# Attempts to write a strategy against concurrent writers of the floor
+WRITE_ATTEMPTS = 2
+
+deserializer = TypeDeserializer()
+floors = {'expires_at': 0, 'rooms': {}}
+
+
+def readings_of(records):
+    """
+    :param records: list, the DynamoDB stream records of the batch
+    :return: dict, the latest readings of every room changed in the batch
+    """
+    readings = {}
+    for record in records:
+        image = record['dynamodb'].get('NewImage')
+        if record['eventName'] == 'REMOVE' or image is None:
+            continue
+        # Only the read attributes are deserialized, not the sensor windows
+        room_id = deserializer.deserialize(image['id'])
+        room = readings.setdefault(room_id, {})
+        for field in PROFILE_FIELDS:
+            if field in image:
+                room[field] = float(deserializer.deserialize(image[field]))
+    return readings
+
+
+def floors_of(table, now):
+    """
+    :return: dict, the floor of every room laid out in the strategy table
+    """
+    if floors['expires_at'] <= now:
+        rooms = {}
+        projection = {'ProjectionExpression': '#id, #layout', 'ExpressionAttributeNames': PROJECTION_NAMES}
+        response = table.scan(**projection)
+        items = response['Items']
+        while 'LastEvaluatedKey' in response:
+            response = table.scan(**projection, ExclusiveStartKey=response['LastEvaluatedKey'])
+            items.extend(response['Items'])
+        for item in items:
+            for room in json.loads(item.get('layout', '[]')):
+                rooms[room['room_id']] = item['id']
+        floors.update(expires_at=now + FLOORS_TTL, rooms=rooms)
+    return floors['rooms']
+
+
+def is_meaningful(previous, current):
+    return any(
+        field not in previous or abs(value - previous[field]) >= DELTAS[field]
+        for (field, value) in current.items()
+    )
+
+
+def floor_request(layout, inputs):
+    # The readings of every room override the defaults of its profile
+    rooms = []
+    for room in layout:
+        profile = dict(room['profile'])
+        for (field, value) in inputs.get(room['room_id'], {}).items():
+            if field in PROFILE_FIELDS:
+                profile[PROFILE_FIELDS[field]] = value
+        rooms.append({'name': room['name'], 'profile': profile, 'aircons': room['aircons']})
+    return {'rooms': rooms}
+
+
+def recompute_floor(table, floor_id, readings, optimize, now):
+    """
+    Optimize the floor again if the readings of its rooms changed enough.
+    :param readings: dict, the latest readings of the changed rooms of the floor
+    :param optimize: function, the floor optimizer taking a request body
+    :return: str, 'recomputed', 'below_delta', 'debounced', 'conflict' or
+        'unassigned' if the floor was removed
+    """
+    for _ in range(WRITE_ATTEMPTS):
+        floor = table.get_item(Key={'id': floor_id}, ConsistentRead=True).get('Item')
+        if floor is None or 'layout' not in floor:
+            return 'unassigned'
+        inputs = json.loads(floor.get('inputs', '{}'))
+
+        changed = [room_id for (room_id, current) in readings.items()
+                   if is_meaningful(inputs.get(room_id, {}), current)]
+        if not changed:
+            return 'below_delta'
+        triggered = [room_id for room_id in changed
+                     if now - inputs.get(room_id, {}).get('triggered_at', 0) >= DEBOUNCE_SECONDS]
+        if not triggered:
+            return 'debounced'
+
+        # The strategy is computed from the latest readings of all changed rooms
+        for (room_id, current) in readings.items():
+            inputs[room_id] = {**inputs.get(room_id, {}), **current}
+        for room_id in triggered:
+            inputs[room_id]['triggered_at'] = now
+        strategy = optimize(floor_request(json.loads(floor['layout']), inputs))
+        strategy['floor_id'] = floor_id
+
+        version = int(floor.get('version', 0))
+        written = dynamodb_writes.update_if_newer(table, {
+            'id': floor_id,
+            'inputs': json.dumps(inputs),
+            'strategy': json.dumps(strategy),
+            'computed_at': int(now),
+            'version': version + 1,
+        }, order='version', since=version)
+        if written:
+            logger.info('Recomputed the strategy of the floor %s for the rooms %s', floor_id, triggered)
+            return 'recomputed'
+    return 'conflict'
+
+
+def handle(table, records, optimize, now=None):
+    """
+    Recompute the strategies of the floors whose rooms changed in a batch of
+    DynamoDB stream records, at most once per floor.
+    :return: dict, the number of floors per outcome of recompute_floor
+    """
+    now = time.time() if now is None else now
+    rooms = floors_of(table, now)
+    by_floor = {}
+    for (room_id, current) in readings_of(records).items():
+        if room_id in rooms:
+            by_floor.setdefault(rooms[room_id], {})[room_id] = current
+
+    outcomes = {}
+    for (floor_id, readings) in by_floor.items():
+        try:
+            outcome = recompute_floor(table, floor_id, readings, optimize, now)
+        except ValueError:
+            logger.exception('Failed to optimize the floor %s', floor_id)
+            outcome = 'invalid'
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return outcomes
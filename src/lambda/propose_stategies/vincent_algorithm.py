@@ -1,36 +1,84 @@
+from functools import lru_cache
+from instrumentation import timed
 import json
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, value, LpStatus
-import CoolProp.CoolProp as CP
+import logging
+import math
+import numpy as np
+import os
+from pathlib import Path
+import psychrometrics
+import unit_catalog
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_PRESSURE = 101325  # 标准大气压，帕斯卡
+DEFAULT_UNITS_PATH = Path(__file__).with_name("aircondition_array.json")
+
+
+@lru_cache(maxsize=None)
+def load_pulp():
+    # PuLP 只在混合整数规划时才导入，缩短冷启动
+    import pulp
+    return pulp
 
 
 def normalize(value, min_value, max_value):
     return (value - min_value) / (max_value - min_value)
 
 
-def calculate_ac_intensity(data):
-    # Default values
-    defaults = {
-        'time': 12,
-        'uv_index': 5,
-        'number_of_people': 1,
-        'space_size': 50,
-        'ceiling_height': 2.5,
-        'humidity': 50,
-        'temperature': 25,
-        'co2_concentration': 400,
-        'stress_index': 50,
-        'air_quality': 50,
-        'building_material': 50,
-        'month': 1
-    }
+# Default values
+INTENSITY_DEFAULTS = {
+    'time': 12,
+    'uv_index': 5,
+    'number_of_people': 1,
+    'space_size': 50,
+    'ceiling_height': 2.5,
+    'humidity': 50,
+    'temperature': 25,
+    'co2_concentration': 400,
+    'stress_index': 50,
+    'air_quality': 50,
+    'building_material': 50,
+    'month': 1
+}
+PROFILE_DEFAULTS = {
+    **INTENSITY_DEFAULTS,
+    'target_temperature': 25,
+    'target_time': 12,
+    'pressure': DEFAULT_PRESSURE,
+}
+
 
-    # Use defaults if values are missing or invalid
+def profile_columns(profiles, defaults):
+    """
+    Convert columnar profiles into float arrays of equal length.
+    :param profiles: dict of arrays or scalars, or a pandas DataFrame
+    :param defaults: dict, the default of every column
+    :return: dict, one float array per column of defaults
+    """
+    present = [np.atleast_1d(np.asarray(profiles[key])) for key in defaults if key in profiles]
+    size = max((len(values) for values in present), default=1)
+
+    columns = {}
     for key, default in defaults.items():
-        data[key] = data.get(key, default)
-        if not isinstance(data[key], (int, float)) or data[key] == '':
-            data[key] = default
+        if key not in profiles:
+            columns[key] = np.full(size, float(default))
+            continue
+        values = np.atleast_1d(np.asarray(profiles[key]))
+        # Use defaults if values are missing or invalid
+        if values.dtype.kind not in 'biuf':
+            values = [value if isinstance(value, (int, float)) else default for value in values]
+        columns[key] = np.broadcast_to(np.asarray(values, dtype=float), size)
+    return columns
+
+
+def calculate_ac_intensity_batch(profiles):
+    """
+    Evaluate the AC intensity of many room profiles at once.
+    :param profiles: dict of arrays or scalars, or a pandas DataFrame
+    :return: numpy.ndarray, the intensity between 0 and 1 of every profile
+    """
+    data = profile_columns(profiles, INTENSITY_DEFAULTS)
 
     # Normalize each parameter to a value between 0 and 1
     time_factor = normalize(data['time'], 0, 24)
@@ -45,16 +93,11 @@ def calculate_ac_intensity(data):
     material_factor = normalize(data['building_material'], 0, 100)
 
     # Summer months (June, July, August)
-    if data['month'] in [6, 7, 8]:
-        season_factor = 1
-    else:
-        season_factor = 0
+    season_factor = np.isin(data['month'], [6, 7, 8]).astype(float)
 
     # Time factor adjustment for 10 PM to 5 AM (cooler at night)
-    if 22 <= data['time'] or data['time'] <= 5:
-        time_adjustment_factor = -0.1
-    else:
-        time_adjustment_factor = 0.1
+    night = (22 <= data['time']) | (data['time'] <= 5)
+    time_adjustment_factor = np.where(night, -0.1, 0.1)
 
     # Weighted sum of all factors
     intensity = (0.1 * time_factor +
@@ -71,9 +114,11 @@ def calculate_ac_intensity(data):
                  time_adjustment_factor)
 
     # Clamp the value between 0 and 1
-    intensity = max(0, min(1, intensity))
+    return np.clip(intensity, 0, 1)
+
 
-    return intensity
+def calculate_ac_intensity(data):
+    return float(calculate_ac_intensity_batch(data)[0])
 
 
 def load_from_json(filename):
@@ -86,6 +131,16 @@ def load_from_json(filename):
         return json.load(f)
 
 
+@lru_cache(maxsize=None)
+def load_default_units():
+    """
+    Load the AC units installed by default, aircondition_array.json, once
+    per container; unit_catalog holds the specifications of every model.
+    :return: dict, the capacity of every unit, not to be modified
+    """
+    return load_from_json(DEFAULT_UNITS_PATH)
+
+
 def save_to_json(data, filename):
     """
     Save the data to a JSON file.
@@ -96,32 +151,30 @@ def save_to_json(data, filename):
         json.dump(data, f, indent=4)
 
 
-def calculate_cooling_power(data):
-    volume = data["volume"]  # 立方米
-    current_relative_humidity = data["current_relative_humidity"]  # 当前相对湿度，百分比
-    current_temperature = data["current_temperature"]  # 摄氏度
-    target_temperature = data["target_temperature"]  # 摄氏度
-    target_time_minutes = data["target_time"]  # 分钟
-    alpha_value = data["alpha_value"]
-    pressure = data.get("pressure", DEFAULT_PRESSURE)  # 气压，帕斯卡，默认为标准大气压
+def calculate_cooling_power_batch(data):
+    """
+    Evaluate the cooling power required by many rooms at once.
+    :param data: dict of arrays or scalars, or a pandas DataFrame, with the
+        keys taken by calculate_cooling_power
+    :return: numpy.ndarray, the required power in watts of every row
+    """
+    volume = np.asarray(data["volume"], dtype=float)  # 立方米
+    current_relative_humidity = np.asarray(data["current_relative_humidity"], dtype=float)  # 当前相对湿度，百分比
+    current_temperature = np.asarray(data["current_temperature"], dtype=float)  # 摄氏度
+    target_temperature = np.asarray(data["target_temperature"], dtype=float)  # 摄氏度
+    target_time_minutes = np.asarray(data["target_time"], dtype=float)  # 分钟
+    alpha_value = np.asarray(data["alpha_value"], dtype=float)
+    pressure = np.asarray(data.get("pressure", DEFAULT_PRESSURE), dtype=float)  # 气压，帕斯卡，默认为标准大气压
 
     multiple_avlue = alpha_value / 2 + 1
 
-    # 初始化空气的属性
-    fluid = 'Air'
-
-    # 当前状态
-    current_temperature_kelvin = current_temperature + 273.15  # 转换为开尔文
-    current_humidity_ratio = CP.HAPropsSI('W', 'T', current_temperature_kelvin, 'P', pressure, 'RH', current_relative_humidity / 100)
-    current_enthalpy = CP.HAPropsSI('H', 'T', current_temperature_kelvin, 'P', pressure, 'W', current_humidity_ratio)
+    # 当前状态，由预计算的湿空气物性表插值，超出范围时回退到 CoolProp
+    _, current_enthalpy, density = psychrometrics.properties(
+        current_temperature, current_relative_humidity, pressure)
 
     # 目标状态
-    target_temperature_kelvin = target_temperature + 273.15  # 转换为开尔文
-    target_humidity_ratio = CP.HAPropsSI('W', 'T', target_temperature_kelvin, 'P', pressure, 'RH', current_relative_humidity / 100)
-    target_enthalpy = CP.HAPropsSI('H', 'T', target_temperature_kelvin, 'P', pressure, 'W', target_humidity_ratio)
-
-    # 计算空气的密度
-    density = CP.PropsSI('D', 'T', current_temperature_kelvin, 'P', pressure, fluid)
+    _, target_enthalpy, _ = psychrometrics.properties(
+        target_temperature, current_relative_humidity, pressure)
 
     # 计算所需的能量（焦耳）
     required_energy = volume * density * (current_enthalpy - target_enthalpy)  # 焦耳，冷却过程中能量减少
@@ -129,97 +182,930 @@ def calculate_cooling_power(data):
     # 将能量转换为功率（瓦特）
     required_power = required_energy / (target_time_minutes * 60)  # 瓦特
 
-    # 打印调试信息
-    print(f"Current enthalpy: {current_enthalpy:.2f} J/kg")
-    print(f"Target enthalpy: {target_enthalpy:.2f} J/kg")
-    print(f"Density: {density:.2f} kg/m³")
-    print(f"Required energy: {required_energy:.2f} J")
+    return np.atleast_1d(required_power * multiple_avlue)
+
+
+def calculate_cooling_power(data):
+    required_power = float(calculate_cooling_power_batch(data)[0])
+    logger.debug('Required cooling power %.2f W', required_power)
+    return required_power
+
+
+def calculate_required_power_batch(profiles):
+    """
+    Evaluate the AC intensity and the required cooling power of many room
+    profiles in one pass.
+    :param profiles: dict of arrays or scalars, or a pandas DataFrame
+    :return: tuple, arrays of the intensity and the required power in watts
+    """
+    data = profile_columns(profiles, PROFILE_DEFAULTS)
+    intensity = calculate_ac_intensity_batch(data)
+    required_power = calculate_cooling_power_batch({
+        "volume": data['space_size'] * data['ceiling_height'],
+        "current_relative_humidity": data['humidity'],
+        "current_temperature": data['temperature'],
+        "target_temperature": data['target_temperature'],
+        "target_time": data['target_time'],
+        "alpha_value": intensity,
+        "pressure": data['pressure'],
+    })
+    return intensity, required_power
+
 
-    return required_power * multiple_avlue
+# 开机后的功率曲线：y = 0.8 * z + 0.3，且不能超过 1
+FIXED_LOAD = 0.3
+LOAD_SLOPE = 0.8
+# 求解方法：'milp' 为参考的混合整数规划，'fast' 为单约束情形的快速解法
+OPTIMIZE_METHOD = os.environ.get('OPTIMIZE_METHOD', 'milp')
+# 混合整数规划的相对最优间隙与时限（秒），超时则采用已找到的最好解
+MILP_GAP = float(os.environ.get('MILP_GAP', 1e-4))
+MILP_TIME_LIMIT = float(os.environ.get('MILP_TIME_LIMIT', 5))
 
 
 def calculate_y(z):
     # 当 z <= 0.002 时，y 为 0；当 z > 0.002 时，y 的值为 0.8*z + 0.3 且不能超过 1
-    return [0 if zi <= 0.002 else min(0.8 * zi + 0.3, 1) for zi in z]
+    return [0 if zi <= 0.002 else min(LOAD_SLOPE * zi + FIXED_LOAD, 1) for zi in z]
+
+
+def group_units(x_values, powers=None):
+    # 同容量（且同功率）的机组可以互换，按容量分组
+    keys = list(x_values) if powers is None else list(zip(x_values, powers))
+    groups = {}
+    for i in sorted(range(len(keys)), key=lambda i: keys[i], reverse=True):
+        groups.setdefault(keys[i], []).append(i)
+    return groups
+
+
+class FloorModel:
+    """
+    Reference mixed-integer formulation, one joint problem for all rooms with
+    a demand constraint per room. Units of equal capacity in a room are
+    interchangeable, so every group counts its units running in the saturated
+    segment (power equals capacity) and in the sloped segment (0.3 fixed load
+    plus 0.8 per unit load); off units draw nothing.
+    A solve sets the demands on the right-hand side and starts from the
+    running units the fast solver finds for them. The problem is not kept
+    between calls: CBC runs as a new process on every solve, and building
+    the problem takes a few percent of solving it.
+    """
+    def __init__(self, rooms, powers=None):
+        """
+        :param rooms: list, the capacities of the units of every room
+        :param powers: list, the rated power input of the units of every room,
+            the capacities if omitted
+        """
+        pulp = load_pulp()
+        saturation = (1 - FIXED_LOAD) / LOAD_SLOPE
+        self.rooms = [list(x_values) for x_values in rooms]
+        self.powers = powers
+
+        # 定义问题
+        self.prob = pulp.LpProblem("Minimize_Y", pulp.LpMinimize)
+        objective, self.variables, self.demands = [], [], []
+        for (r, (x_values, p_values)) in enumerate(zip(rooms, powers or rooms)):
+            # 定义变量：每组满载段与斜坡段的开机台数及其总出力
+            groups = group_units(x_values, p_values)
+            room = {}
+            for (g, (key, units)) in enumerate(groups.items()):
+                room[key] = (
+                    pulp.LpVariable(f"full{r}_{g}", 0, len(units), cat="Integer"),
+                    pulp.LpVariable(f"sloped{r}_{g}", 0, len(units), cat="Integer"),
+                    pulp.LpVariable(f"full_output{r}_{g}", 0),
+                    pulp.LpVariable(f"sloped_output{r}_{g}", 0),
+                )
+            self.variables.append((groups, room))
+
+            for ((x, p), units) in groups.items():
+                full, sloped, full_output, sloped_output = room[x, p]
+                # 耗电按额定功率计：满载为 p，斜坡段为 p * (0.3 + 0.8 * z)
+                objective.append(p * full + LOAD_SLOPE * p / x * sloped_output + FIXED_LOAD * p * sloped)
+                self.prob += full + sloped <= len(units)
+                self.prob += full_output <= x * full
+                self.prob += full_output >= saturation * x * full
+                self.prob += sloped_output <= saturation * x * sloped
+
+            # 约束条件：需求在求解时才设置
+            demand = pulp.lpSum(full_output + sloped_output for (_, _, full_output, sloped_output) in room.values()) == 0
+            self.prob += demand
+            self.demands.append(demand)
+
+        # 目标函数
+        self.prob += pulp.lpSum(objective)
 
+    def solve(self, min_values, time_limit=None, gap=None):
+        """
+        :param min_values: list, the demand to be met exactly in every room
+        :param time_limit: float, the seconds the solver may take,
+            MILP_TIME_LIMIT if omitted
+        :param gap: float, the relative optimality gap, MILP_GAP if omitted
+        :return: list, the loads between 0 and 1 of the units of every room
+        """
+        pulp = load_pulp()
+        results = [[1] * len(x_values) for x_values in self.rooms]
+        overloaded = set()
+        for (r, (x_values, min_value, demand)) in enumerate(zip(self.rooms, min_values, self.demands)):
+            if min_value > sum(x_values):
+                # 需求超出房间的总容量时，该房间的机组全部满载
+                logger.warning('Demand %.2f of room %d exceeds its capacity, running all units', min_value, r)
+                overloaded.add(r)
+                min_value = 0
+            demand.changeRHS(min_value)
+        if len(overloaded) == len(self.rooms):
+            return results
 
-def optimize_z(x_values, min_value):
+        # 求解问题：从可行的开机台数出发
+        self.start(min_values, overloaded)
+        self.prob.solve(pulp.PULP_CBC_CMD(
+            msg=False,
+            gapRel=MILP_GAP if gap is None else gap,
+            timeLimit=time_limit or MILP_TIME_LIMIT,
+            warmStart=True,
+        ))
+
+        # 检查解的状态：超时但已找到可行解时也采用
+        if self.prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+            # 如果没有找到最优解，将所有 z 设置为 1
+            logger.warning('No optimal load found (%s), running all units', pulp.LpSolution[self.prob.sol_status])
+            return results
+
+        # 提取结果：组内出力由开机的机组平均分担
+        for (r, (groups, room)) in enumerate(self.variables):
+            if r in overloaded:
+                continue
+            optimized_z = results[r] = [0] * len(self.rooms[r])
+            for ((x, p), units) in groups.items():
+                full, sloped, full_output, sloped_output = room[x, p]
+                full_count, sloped_count = round(pulp.value(full)), round(pulp.value(sloped))
+                for i in units[:full_count]:
+                    optimized_z[i] = pulp.value(full_output) / (x * full_count)
+                for i in units[full_count:full_count + sloped_count]:
+                    optimized_z[i] = pulp.value(sloped_output) / (x * sloped_count)
+        return results
+
+    def start(self, min_values, overloaded=()):
+        """
+        Set the running units the solver starts from. The previous solution
+        rarely meets new demands exactly, and the solver discards a start
+        that does not, so the units are those of the fast solver instead.
+        """
+        saturation = (1 - FIXED_LOAD) / LOAD_SLOPE
+        for (r, ((groups, room), min_value)) in enumerate(zip(self.variables, min_values)):
+            p_values = None if self.powers is None else [self.powers[r]]
+            z = optimize_floor([self.rooms[r]], [0 if r in overloaded else min_value], 'fast', p_values)[0]
+            for (key, units) in groups.items():
+                room[key][0].setInitialValue(sum(z[i] >= saturation for i in units))
+                room[key][1].setInitialValue(sum(0 < z[i] < saturation for i in units))
+
+
+def optimize_floor_milp(rooms, min_values, powers=None, time_limit=None, gap=None):
+    """
+    Solve the reference problem of the units, see FloorModel.
+    :param rooms: list, the capacities of the units of every room
+    :param min_values: list, the demand to be met exactly in every room
+    :param powers: list, the rated power input of the units of every room,
+        the capacities if omitted
+    :return: list, the loads between 0 and 1 of the units of every room
+    """
+    return FloorModel(rooms, powers).solve(min_values, time_limit, gap)
+
+
+def optimize_z_milp(x_values, min_value):
+    return optimize_floor_milp([x_values], [min_value])[0]
+
+
+def subset_sums(groups, limit):
+    """
+    Subset sums of units grouped by integer capacity, as Python int bitsets.
+    :param groups: dict, the unit indices of every capacity
+    :param limit: int, the largest sum of interest
+    :return: tuple, the (capacity, indices) items and the bitset after each
+    """
+    mask = (1 << (limit + 1)) - 1
+    items, reach = [], [1]
+    for (capacity, indices) in groups.items():
+        # 同容量的机组按 1, 2, 4, ... 台打包，位移次数只随台数对数增长
+        size = 1
+        while indices:
+            chunk, indices = indices[:size], indices[size:]
+            items.append((capacity * len(chunk), chunk))
+            reach.append((reach[-1] | (reach[-1] << items[-1][0])) & mask)
+            size *= 2
+    return items, reach
+
+
+def lowest_sum(reach, low, high):
+    # 在 [low, high] 中最小的可达和
+    bits = reach >> max(low, 0)
+    if bits == 0:
+        return None
+    total = max(low, 0) + (bits & -bits).bit_length() - 1
+    return total if total <= high else None
+
+
+def pick_units(items, reach, total):
+    chosen = []
+    for j in range(len(items), 0, -1):
+        if not (reach[j - 1] >> total) & 1:
+            weight, chunk = items[j - 1]
+            chosen.extend(chunk)
+            total -= weight
+    return chosen
+
+
+def optimize_z_fast(x_values, min_value):
+    """
+    Fast exact solver for the single demand constraint, at 1 W resolution.
+    A unit loaded above the saturation point draws its full capacity, so at
+    most one unit runs partially loaded and the others either cover the demand
+    at full power (slack absorbed above the saturation point), or fall short
+    and leave the remainder to the partial unit. Both cases reduce to finding
+    the smallest reachable subset sum in a range.
+    :param x_values: list, the capacity of every unit
+    :param min_value: float, the demand to be met exactly
+    :return: list, the load between 0 and 1 of every unit
+    """
     n = len(x_values)
-    # 定义问题
-    prob = LpProblem("Minimize_Y", LpMinimize)
+    if min_value > sum(x_values):
+        logger.warning('Demand %.2f exceeds the total capacity, running all units', min_value)
+        return [1] * n
 
-    # 定义变量
-    z = [LpVariable(f"z{i}", 0, 1) for i in range(n)]
+    saturation = (1 - FIXED_LOAD) / LOAD_SLOPE
+    demand = math.ceil(min_value)
+    groups = {}
+    for (capacity, units) in group_units(x_values).items():
+        groups.setdefault(round(capacity), []).extend(units)
+    limit = demand + max(groups, default=0)
 
-    # 目标函数
-    y = calculate_y(z)
-    prob += lpSum(y[i] * x_values[i] for i in range(n))
+    # 满载段机组覆盖需求，额外功率为容量之和减去需求
+    best = (float('inf'), [], None)
+    items, reach = subset_sums(groups, limit)
+    total = lowest_sum(reach[-1], demand, math.floor(min_value / saturation))
+    if total is not None:
+        chosen = pick_units(items, reach, total)
+        best = (sum(x_values[i] for i in chosen) - min_value, chosen, None)
 
-    # 约束条件
-    prob += lpSum(z[i] * x_values[i] for i in range(n)) == min_value
+    # 部分负载机组承担余量 r，额外功率为 0.3 * x - 0.2 * r
+    for (capacity, indices) in groups.items():
+        partial, others = indices[0], {**groups, capacity: indices[1:]}
+        items, reach = subset_sums(others, demand)
+        total = lowest_sum(reach[-1], math.ceil(min_value - x_values[partial]), demand - 1)
+        if total is None:
+            continue
+        chosen = pick_units(items, reach, total)
+        remainder = min_value - sum(x_values[i] for i in chosen)
+        x = x_values[partial]
+        overhead = min(FIXED_LOAD * x - (1 - LOAD_SLOPE) * remainder, x - remainder)
+        if 0 < remainder <= x and overhead < best[0]:
+            best = (overhead, chosen, partial)
 
-    # 求解问题
-    prob.solve()
+    _, chosen, partial = best
+    z = [0] * n
+    capacity = sum(x_values[i] for i in chosen)
+    if partial is None:
+        # 满载机组平均分担需求，负载均在饱和点之上
+        for i in chosen:
+            z[i] = min_value / capacity
+    else:
+        for i in chosen:
+            z[i] = 1
+        z[partial] = (min_value - capacity) / x_values[partial]
+    return z
+
+
+# 按额定功率求解时，容量离散到 10 W 的精度
+POWER_RESOLUTION = 10
+
+
+def cheapest_sums(groups, limit):
+    """
+    Least power of every reachable sum of capacities, a min-cost knapsack over
+    capacities in POWER_RESOLUTION steps.
+    :param groups: dict, the unit indices of every (capacity, power)
+    :param limit: int, the largest sum of interest, in steps
+    :return: tuple, the (steps, indices) items and the taken flags of each
+        item per sum, and the least power per sum
+    """
+    cost = np.full(limit + 1, np.inf)
+    cost[0] = 0
+    items, taken = [], []
+    for ((capacity, power), indices) in groups.items():
+        steps = round(capacity / POWER_RESOLUTION)
+        size = 1
+        while indices:
+            chunk, indices = indices[:size], indices[size:]
+            weight = steps * len(chunk)
+            candidate = np.full(limit + 1, np.inf)
+            if weight <= limit:
+                candidate[weight:] = cost[:limit + 1 - weight] + power * len(chunk)
+            better = candidate < cost
+            cost = np.where(better, candidate, cost)
+            items.append((weight, chunk))
+            taken.append(better)
+            size *= 2
+    return items, taken, cost
+
+
+def pick_cheapest(items, taken, total):
+    chosen = []
+    for j in range(len(items) - 1, -1, -1):
+        if taken[j][total]:
+            weight, chunk = items[j]
+            chosen.extend(chunk)
+            total -= weight
+    return chosen
+
+
+def cheapest_in(cost, low, high):
+    # 在 [low, high] 中耗电最少的可达和
+    low, high = max(low, 0), min(high, len(cost) - 1)
+    if low > high or not np.isfinite(cost[low:high + 1]).any():
+        return None
+    return low + int(np.argmin(cost[low:high + 1]))
 
-    # 检查解的状态
-    if LpStatus[prob.status] != 'Optimal' or sum(value(zi) * x_values[i] for i, zi in enumerate(z)) < (min_value - 1):
-        # 如果没有找到最优解，或者解的总和小于 min_value，将所有 z 设置为 1
-        print("sssss")
-        print(sum(value(zi) * x_values[i] for i, zi in enumerate(z)))
+
+def optimize_z_weighted(x_values, p_values, min_value):
+    """
+    Fast solver minimizing the rated power input instead of the capacity,
+    exact up to POWER_RESOLUTION. As in optimize_z_fast, saturated units
+    cover the demand with any load above the saturation point at no extra
+    power, and at most one unit runs on the sloped segment.
+    :param x_values: list, the capacity of every unit
+    :param p_values: list, the rated power input of every unit
+    :param min_value: float, the demand to be met exactly
+    :return: list, the load between 0 and 1 of every unit
+    """
+    n = len(x_values)
+    if min_value > sum(x_values):
+        logger.warning('Demand %.2f exceeds the total capacity, running all units', min_value)
         return [1] * n
 
-    # 提取结果
-    optimized_z = [value(zi) for zi in z]
-    return optimized_z
+    saturation = (1 - FIXED_LOAD) / LOAD_SLOPE
+    demand = min_value / POWER_RESOLUTION
+    groups = group_units(x_values, p_values)
+    limit = math.floor(demand / saturation) + 1
 
+    # 满载段机组覆盖需求，耗电为其额定功率之和
+    best = (float('inf'), [], None)
+    items, taken, cost = cheapest_sums(groups, limit)
+    total = cheapest_in(cost, math.ceil(demand), math.floor(demand / saturation))
+    if total is not None:
+        best = (cost[total], pick_cheapest(items, taken, total), None)
 
-def vincent_algorithm_test(data):
-    # Calculate the volume
-    volume = data.get('space_size', 50) * data.get('ceiling_height', 2.5)
+    # 部分负载机组承担余量 r，耗电为 p * min(0.3 + 0.8 * r / x, 1)
+    for (key, indices) in groups.items():
+        partial, others = indices[0], {**groups, key: indices[1:]}
+        x, p = key
+        items, taken, cost = cheapest_sums(others, math.ceil(demand))
+        totals = np.arange(len(cost))
+        remainder = min_value - POWER_RESOLUTION * totals
+        feasible = (remainder > 0) & (remainder <= x)
+        power = cost + p * np.minimum(FIXED_LOAD + LOAD_SLOPE * remainder / x, 1)
+        power[~feasible] = np.inf
+        total = int(np.argmin(power))
+        if power[total] < best[0]:
+            best = (power[total], pick_cheapest(items, taken, total), partial)
 
-    # Calculate the AC intensity
-    ac_intensity = calculate_ac_intensity(data)
+    _, chosen, partial = best
+    z = [0] * n
+    capacity = sum(x_values[i] for i in chosen)
+    if partial is None:
+        for i in chosen:
+            z[i] = min(min_value / capacity, 1)
+    else:
+        for i in chosen:
+            z[i] = 1
+        z[partial] = min(max(min_value - capacity, 0) / x_values[partial], 1)
+    return z
 
-    # Prepare the output
-    temp = {
-        "volume": volume,
-        "current_relative_humidity": data.get('humidity', 50),
-        "current_temperature": data.get('temperature', 25),
-        "target_temperature": data.get('target_temperature', 25),
-        "target_time": data.get('target_time', 12),
-        "alpha_value": ac_intensity,
-        "pressure": data.get('pressure', 101325)
-    }
 
-    input_data = temp
-    required_power = calculate_cooling_power(input_data)
-    output_data = {"required_power": required_power}
+def optimize_z(x_values, min_value, method=None):
+    """
+    Find the unit loads that meet the demand with the least power.
+    :param x_values: list, the capacity of every unit
+    :param min_value: float, the demand to be met
+    :param method: str, 'milp' or 'fast', OPTIMIZE_METHOD if omitted
+    :return: list, the load between 0 and 1 of every unit
+    """
+    return optimize_floor([x_values], [min_value], method)[0]
 
-    input_data = load_from_json("aircondition_array.json")
-    min_value_data = output_data
 
-    x_values = list(input_data.values())
-    min_value = min_value_data['required_power']
+def optimize_floor(rooms, min_values, method=None, powers=None):
+    """
+    Find the unit loads of every room that meet the room demands with the
+    least total power.
+    :param rooms: list, the capacities of the units of every room
+    :param min_values: list, the demand to be met in every room
+    :param method: str, 'milp' or 'fast', OPTIMIZE_METHOD if omitted
+    :param powers: list, the rated power input of the units of every room;
+        the power drawn is weighted by capacity if omitted
+    :return: list, the loads between 0 and 1 of the units of every room
+    """
+    method = method or OPTIMIZE_METHOD
+    # 无需制冷时全部关机
+    min_values = [max(min_value, 0) for min_value in min_values]
+    if method == 'fast':
+        # 房间之间没有耦合约束，逐个房间求解即为联合最优
+        if powers is not None:
+            return [
+                optimize_z_weighted(x_values, p_values, min_value)
+                for (x_values, p_values, min_value) in zip(rooms, powers, min_values)
+            ]
+        return [optimize_z_fast(x_values, min_value) for (x_values, min_value) in zip(rooms, min_values)]
+    return optimize_floor_milp(rooms, min_values, powers)
+
+
+def load_solver(method=None):
+    if (method or OPTIMIZE_METHOD) != 'fast':
+        load_pulp()
+
 
-    optimized_z = optimize_z(x_values, min_value)
+def warm_up():
+    """
+    Load everything a request needs, for warm-up pings and provisioned
+    concurrency initialization.
+    """
+    load_default_units()
+    unit_catalog.load_catalog()
+    psychrometrics.load_table()
+    load_solver()
+
+
+def summarize_loads(x_values, optimized_z):
     y_values = calculate_y(optimized_z)
     total_y = sum(y * x for y, x in zip(y_values, x_values))
     total_zx = sum(z * x for z, x in zip(optimized_z, x_values))
+    return round(total_y, 2), round(total_zx, 2)
+
+
+def resolve_units(aircons):
+    """
+    Look up the specs of the named units in the layer unit catalog.
+    :param aircons: list, {"unit", "capacity"} of every unit, where the
+        capacity defaults to the catalog cooling capacity
+    :return: tuple, the capacities and the rated power inputs of the units,
+        the latter None unless every unit is in the catalog
+    """
+    catalog = unit_catalog.load_catalog()
+    capacities, powers = [], []
+    for aircon in aircons:
+        spec = catalog.get(aircon.get("unit"))
+        capacity = aircon.get("capacity") or (spec and spec["cooling_capacity"])
+        if not capacity:
+            raise ValueError(f'unknown unit {aircon.get("unit")} without capacity')
+        capacities.append(capacity)
+        powers.append(spec and spec["power_input"])
+    return capacities, None if None in powers else powers
+
+
+def vincent_algorithm_test(data, timings=None):
+    # Calculate the AC intensity and the required power
+    with timed(timings, 'psychrometrics'):
+        _, required_power = calculate_required_power_batch(data)
+    output_data = {"required_power": float(required_power[0])}
+
+    input_data = load_default_units()
+    min_value_data = output_data
+
+    x_values = list(input_data.values())
+    min_value = min_value_data['required_power']
+
+    with timed(timings, 'import'):
+        load_solver()
+    with timed(timings, 'solve'):
+        optimized_z = optimize_z(x_values, min_value)
+    total_y, total_zx = summarize_loads(x_values, optimized_z)
 
     optimized_percentages = {f"z{i+1}": round(optimized_z[i], 2) for i in range(len(optimized_z))}
     output_data = {
         "optimized_percentages": optimized_percentages,
-        "total_y": round(total_y, 2),
-        "total_zx": round(total_zx, 2)
+        "total_y": total_y,
+        "total_zx": total_zx
     }
 
-    print("Optimized percentages:")
-    for key, x_value in optimized_percentages.items():
-        print(f"{key}: {x_value:.2f}")
-    print(f"Total y value: {total_y:.2f}")
-    print(f"Total zx value: {total_zx:.2f}")
+    logger.debug('Optimized percentages %s', optimized_percentages)
+    logger.debug('Total y value %.2f, total zx value %.2f', total_y, total_zx)
     return output_data
 
 
+def vincent_algorithm_floor(data, timings=None):
+    """
+    Propose the unit loads of every room of a floor in one solve.
+    :param data: dict, with "rooms", a list of rooms each with a "name", a
+        "profile" as taken by vincent_algorithm_test and "aircons", a list of
+        {"unit", "capacity"}; rooms without aircons use aircondition_array.json
+        and units named in the catalog may omit their capacity
+    :param timings: dict, accumulates the milliseconds spent in every phase
+    :return: dict, the loads and totals of every room and of the floor, with
+        the rated power drawn when every unit is in the catalog
+    """
+    rooms = data["rooms"]
+    aircons = [room.get("aircons") for room in rooms]
+    if None in aircons:
+        default_aircons = [
+            {"unit": unit, "capacity": capacity}
+            for (unit, capacity) in load_default_units().items()
+        ]
+        aircons = [default_aircons if units is None else units for units in aircons]
+
+    # 所有房间的所需功率一次算出
+    profiles = [room.get("profile", {}) for room in rooms]
+    columns = {
+        key: [profile.get(key, default) for profile in profiles]
+        for (key, default) in PROFILE_DEFAULTS.items()
+    }
+    with timed(timings, 'psychrometrics'):
+        _, required_power = calculate_required_power_batch(columns)
+
+    x_values, p_values = zip(*map(resolve_units, aircons)) if aircons else ((), ())
+    # 所有机组都有规格时，按额定功率最小化耗电
+    powers = None if None in p_values else list(p_values)
+    with timed(timings, 'import'):
+        load_solver()
+    with timed(timings, 'solve'):
+        optimized_z = optimize_floor(list(x_values), required_power.tolist(), powers=powers)
+
+    output_rooms = []
+    for (r, (room, units, capacities, loads, power)) in enumerate(zip(rooms, aircons, x_values, optimized_z, required_power)):
+        total_y, total_zx = summarize_loads(capacities, loads)
+        output_rooms.append({
+            "name": room.get("name"),
+            "required_power": round(float(power), 2),
+            "optimized_percentages": [
+                {"unit": aircon["unit"], "percentage": round(z, 2)}
+                for (aircon, z) in zip(units, loads)
+            ],
+            "total_y": total_y,
+            "total_zx": total_zx,
+        })
+        if powers is not None:
+            total_power, _ = summarize_loads(powers[r], loads)
+            output_rooms[-1]["total_power"] = total_power
+
+    output_data = {
+        "rooms": output_rooms,
+        "total_y": round(sum(room["total_y"] for room in output_rooms), 2),
+        "total_zx": round(sum(room["total_zx"] for room in output_rooms), 2),
+    }
+    if powers is not None:
+        output_data["total_power"] = round(sum(room["total_power"] for room in output_rooms), 2)
+    return output_data
+
+
+# 多时段规划：时段长度、预冷与最小负载
+HORIZON_STEP_MINUTES = 15
+# 预冷最多比目标温度低 2 °C，家具与墙体的蓄冷按空气的 5 倍计
+PRECOOL_DEGREES = 2
+THERMAL_MASS = 5
+AIR_DENSITY = 1.2  # 千克每立方米
+AIR_HEAT_CAPACITY = 1005  # 焦耳每千克每开尔文
+# 每个时段散失的预冷比例
+PRECOOL_LOSS = 0.1
+# 动态规划中出力与储存冷量的离散级数
+COOLING_LEVELS = 100
+STORAGE_LEVELS = 40
+# 未满足需求的惩罚，相对于最贵时段每瓦耗电的倍数，须远高于开机的固定负载
+UNMET_PENALTY = 1000
+# 在 Lambda 中求解的时间上限（秒）与相对最优间隙
+HORIZON_TIME_LIMIT = float(os.environ.get('HORIZON_TIME_LIMIT', 10))
+HORIZON_GAP = float(os.environ.get('HORIZON_GAP', 0.01))
+# 达到时间上限时仅有可行解，未证明在间隙内最优
+TIME_LIMITED = 'Time Limited'
+
+# 同一楼层上一次的规划，用于下一次求解的热启动
+horizon_plans = {}
+
+
+def horizon_profiles(data, step_minutes):
+    """
+    Expand the base profile of every room over the steps of the forecasts.
+    :param data: dict, see vincent_algorithm_horizon
+    :param step_minutes: float, the duration of a step
+    :return: tuple, the rows of the room-major (room, step) profiles, the
+        number of steps and the energy price of every step
+    """
+    forecast = data.get("forecast", [])
+    steps = max([len(forecast)] + [len(room.get("forecast", [])) for room in data["rooms"]])
+    if steps == 0:
+        raise ValueError('missing forecast')
+
+    def at(series, t):
+        # 预报较短时沿用最后一个时段
+        return series[min(t, len(series) - 1)] if series else {}
+
+    rows = []
+    for room in data["rooms"]:
+        profile = {**PROFILE_DEFAULTS, **room.get("profile", {})}
+        for t in range(steps):
+            row = {**profile, "time": (profile["time"] + t * step_minutes / 60) % 24}
+            row.update(at(forecast, t))
+            row.update(at(room.get("forecast", []), t))
+            rows.append(row)
+    prices = [float(at(forecast, t).get("price", 1)) for t in range(steps)]
+    return rows, steps, prices
+
+
+def precool_capacity(profile, step_minutes):
+    # 房间可预先储存的冷量，以一个时段内的平均功率（瓦）表示
+    volume = profile.get("space_size", PROFILE_DEFAULTS["space_size"]) * \
+        profile.get("ceiling_height", PROFILE_DEFAULTS["ceiling_height"])
+    energy = PRECOOL_DEGREES * volume * AIR_DENSITY * AIR_HEAT_CAPACITY * THERMAL_MASS
+    return energy / (step_minutes * 60)
+
+
+@lru_cache(maxsize=256)
+def cooling_curve(x_values, p_values, levels):
+    """
+    The least power drawn to deliver evenly spaced outputs of a room, shared
+    by the rooms and requests with the same units.
+    :param x_values: tuple, the capacity of every unit
+    :param p_values: tuple, the rated power input of every unit
+    :param levels: int, the number of output levels above zero
+    :return: tuple, the outputs, the power drawn and the unit loads of every
+        output level, not to be modified
+    """
+    outputs = np.linspace(0, sum(x_values), levels + 1)
+    loads = [optimize_floor([x_values], [output], 'fast', [p_values])[0] for output in outputs]
+    drawn = np.array([
+        sum(p * y for (p, y) in zip(p_values, calculate_y(z))) for z in loads
+    ])
+    return outputs, drawn, loads
+
+
+def optimize_horizon_fast(rooms, demands, capacities, prices, powers=None):
+    """
+    Plan every room on its own, as rooms share no constraint, by dynamic
+    programming over the stored cooling of the room. An output level costs
+    the least power the units draw to deliver it, as found by the fast
+    solvers, so the on/off behavior of the units is accounted for exactly,
+    up to COOLING_LEVELS outputs and STORAGE_LEVELS interpolated stored
+    cooling levels. See optimize_horizon_milp for the model and parameters.
+    """
+    powers = powers or rooms
+    steps = len(prices)
+    penalty = unmet_penalty(rooms, powers, prices)
+    loads, stored_cooling, unmet_cooling = [], [], []
+    for (x_values, p_values, room_demands, capacity) in zip(rooms, powers, demands, capacities):
+        outputs, drawn, output_loads = cooling_curve(tuple(x_values), tuple(p_values), COOLING_LEVELS)
+        storage = np.linspace(0, capacity, STORAGE_LEVELS + 1)
+
+        def costs(t, stored, value):
+            # 每个出力级的费用：耗电、未满足需求的惩罚与之后时段的最小费用，
+            # stored 为数组时逐行计算
+            after = (1 - PRECOOL_LOSS) * stored + outputs - room_demands[t]
+            return prices[t] * drawn + penalty * np.maximum(-after, 0) + \
+                np.interp(np.clip(after, 0, capacity), storage, value), after
+
+        # 自最后一个时段向前求每个储存量的最小费用
+        values = [np.zeros(len(storage))]
+        for t in reversed(range(steps)):
+            cost, _ = costs(t, storage[:, None], values[-1])
+            values.append(cost.min(axis=1))
+        values.reverse()
+
+        # 自初始储存向后取每个时段的最优出力
+        stored, room_loads, room_stored, room_unmet = 0.0, [], [], []
+        for t in range(steps):
+            cost, after = costs(t, stored, values[t + 1])
+            k = int(np.argmin(cost))
+            room_loads.append(output_loads[k])
+            room_unmet.append(max(-after[k], 0))
+            stored = min(max(after[k], 0), capacity)
+            room_stored.append(stored)
+        loads.append([list(unit_loads) for unit_loads in zip(*room_loads)])
+        stored_cooling.append(room_stored)
+        unmet_cooling.append(room_unmet)
+    return loads, stored_cooling, unmet_cooling, 'Optimal'
+
+
+def unmet_penalty(rooms, powers, prices):
+    return UNMET_PENALTY * max(prices) * max(
+        max(p / x for (x, p) in zip(x_values, p_values)) for (x_values, p_values) in zip(rooms, powers)
+    )
+
+
+def running_units(rooms, powers, loads):
+    # 每组每个时段满载段与斜坡段的开机台数
+    saturation = (1 - FIXED_LOAD) / LOAD_SLOPE
+    counts = {}
+    for (r, (x_values, p_values, room_loads)) in enumerate(zip(rooms, powers, loads)):
+        for (g, units) in enumerate(group_units(x_values, p_values).values()):
+            for t in range(len(room_loads[0]) if room_loads else 0):
+                counts[r, g, t] = (sum(room_loads[i][t] >= saturation for i in units),
+                                   sum(0 < room_loads[i][t] < saturation for i in units))
+    return counts
+
+
+def optimize_horizon_milp(rooms, demands, capacities, prices, powers=None, start=None, time_limit=None):
+    """
+    Plan the unit loads of every room over a horizon in one time-indexed
+    problem. Every step is modelled as in optimize_floor_milp, where running
+    units draw at least their fixed load, and cooling beyond the demand of a
+    step is stored, up to the precool capacity of the room and minus PRECOOL_LOSS per
+    step, to meet the demand of later steps. Demand beyond what the units and
+    the stored cooling can meet is penalized.
+    The model is built directly from coefficient lists, and solved under a
+    time limit starting from the given running units.
+    :param rooms: list, the capacities of the units of every room
+    :param demands: list, the demand of every step of every room
+    :param capacities: list, the precool capacity of every room
+    :param prices: list, the energy price of every step
+    :param powers: list, the rated power input of the units of every room,
+        the capacities if omitted
+    :param start: dict, the (full, sloped) running units of group g of room r
+        at step t keyed by (r, g, t), for a warm start
+    :param time_limit: float, the seconds the solver may take
+    :return: tuple, the loads of every unit at every step of every room,
+        the stored and unmet cooling of every room and step, and the status,
+        TIME_LIMITED when the solver stopped at the time limit with a plan
+        not proven within HORIZON_GAP of the optimum
+    """
+    pulp = load_pulp()
+    saturation = (1 - FIXED_LOAD) / LOAD_SLOPE
+    powers = powers or rooms
+    steps = len(prices)
+    penalty = unmet_penalty(rooms, powers, prices)
+
+    prob = pulp.LpProblem("Minimize_Horizon_Y", pulp.LpMinimize)
+    objective, variables = [], []
+    for (r, (x_values, p_values, room_demands, capacity)) in enumerate(zip(rooms, powers, demands, capacities)):
+        groups = group_units(x_values, p_values)
+        stored = [pulp.LpVariable(f"stored{r}_{t}", 0, capacity) for t in range(steps + 1)]
+        unmet = [pulp.LpVariable(f"unmet{r}_{t}", 0) for t in range(steps)]
+        prob += pulp.LpConstraint(pulp.LpAffineExpression([(stored[0], 1)]), pulp.LpConstraintEQ, rhs=0)
+        room = {}
+        for t in range(steps):
+            outputs = []
+            for (g, ((x, p), units)) in enumerate(groups.items()):
+                n = len(units)
+                full = pulp.LpVariable(f"full{r}_{g}_{t}", 0, n, cat="Integer")
+                sloped = pulp.LpVariable(f"sloped{r}_{g}_{t}", 0, n, cat="Integer")
+                full_output = pulp.LpVariable(f"full_output{r}_{g}_{t}", 0)
+                sloped_output = pulp.LpVariable(f"sloped_output{r}_{g}_{t}", 0)
+                room[g, t] = (full, sloped, full_output, sloped_output)
+                if start and (r, g, t) in start:
+                    full.setInitialValue(start[r, g, t][0])
+                    sloped.setInitialValue(start[r, g, t][1])
+
+                # 耗电按额定功率计：满载为 p，斜坡段为 p * (0.3 + 0.8 * z)
+                price = prices[t]
+                objective += [(full, price * p), (sloped_output, price * LOAD_SLOPE * p / x), (sloped, price * FIXED_LOAD * p)]
+                for (terms, sense, rhs) in [
+                    ([(full, 1), (sloped, 1)], pulp.LpConstraintLE, n),
+                    ([(full_output, 1), (full, -x)], pulp.LpConstraintLE, 0),
+                    ([(full_output, 1), (full, -saturation * x)], pulp.LpConstraintGE, 0),
+                    ([(sloped_output, 1), (sloped, -saturation * x)], pulp.LpConstraintLE, 0),
+                ]:
+                    prob += pulp.LpConstraint(pulp.LpAffineExpression(terms), sense, rhs=rhs)
+                outputs += [(full_output, -1), (sloped_output, -1)]
+
+            # 冷量平衡：储存 = 上一时段储存的剩余 + 出力 + 未满足 - 需求
+            balance = [(stored[t + 1], 1), (stored[t], -(1 - PRECOOL_LOSS)), (unmet[t], -1)] + outputs
+            prob += pulp.LpConstraint(pulp.LpAffineExpression(balance), pulp.LpConstraintEQ, rhs=-room_demands[t])
+            objective.append((unmet[t], penalty))
+        variables.append((groups, room, stored, unmet))
+
+    prob += pulp.LpAffineExpression(objective)
+    prob.solve(pulp.PULP_CBC_CMD(
+        msg=False, gapRel=HORIZON_GAP, timeLimit=time_limit or HORIZON_TIME_LIMIT, warmStart=bool(start),
+    ))
+    status = pulp.LpSolution[prob.sol_status]
+    if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        return None, None, None, status
+    if prob.sol_status == pulp.LpSolutionIntegerFeasible:
+        # CBC only stops on the time limit before reaching the gap
+        status = TIME_LIMITED
+
+    loads, stored_cooling, unmet_cooling = [], [], []
+    for ((x_values, (groups, room, stored, unmet))) in zip(rooms, variables):
+        room_loads = [[0] * steps for _ in x_values]
+        for t in range(steps):
+            for (g, ((x, _), units)) in enumerate(groups.items()):
+                full, sloped, full_output, sloped_output = room[g, t]
+                full_count, sloped_count = round(pulp.value(full)), round(pulp.value(sloped))
+                for i in units[:full_count]:
+                    room_loads[i][t] = pulp.value(full_output) / (x * full_count)
+                for i in units[full_count:full_count + sloped_count]:
+                    room_loads[i][t] = pulp.value(sloped_output) / (x * sloped_count)
+        loads.append(room_loads)
+        stored_cooling.append([pulp.value(stored[t + 1]) for t in range(steps)])
+        unmet_cooling.append([pulp.value(unmet[t]) for t in range(steps)])
+    return loads, stored_cooling, unmet_cooling, status
+
+
+def horizon_plan(aircons, start, step_minutes):
+    """
+    :return: dict, where the previous plan of the same units should be
+        remembered, and the running units it has at the steps from start on
+    """
+    if start is None:
+        return None
+    key = json.dumps([[aircon.get("unit") for aircon in units] for units in aircons])
+    previous = horizon_plans.get(key)
+    plan = {'key': key, 'start': start, 'counts': {}}
+    if previous is not None:
+        shift = round((start - previous['start']) / (step_minutes * 60))
+        if shift >= 0:
+            plan['counts'] = {(r, g, t - shift): counts for ((r, g, t), counts) in previous['counts'].items() if t >= shift}
+    return plan
+
+
+def optimize_horizon(rooms, demands, capacities, prices, method=None, powers=None, plan=None, time_limit=None):
+    """
+    Plan the unit loads of every room over a horizon.
+    :param method: str, 'milp' or 'fast', OPTIMIZE_METHOD if omitted
+    :param plan: dict, from horizon_plan; the MILP starts from the running
+        units of the previous plan, and from the fast plan at later steps
+    :return: see optimize_horizon_milp
+    """
+    method = method or OPTIMIZE_METHOD
+    loads, stored, unmet, status = optimize_horizon_fast(rooms, demands, capacities, prices, powers)
+    if method != 'fast':
+        start = running_units(rooms, powers or rooms, loads)
+        start.update(plan['counts'] if plan else {})
+        milp = optimize_horizon_milp(rooms, demands, capacities, prices, powers, start, time_limit)
+        if milp[0] is None:
+            # 无解时沿用动态规划的结果
+            logger.warning('No horizon plan found (%s), keeping the fast plan', milp[3])
+        else:
+            loads, stored, unmet, status = milp
+            if status == TIME_LIMITED:
+                logger.warning('The horizon plan of %d rooms over %d steps is the best found within the time limit',
+                               len(rooms), len(prices))
+    if plan is not None:
+        horizon_plans[plan['key']] = {'start': plan['start'], 'counts': running_units(rooms, powers or rooms, loads)}
+    return loads, stored, unmet, status
+
+
+def vincent_algorithm_horizon(data, timings=None):
+    """
+    Plan the unit loads of every room of a floor over the next steps.
+    :param data: dict, a floor as taken by vincent_algorithm_floor, with
+        "forecast", a list of the profile values expected at every step (such
+        as "temperature", "uv_index" or "number_of_people") and their energy
+        "price", rooms may have their own "forecast" overriding the floor's;
+        "step_minutes", the duration of a step; and "start", the epoch
+        seconds of the first step, to warm start from the previous plan;
+        "method", 'milp' or 'fast'; and "time_limit", the seconds the MILP
+        may take
+    :param timings: dict, accumulates the milliseconds spent in every phase
+    :return: dict, the loads of every unit at every step, and the stored
+        cooling, unmet demand and power drawn of every room at every step;
+        its "status" is TIME_LIMITED when the MILP plan is the best found
+        within the time limit rather than an optimum
+    """
+    step_minutes = float(data.get("step_minutes", HORIZON_STEP_MINUTES))
+    rooms = data["rooms"]
+    aircons = [room.get("aircons") or [
+        {"unit": unit, "capacity": capacity} for (unit, capacity) in load_default_units().items()
+    ] for room in rooms]
+    rows, steps, prices = horizon_profiles(data, step_minutes)
+
+    # 所有房间所有时段的所需功率一次算出
+    with timed(timings, 'psychrometrics'):
+        columns = {key: [row.get(key, default) for row in rows] for (key, default) in PROFILE_DEFAULTS.items()}
+        _, required_power = calculate_required_power_batch(columns)
+    demands = np.maximum(required_power, 0).reshape(len(rooms), steps).tolist()
+    capacities = [precool_capacity(room.get("profile", {}), step_minutes) for room in rooms]
+
+    x_values, p_values = zip(*map(resolve_units, aircons)) if aircons else ((), ())
+    powers = None if None in p_values else list(p_values)
+    x_values = list(x_values)
+
+    method = data.get("method") or OPTIMIZE_METHOD
+    with timed(timings, 'import'):
+        load_solver(method)
+    with timed(timings, 'solve'):
+        loads, stored, unmet, status = optimize_horizon(
+            x_values, demands, capacities, prices, method, powers,
+            plan=horizon_plan(aircons, data.get("start"), step_minutes),
+            time_limit=data.get("time_limit"),
+        )
+
+    output_rooms = []
+    for (r, room) in enumerate(rooms):
+        weights = (powers or x_values)[r]
+        drawn = [sum(w * y for (w, y) in zip(weights, calculate_y([loads[r][i][t] for i in range(len(weights))])))
+                 for t in range(steps)]
+        output_rooms.append({
+            "name": room.get("name"),
+            "required_power": [round(demand, 2) for demand in demands[r]],
+            "stored_cooling": [round(value, 2) for value in stored[r]],
+            "unmet_power": [round(value, 2) for value in unmet[r]],
+            "power": [round(value, 2) for value in drawn],
+            "schedule": [
+                {"unit": aircon["unit"], "percentages": [round(z, 2) for z in loads[r][i]]}
+                for (i, aircon) in enumerate(aircons[r])
+            ],
+        })
+    return {
+        "status": status,
+        "step_minutes": step_minutes,
+        "steps": steps,
+        "rooms": output_rooms,
+        "energy_wh": round(sum(sum(room["power"]) for room in output_rooms) * step_minutes / 60, 2),
+        "cost": round(sum(price * sum(room["power"][t] for room in output_rooms) for (t, price) in enumerate(prices)) * step_minutes / 60, 2),
+    }
+
+
 if __name__ == "__main__":
     vincent_algorithm_test()
@@ -0,0 +1,113 @@
+"""
+Process-wide AWS clients shared by the Lambda functions, the Streamlit pages
+and the scripts.
+
+Every boto3.client and boto3.resource call loads the service model and opens
+its own connection pool, so modules creating their own handles pay for both
+on import and again on every rerun, and their default pools of 10
+connections are smaller than the 32 concurrent writes of dynamodb_writes.
+Handles here are created on first use, once per service and endpoint, from a
+single session, with:
+
+- max_pool_connections for WRITE_WORKERS concurrent requests
+- TCP keep-alive, so that connections idle between invocations survive
+- adaptive retries, which also rate-limit the client while throttled
+- connect and read timeouts well below the Lambda timeouts, longer for
+  synchronous Lambda invocations
+
+The endpoint of a service can be overridden per call, or by the standard
+AWS_ENDPOINT_URL and AWS_ENDPOINT_URL_<SERVICE> variables, and override()
+installs a stand-in object instead, e.g. for benchmarks.
+"""
+import threading
+
+# At least dynamodb_writes.WRITE_WORKERS
+MAX_POOL_CONNECTIONS = 32
+MAX_ATTEMPTS = 5
+CONNECT_TIMEOUT = 2
+READ_TIMEOUT = 10
+# Services answering slower than READ_TIMEOUT
+READ_TIMEOUTS = {'lambda': 120}
+# Services whose client is taken from their resource, to share one pool
+RESOURCE_SERVICES = {'dynamodb'}
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+
+
+def config(service):
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS},
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUTS.get(service, READ_TIMEOUT),
+    )
+
+
+def session():
+    global _session
+    if _session is None:
+        # boto3 is only imported once a handle is needed, shortening cold starts
+        import boto3
+        _session = boto3.session.Session()
+    return _session
+
+
+def resource(service, endpoint_url=None):
+    """
+    :param service: str, the service name, e.g. 'dynamodb'
+    :param endpoint_url: str, the endpoint, the default one if omitted
+    :return: the shared boto3 service resource
+    """
+    key = (service, endpoint_url)
+    if key not in _resources:
+        with _lock:
+            if key not in _resources:
+                _resources[key] = session().resource(service, endpoint_url=endpoint_url, config=config(service))
+    return _resources[key]
+
+
+def client(service, endpoint_url=None):
+    """
+    :param service: str, the service name, e.g. 'kinesis'
+    :param endpoint_url: str, the endpoint, the default one if omitted
+    :return: the shared, thread-safe boto3 client
+    """
+    key = (service, endpoint_url)
+    if key not in _clients:
+        if service in RESOURCE_SERVICES:
+            _clients[key] = resource(service, endpoint_url).meta.client
+        else:
+            with _lock:
+                if key not in _clients:
+                    _clients[key] = session().client(service, endpoint_url=endpoint_url, config=config(service))
+    return _clients[key]
+
+
+def override(service, stand_in, endpoint_url=None):
+    """
+    Return the given object for the service from now on.
+    :param stand_in: a client, or a resource for RESOURCE_SERVICES
+    """
+    key = (service, endpoint_url)
+    with _lock:
+        if service in RESOURCE_SERVICES:
+            _resources[key] = stand_in
+            _clients.pop(key, None)
+        else:
+            _clients[key] = stand_in
+
+
+def reset():
+    """
+    Drop every handle, e.g. after the credentials changed.
+    """
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
@@ -0,0 +1,69 @@
+"""
+Dead-letter sink for Kinesis records that can never be processed.
+
+Poison records (undecodable or invalid payloads) are sent to the SQS queue at
+DEAD_LETTER_QUEUE_URL together with the reason, instead of failing the batch,
+so that retries only cover records that may still succeed.
+"""
+import aws_clients
+from botocore.exceptions import BotoCoreError, ClientError
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_QUEUE_URL = os.environ.get('DEAD_LETTER_QUEUE_URL')
+# SendMessageBatch accepts at most 10 messages
+SEND_BATCH_LIMIT = 10
+
+sqs = None
+
+
+def client():
+    global sqs
+    if sqs is None:
+        sqs = aws_clients.client('sqs')
+    return sqs
+
+
+def message(source, record, reason):
+    kinesis = record['kinesis']
+    return json.dumps({
+        'source': source,
+        'reason': reason,
+        'sequenceNumber': kinesis['sequenceNumber'],
+        'partitionKey': kinesis.get('partitionKey'),
+        'data': kinesis['data'],
+    })
+
+
+def send(source, poison):
+    """
+    Set poison records aside in the dead-letter queue.
+    :param source: str, the name of the function that rejected the records
+    :param poison: list, the (Kinesis record, reason) pairs
+    :return: list, the records that could not be sent and must be retried
+    """
+    if not poison:
+        return []
+    if not DEAD_LETTER_QUEUE_URL:
+        for (record, reason) in poison:
+            logger.error('Dropped poison record %s: %s', record['kinesis']['sequenceNumber'], reason)
+        return []
+
+    undelivered = []
+    for start in range(0, len(poison), SEND_BATCH_LIMIT):
+        chunk = poison[start:start + SEND_BATCH_LIMIT]
+        entries = [
+            {'Id': str(i), 'MessageBody': message(source, record, reason)}
+            for (i, (record, reason)) in enumerate(chunk)
+        ]
+        try:
+            response = client().send_message_batch(QueueUrl=DEAD_LETTER_QUEUE_URL, Entries=entries)
+        except (BotoCoreError, ClientError):
+            logger.exception('Failed to send %d poison records to the dead-letter queue', len(chunk))
+            undelivered.extend(record for (record, _) in chunk)
+            continue
+        undelivered.extend(chunk[int(failure['Id'])][0] for failure in response.get('Failed', []))
+    return undelivered
@@ -0,0 +1,96 @@
+"""
+Batched DynamoDB reads shared by the Lambda functions and the dashboard.
+
+BatchGetItem fetches up to 100 keys per call, so reading the latest state of
+every room of a floor costs a call per hundred rooms instead of a query each.
+"""
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+# Retries of unprocessed keys, with exponential backoff
+MAX_RETRIES = 5
+RETRY_DELAY = 0.05
+MAX_RETRY_DELAY = 1.0
+PARALLEL_WORKERS = 16
+
+
+def batch_get(dynamodb, table_name, keys):
+    """
+    Fetch many items of a table with BatchGetItem.
+    :param dynamodb: the boto3 DynamoDB service resource
+    :param table_name: str, the name of the table
+    :param keys: list, the primary keys of the items
+    :return: list, the items found, in no particular order
+    :raise ClientError: if keys are still unprocessed after MAX_RETRIES
+        retries
+    """
+    items, pending, delay = [], list(keys), RETRY_DELAY
+    for attempt in range(MAX_RETRIES + 1):
+        unprocessed = []
+        for start in range(0, len(pending), BATCH_GET_LIMIT):
+            request = {table_name: {'Keys': pending[start:start + BATCH_GET_LIMIT]}}
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response['Responses'].get(table_name, []))
+            unprocessed.extend(response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', []))
+        pending = unprocessed
+        if not pending:
+            return items
+        if attempt < MAX_RETRIES:
+            # Unprocessed keys mean throttling, so back off once per round
+            # and retry the leftovers of every chunk together
+            logger.debug('Retrying %d unprocessed keys', len(pending))
+            time.sleep(delay)
+            delay = min(2 * delay, MAX_RETRY_DELAY)
+    raise ClientError({'Error': {
+        'Code': 'ProvisionedThroughputExceededException',
+        'Message': f'{len(pending)} keys still unprocessed after {MAX_RETRIES} retries',
+    }}, 'BatchGetItem')
+
+
+def parallel_get(make_table, keys, workers=PARALLEL_WORKERS):
+    """
+    Fetch many items with concurrent GetItem calls, for callers that may not
+    use BatchGetItem.
+    :param make_table: callable, returns a Table handle; called once per
+        worker thread since boto3 resources are not thread-safe, while Tables
+        of one service resource share its thread-safe client
+    :param keys: list, the primary keys of the items
+    :param workers: int, the number of concurrent requests
+    :return: list, the items found, in no particular order
+    """
+    local = threading.local()
+
+    def get(key):
+        if not hasattr(local, 'table'):
+            local.table = make_table()
+        return local.table.get_item(Key=key).get('Item')
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [item for item in executor.map(get, keys) if item is not None]
+
+
+def read_items(dynamodb, table_name, keys, make_table=None):
+    """
+    Fetch many items with BatchGetItem, falling back to concurrent GetItem
+    calls when the batch request is refused.
+    :param dynamodb: the boto3 DynamoDB service resource
+    :param table_name: str, the name of the table
+    :param keys: list, the primary keys of the items
+    :param make_table: callable, returns a Table handle for the fallback,
+        which is disabled if omitted
+    :return: list, the items found, in no particular order
+    """
+    try:
+        return batch_get(dynamodb, table_name, keys)
+    except ClientError as e:
+        if make_table is None:
+            raise
+        logger.warning('BatchGetItem failed (%s), reading items one by one', e)
+        return parallel_get(make_table, keys)
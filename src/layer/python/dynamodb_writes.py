@@ -0,0 +1,102 @@
+"""
+Conditional DynamoDB writes shared by the ingestion Lambda functions.
+
+Kinesis may deliver readings of the same key out of order across shards,
+parallelized batches and retries. A plain BatchWriteItem lets an older
+reading overwrite a newer one, and BatchWriteItem takes no conditions. Items
+are therefore written with one conditional UpdateItem each, so the stored
+timestamp only moves forward, without reading the item first. The writes are
+sent concurrently through the thread-safe low-level client, which keeps a
+batch as fast as a BatchWriteItem call.
+"""
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A Kinesis batch rarely updates more distinct keys than this, so most
+# batches are written in a single round trip. The connection pool of the
+# client, aws_clients.MAX_POOL_CONNECTIONS, must be as large.
+WRITE_WORKERS = 32
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WRITE_WORKERS)
+    return _executor
+
+
+def update_if_newer(table, item, key_names=('id',), order='timestamp', since=None):
+    """
+    Write the item unless the stored one is at least as recent.
+    :param table: the boto3 DynamoDB Table
+    :param item: dict, the full item with its key and order attributes, the
+        attributes set to None are removed
+    :param key_names: tuple, the primary key attributes
+    :param order: str, the attribute that must increase
+    :param since: the order value of the stored item the new one was derived
+        from, 0 if there was none; if given, the write also fails when any
+        other item was written since
+    :return: bool, whether the item was written
+    """
+    attributes = [name for name in item if name not in key_names]
+    names = {f'#a{i}': name for (i, name) in enumerate(attributes)}
+    values = {f':a{i}': item[name] for (i, name) in enumerate(attributes) if item[name] is not None}
+    expression = 'SET ' + ', '.join(f'#a{i} = :a{i}' for (i, name) in enumerate(attributes) if item[name] is not None)
+    removed = [f'#a{i}' for (i, name) in enumerate(attributes) if item[name] is None]
+    if removed:
+        expression += ' REMOVE ' + ', '.join(removed)
+    order_name = f'#a{attributes.index(order)}'
+    if since is None:
+        condition = f'attribute_not_exists({order_name}) OR {order_name} < :a{attributes.index(order)}'
+    else:
+        condition = f'attribute_not_exists({order_name}) OR {order_name} = :since'
+    try:
+        table.meta.client.update_item(
+            TableName=table.name,
+            Key={name: item[name] for name in key_names},
+            UpdateExpression=expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values if since is None else {**values, ':since': since},
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    return True
+
+
+def update_all(table, items, key_names=('id',), order='timestamp', since=None):
+    """
+    Conditionally write many items concurrently, see update_if_newer.
+    :param since: list, the since argument of every item, if any
+    :return: list, whether every item was written, None if it failed
+    """
+    def write(item, since):
+        try:
+            return update_if_newer(table, item, key_names, order, since)
+        except (BotoCoreError, ClientError):
+            logger.exception('Failed to write item %s', {name: item[name] for name in key_names})
+            return None
+
+    since = since or [None] * len(items)
+    if len(items) <= 1:
+        return [write(item, previous) for (item, previous) in zip(items, since)]
+    return list(executor().map(write, items, since))
+
+
+def write_newer(table, items, key_names=('id',), order='timestamp'):
+    """
+    Conditionally write many items concurrently, see update_if_newer.
+    :return: tuple, the numbers of items written and of stale items skipped,
+        and the items that failed to be written
+    """
+    outcomes = update_all(table, items, key_names, order)
+    failed = [item for (item, outcome) in zip(items, outcomes) if outcome is None]
+    written = sum(outcome is True for outcome in outcomes)
+    return written, len(items) - written - len(failed), failed
@@ -0,0 +1,131 @@
+"""
+Low-overhead instrumentation shared by the Lambda handlers.
+
+Handlers wrapped with `handler` collect per-phase timings and counters of an
+invocation in `metrics` and print them at its end as one CloudWatch Embedded
+Metric Format (EMF) log line, which CloudWatch turns into metrics without any
+API call. Timing a phase costs two perf_counter calls.
+
+    @instrumentation.handler('MonitorSensors')
+    def lambda_handler(event, context):
+        with metrics.timed('decode'):
+            ...
+        metrics.count('records', len(event['Records']))
+"""
+from contextlib import contextmanager
+import functools
+import json
+import logging
+import os
+import sys
+import time
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'AirConditionerStrategy')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# EMF lines are only printed inside Lambda unless EMIT_METRICS says otherwise
+EMIT_METRICS = os.environ.get('EMIT_METRICS', str('AWS_LAMBDA_FUNCTION_NAME' in os.environ)).lower() == 'true'
+
+
+def get_logger():
+    """
+    The root logger at LOG_LEVEL. Handlers log with %-style arguments, so a
+    disabled level costs a level check and no formatting.
+    """
+    logger = logging.getLogger()
+    logger.setLevel(LOG_LEVEL)
+    return logger
+
+
+@contextmanager
+def timed(timings, phase):
+    """
+    Accumulate the milliseconds spent in the block into timings[phase].
+    :param timings: dict, the timings to update, nothing is recorded if None
+    :param phase: str, the name of the phase
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0) + 1000 * (time.perf_counter() - start)
+
+
+class Metrics:
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, function):
+        self.function = function
+        self.timings = {}
+        self.counts = {}
+
+    def timed(self, phase):
+        return timed(self.timings, phase)
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def to_emf(self):
+        metrics = [{'Name': name, 'Unit': 'Milliseconds'} for name in self.timings]
+        metrics += [{'Name': name, 'Unit': 'Count'} for name in self.counts]
+        return {
+            '_aws': {
+                'Timestamp': int(1000 * time.time()),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Function']],
+                    'Metrics': metrics,
+                }],
+            },
+            'Function': self.function,
+            **{name: round(duration, 3) for (name, duration) in self.timings.items()},
+            **self.counts,
+        }
+
+    def emit(self):
+        # EMF must be a bare JSON line, so it bypasses the logging formatter
+        if EMIT_METRICS:
+            sys.stdout.write(json.dumps(self.to_emf()) + '\n')
+            sys.stdout.flush()
+
+
+# One invocation runs at a time in a Lambda container
+metrics = Metrics()
+
+
+def handler(function):
+    """
+    Decorate a lambda_handler to collect the metrics of every invocation,
+    including its total duration as 'handler' and cold starts, and emit them.
+    :param function: str, the value of the Function dimension
+    """
+    def decorate(lambda_handler):
+        cold_start = True
+
+        @functools.wraps(lambda_handler)
+        def wrapper(event, context):
+            nonlocal cold_start
+            metrics.reset(function)
+            metrics.count('cold_start', int(cold_start))
+            cold_start = False
+            try:
+                with metrics.timed('handler'):
+                    return lambda_handler(event, context)
+            finally:
+                metrics.emit()
+        return wrapper
+    return decorate
+
+
+def timed_function(phase):
+    """
+    Decorate a function to accumulate its duration into metrics as phase.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.timed(phase):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
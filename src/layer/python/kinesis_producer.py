@@ -0,0 +1,175 @@
+"""
+Aggregating Kinesis producer shared by the simulator and the Streamlit pages.
+
+A shard accepts at most 1000 records and 1 MiB per second, so one reading per
+record caps it at 1000 readings per second. Like the Kinesis Producer
+Library, this producer buffers readings and aggregates them, here with
+wire_format, into records of up to record_bytes, by default one 25 KiB PUT
+payload unit, which lets a shard carry ~87000 readings per second. Buffered
+readings are sent once they fill MAX_RECORDS records or the oldest of them
+waited linger_seconds, in PutRecords calls from a thread pool, and throttled
+records are retried with exponential backoff. The consumers de-aggregate the
+records through wire_format.decode.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+import json
+import logging
+import threading
+import time
+
+import wire_format
+
+logger = logging.getLogger(__name__)
+
+# PutRecords takes at most 500 records and 5 MiB
+MAX_RECORDS = 500
+RECORD_BYTES = 25 << 10
+LINGER_SECONDS = 0.5
+WORKERS = 4
+# Retries of throttled records, with exponential backoff
+MAX_RETRIES = 5
+RETRY_DELAY = 0.1
+
+
+class KinesisProducer:
+    def __init__(self, client, stream_name, kind, record_bytes=RECORD_BYTES, linger_seconds=LINGER_SECONDS,
+                 workers=WORKERS, on_record=None):
+        """
+        :param client: the boto3 Kinesis client
+        :param kind: int, wire_format.SENSOR or ACTIVITY, or None to send
+            every reading as its own JSON record
+        :param record_bytes: int, the size budget of an aggregated record
+        :param linger_seconds: float, the latency budget of a reading, 0 to
+            only send on flush
+        :param on_record: callable, called with the PutRecords result, the
+            time the oldest reading was put and the readings of every record
+            sent
+        """
+        self.client = client
+        self.stream_name = stream_name
+        self.kind = kind
+        if kind is None:
+            self.readings_per_record = 1
+        else:
+            size = wire_format.READINGS[kind].size
+            self.readings_per_record = max(1, min(wire_format.MAX_READINGS, (record_bytes - wire_format.HEADER.size) // size))
+        self.linger_seconds = linger_seconds
+        self.on_record = on_record
+        self.counts = Counter()
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        self.stopped = threading.Event()
+        self.thread = None
+        if linger_seconds:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    @property
+    def buffered(self):
+        return len(self.buffer)
+
+    def count(self, name, value=1):
+        # Records are sent from many threads
+        with self.lock:
+            self.counts[name] += value
+
+    def put(self, reading, partition_key):
+        """
+        Buffer a reading, sending the buffer once it fills MAX_RECORDS records.
+        :param reading: dict, the payload of the reading
+        :param partition_key: str, the partition key of the reading; a record
+            takes the key of its first reading
+        """
+        with self.lock:
+            self.buffer.append((reading, partition_key, time.time()))
+            full = len(self.buffer) >= MAX_RECORDS * self.readings_per_record
+        if full:
+            self.flush(block=False)
+
+    def aggregate(self, entries):
+        records = []
+        for start in range(0, len(entries), self.readings_per_record):
+            chunk = entries[start:start + self.readings_per_record]
+            readings = [reading for (reading, _, _) in chunk]
+            if self.kind is None:
+                data = json.dumps(readings[0]).encode('utf-8')
+            else:
+                data = wire_format.encode(self.kind, readings)
+            records.append(({'Data': data, 'PartitionKey': chunk[0][1]}, chunk[0][2], len(chunk)))
+        return records
+
+    def flush(self, block=True):
+        """
+        Send the buffered readings.
+        :param block: bool, whether to wait until every record in flight was
+            sent or given up
+        """
+        with self.lock:
+            entries, self.buffer = self.buffer, []
+        records = self.aggregate(entries)
+        futures = [
+            self.executor.submit(self.send, records[start:start + MAX_RECORDS])
+            for start in range(0, len(records), MAX_RECORDS)
+        ]
+        with self.lock:
+            self.futures = [future for future in self.futures if not future.done()] + futures
+            in_flight = list(self.futures)
+        if block:
+            wait(in_flight)
+
+    def send(self, records):
+        delay = RETRY_DELAY
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.client.put_records(
+                    StreamName=self.stream_name,
+                    Records=[record for (record, _, _) in records],
+                )
+            except Exception as e:
+                # Network errors are retried like throttling
+                logger.warning('Failed to put %d records to %s: %s', len(records), self.stream_name, e)
+                self.count('errors')
+                retry = records
+            else:
+                self.count('put_records')
+                retry = []
+                for ((record, put_at, readings), result) in zip(records, response['Records']):
+                    if 'ErrorCode' not in result:
+                        self.count('records_sent')
+                        self.count('readings_sent', readings)
+                        self.count('bytes_sent', len(record['Data']))
+                        if self.on_record is not None:
+                            self.on_record(result, put_at, readings)
+                    elif result['ErrorCode'] == 'ProvisionedThroughputExceededException':
+                        self.count('throttled')
+                        retry.append((record, put_at, readings))
+                    else:
+                        self.count('failed', readings)
+            if not retry:
+                return
+            records = retry
+            if attempt < MAX_RETRIES:
+                self.count('retried', len(retry))
+                time.sleep(delay)
+                delay *= 2
+        self.count('failed', sum(readings for (_, _, readings) in records))
+
+    def run(self):
+        while not self.stopped.wait(self.linger_seconds / 4):
+            with self.lock:
+                due = self.buffer and time.time() - self.buffer[0][2] >= self.linger_seconds
+            if due:
+                self.flush(block=False)
+
+    def close(self):
+        """
+        Send the buffered readings and stop the producer.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        self.executor.shutdown()
@@ -0,0 +1,64 @@
+"""
+Decoding and failure reporting of the Kinesis batches shared by the ingestion
+Lambda functions.
+
+Every record is decoded and validated on its own, so that one bad record
+neither fails the batch nor hides the valid readings of the others. Records
+with invalid readings are returned as poison, for dead_letters, and the
+records whose writes failed are reported back to Kinesis as
+batchItemFailures, so that only they are retried.
+"""
+import base64
+from instrumentation import metrics
+import wire_format
+
+
+def unique_records(records):
+    # Retried and resharded batches may deliver a record twice
+    seen, unique = set(), []
+    for record in records:
+        sequence_number = record['kinesis']['sequenceNumber']
+        if sequence_number not in seen:
+            seen.add(sequence_number)
+            unique.append(record)
+    metrics.count('duplicate_records', len(records) - len(unique))
+    return unique
+
+
+def decode_record(record):
+    # Binary records pack several readings, JSON records hold one
+    return wire_format.decode(base64.b64decode(record['kinesis']['data']))
+
+
+def decode_records(records, validate):
+    """
+    Decode and validate every record, and every reading of a record, on its
+    own.
+    :param records: list, the Kinesis records of the batch
+    :param validate: callable, returns a valid reading or raises KeyError,
+        TypeError or ValueError
+    :return: tuple, the (record, payload) pairs of the valid readings and the
+        (record, reason) pairs of the records with invalid readings
+    """
+    valid, poison = [], []
+    for record in unique_records(records):
+        try:
+            payloads = decode_record(record)
+        except (KeyError, TypeError, ValueError) as e:
+            poison.append((record, f'{type(e).__name__}: {e}'))
+            continue
+        reasons = []
+        for payload in payloads:
+            try:
+                valid.append((record, validate(payload)))
+            except (KeyError, TypeError, ValueError) as e:
+                reasons.append(f'{type(e).__name__}: {e}')
+        if reasons:
+            poison.append((record, '; '.join(reasons)))
+    return valid, poison
+
+
+def batch_item_failures(records):
+    # Kinesis resumes the batch from the lowest failed sequence number
+    sequence_numbers = dict.fromkeys(record['kinesis']['sequenceNumber'] for record in records)
+    return [{'itemIdentifier': sequence_number} for sequence_number in sequence_numbers]
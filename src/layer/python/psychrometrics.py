@@ -0,0 +1,140 @@
+"""
+Psychrometric properties of humid air from a precomputed CoolProp grid.
+
+The grid spans temperature x relative humidity x pressure and holds the
+humidity ratio (kg/kg), the enthalpy (J/kg dry air) and the dry air density
+(kg/m^3). Queries are answered by trilinear interpolation; inputs outside the
+grid fall back to CoolProp at runtime.
+
+Regenerate the grid after changing the axes with
+
+    python src/layer/python/psychrometrics.py
+"""
+import instrumentation
+import numpy as np
+from pathlib import Path
+
+DEFAULT_PRESSURE = 101325  # Pa
+TABLE_PATH = Path(__file__).with_name('psychrometrics.npy')
+
+# Grid axes as (start, stop, step), both ends included
+TEMPERATURE_AXIS = (-10.0, 50.0, 0.5)  # °C
+HUMIDITY_AXIS = (0.0, 100.0, 2.0)  # %
+PRESSURE_AXIS = (90000.0, 105000.0, 2500.0)  # Pa
+AXES = [TEMPERATURE_AXIS, HUMIDITY_AXIS, PRESSURE_AXIS]
+
+# Interpolation error against CoolProp inside the grid, checked by
+# bench/psychrometrics_accuracy.py: relative error of the humidity ratio and of
+# enthalpy differences over at least 1 K, absolute error of the enthalpy
+RELATIVE_TOLERANCE = 5e-3
+ENTHALPY_TOLERANCE = 100.0  # J/kg
+
+_table = None
+
+
+def axis_points(axis):
+    start, stop, step = axis
+    return start + step * np.arange(round((stop - start) / step) + 1)
+
+
+@instrumentation.timed_function('coolprop')
+def coolprop_properties(temperature, relative_humidity, pressure):
+    """
+    Evaluate one state with CoolProp.
+    :param temperature: float, dry bulb temperature in °C
+    :param relative_humidity: float, relative humidity in %
+    :param pressure: float, pressure in Pa
+    :return: tuple, the humidity ratio, enthalpy and dry air density
+    """
+    import CoolProp.CoolProp as CP
+
+    instrumentation.metrics.count('coolprop_points')
+
+    kelvin = temperature + 273.15
+    humidity_ratio = CP.HAPropsSI('W', 'T', kelvin, 'P', pressure, 'RH', relative_humidity / 100)
+    enthalpy = CP.HAPropsSI('H', 'T', kelvin, 'P', pressure, 'W', humidity_ratio)
+    density = CP.PropsSI('D', 'T', kelvin, 'P', pressure, 'Air')
+    return humidity_ratio, enthalpy, density
+
+
+def build_table():
+    temperatures, humidities, pressures = (axis_points(axis) for axis in AXES)
+    table = np.empty((3, len(temperatures), len(humidities), len(pressures)), dtype=np.float32)
+    for (i, temperature) in enumerate(temperatures):
+        for (j, humidity) in enumerate(humidities):
+            for (k, pressure) in enumerate(pressures):
+                table[:, i, j, k] = coolprop_properties(temperature, humidity, pressure)
+    return table
+
+
+def load_table():
+    global _table
+    if _table is None:
+        # Pages of the memory-mapped file are read on first touch only
+        _table = np.asarray(np.load(TABLE_PATH, mmap_mode='r'))
+    return _table
+
+
+def scalar_properties(temperature, relative_humidity, pressure):
+    table = load_table()
+    inputs = (temperature, relative_humidity, pressure)
+    corners, weights = [], []
+    for (value, (start, stop, step), size) in zip(inputs, AXES, table.shape[1:]):
+        if not start <= value <= stop:
+            return coolprop_properties(*inputs)
+        index = min(int((value - start) // step), size - 2)
+        fraction = (value - start) / step - index
+        corners.append(slice(index, index + 2))
+        weights.append(np.array([1 - fraction, fraction]))
+    (u, v, w) = weights
+    block = table[(slice(None), *corners)]
+    result = block @ w @ v @ u
+    return float(result[0]), float(result[1]), float(result[2])
+
+
+def properties(temperature, relative_humidity, pressure=DEFAULT_PRESSURE):
+    """
+    Look up humid air properties, element-wise over broadcast array inputs.
+    :param temperature: float or array, dry bulb temperature in °C
+    :param relative_humidity: float or array, relative humidity in %
+    :param pressure: float or array, pressure in Pa
+    :return: tuple, arrays of humidity ratio, enthalpy and dry air density
+    """
+    if np.ndim(temperature) == np.ndim(relative_humidity) == np.ndim(pressure) == 0:
+        return scalar_properties(float(temperature), float(relative_humidity), float(pressure))
+
+    table = load_table()
+    inputs = np.broadcast_arrays(
+        np.asarray(temperature, dtype=float),
+        np.asarray(relative_humidity, dtype=float),
+        np.asarray(pressure, dtype=float),
+    )
+    shape = inputs[0].shape
+    inputs = [values.ravel() for values in inputs]
+
+    inside = np.ones(inputs[0].shape, dtype=bool)
+    indices, fractions = [], []
+    for (values, (start, stop, step), size) in zip(inputs, AXES, table.shape[1:]):
+        inside &= (start <= values) & (values <= stop)
+        position = (values - start) / step
+        index = np.clip(np.floor(position).astype(int), 0, size - 2)
+        indices.append(index)
+        fractions.append(np.clip(position - index, 0.0, 1.0))
+
+    (i, j, k), (u, v, w) = indices, fractions
+    result = np.zeros((3, len(u)))
+    for (di, wi) in [(0, 1 - u), (1, u)]:
+        for (dj, wj) in [(0, 1 - v), (1, v)]:
+            for (dk, wk) in [(0, 1 - w), (1, w)]:
+                result += table[:, i + di, j + dj, k + dk] * (wi * wj * wk)
+
+    for n in np.flatnonzero(~inside):
+        result[:, n] = coolprop_properties(*(values[n] for values in inputs))
+
+    humidity_ratio, enthalpy, density = (values.reshape(shape) for values in result)
+    return humidity_ratio, enthalpy, density
+
+
+if __name__ == '__main__':
+    np.save(TABLE_PATH, build_table())
+    print(f'Saved psychrometric table to {TABLE_PATH}')
@@ -0,0 +1,155 @@
+"""
+Catalog of AC unit specifications parsed from data/hitachi-spec-en.csv.
+
+The CSV is parsed once into a NumPy structured array and shipped as
+unit_catalog.npy, which loads without any parsing. Units are indexed by model
+name, by cooling capacity and by efficiency, and their names by trigrams for
+fuzzy lookups of the models mentioned in free text.
+
+Regenerate the catalog after changing the datasheet with
+
+    python src/layer/python/unit_catalog.py
+"""
+from collections import Counter, defaultdict
+import csv
+from functools import lru_cache
+import numpy as np
+from pathlib import Path
+import re
+
+CATALOG_PATH = Path(__file__).with_name('unit_catalog.npy')
+DATASHEET_PATH = Path(__file__).resolve().parents[3] / 'data' / 'hitachi-spec-en.csv'
+
+# Catalog fields, their dtype and the datasheet column and scale they come from
+FIELDS = [
+    ('unit', '<U16', 'unit', None),
+    ('cooling_capacity', '<f8', 'cooling capacity (kW)', 1000),  # W
+    ('dehumidification_capacity', '<f8', 'dehumidification capacity (l/h)', 1),  # l/h
+    ('current', '<f8', 'current (A)', 1),  # A
+    ('max_current', '<f8', 'max current (A)', 1),  # A
+    ('power_input', '<f8', 'power input (W)', 1),  # W
+    ('cspf', '<f8', 'cspf (kWh/kWh)', 1),
+    ('annual_power_consumption', '<f8', 'annual power consumption (degree/year)', 1),  # kWh/year
+]
+# Fuzzy lookups return at most SEARCH_COUNT names whose trigram similarity
+# to a mention reaches SEARCH_THRESHOLD
+SEARCH_COUNT = 8
+SEARCH_THRESHOLD = 0.5
+# Mentions span up to this many words, e.g. "RAS 22 NJP"
+MENTION_WORDS = 3
+DTYPE = np.dtype([(name, dtype) for (name, dtype, _, _) in FIELDS])
+
+
+def parse_datasheet(path=DATASHEET_PATH):
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    records = np.empty(len(rows), dtype=DTYPE)
+    for (name, _, column, scale) in FIELDS:
+        values = [row[column].strip() for row in rows]
+        records[name] = values if scale is None else [float(value) * scale for value in values]
+    return records
+
+
+def normalize(name: str):
+    return re.sub(r'[^0-9A-Z]', '', name.upper())
+
+
+def trigrams(name: str):
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+def mentions(text: str):
+    """
+    :return: set, the normalized word sequences of the text that may name a
+        model, which all contain a digit
+    """
+    words = re.findall(r'[0-9A-Za-z]+', text)
+    return {
+        mention
+        for start in range(len(words))
+        for end in range(start + 1, min(start + MENTION_WORDS, len(words)) + 1)
+        for mention in [normalize(''.join(words[start:end]))]
+        if len(mention) >= 3 and re.search(r'[0-9]', mention)
+    }
+
+
+class UnitCatalog:
+    def __init__(self, records: np.ndarray):
+        self.records = records
+        self.index = {str(name): i for (i, name) in enumerate(records['unit'])}
+        self.capacity_order = np.argsort(records['cooling_capacity'], kind='stable')
+        self.efficiency_order = np.argsort(-records['cspf'], kind='stable')
+        self.grams = [trigrams(normalize(str(name))) for name in records['unit']]
+        self.trigram_index = defaultdict(list)
+        for (i, grams) in enumerate(self.grams):
+            for gram in grams:
+                self.trigram_index[gram].append(i)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, unit: str):
+        return unit in self.index
+
+    def __getitem__(self, unit: str):
+        return self.spec(self.index[unit])
+
+    def get(self, unit: str, default=None):
+        i = self.index.get(unit)
+        return default if i is None else self.spec(i)
+
+    def spec(self, i: int):
+        record = self.records[i]
+        return {name: record[name].item() for (name, _, _, _) in FIELDS}
+
+    def names(self):
+        return list(self.index)
+
+    def by_capacity(self, low: float, high: float):
+        """
+        :param low: float, the smallest cooling capacity in W (inclusive)
+        :param high: float, the largest cooling capacity in W (inclusive)
+        :return: list, the unit names in the range by increasing capacity
+        """
+        capacities = self.records['cooling_capacity'][self.capacity_order]
+        start = np.searchsorted(capacities, low, side='left')
+        end = np.searchsorted(capacities, high, side='right')
+        return [str(self.records['unit'][i]) for i in self.capacity_order[start:end]]
+
+    def most_efficient(self, count: int = None):
+        """
+        :param count: int, the number of units to return, all if omitted
+        :return: list, the unit names by decreasing CSPF
+        """
+        return [str(self.records['unit'][i]) for i in self.efficiency_order[:count]]
+
+    def search(self, text: str, count: int = SEARCH_COUNT, threshold: float = SEARCH_THRESHOLD):
+        """
+        Find the units mentioned in free text, tolerating case, separators and
+        typos, through the trigram index rather than a scan of every name.
+        :param text: str, e.g. a chat message
+        :param count: int, the number of units to return
+        :param threshold: float, the smallest Dice similarity of the trigrams
+            of a mention and a name
+        :return: list, the unit names by decreasing similarity
+        """
+        scores = {}
+        for mention in mentions(text):
+            grams = trigrams(mention)
+            shared = Counter(i for gram in grams for i in self.trigram_index.get(gram, []))
+            for (i, common) in shared.items():
+                score = 2 * common / (len(grams) + len(self.grams[i]))
+                if score >= threshold and score > scores.get(i, 0):
+                    scores[i] = score
+        best = sorted(scores, key=lambda i: (-scores[i], i))[:count]
+        return [str(self.records['unit'][i]) for i in best]
+
+
+@lru_cache(maxsize=None)
+def load_catalog(path=CATALOG_PATH):
+    return UnitCatalog(np.load(path))
+
+
+if __name__ == '__main__':
+    np.save(CATALOG_PATH, parse_datasheet())
+    print(f'Saved unit catalog to {CATALOG_PATH}')
@@ -1,16 +1,44 @@
-import boto3
-import json
+"""
+Load generator for the sensor and activity Kinesis streams.
+
+Simulates many sensors and rooms publishing at a steady rate through the
+aggregating producer of the Lambda layer, keyed by sensor or room so the
+records spread over the shards. A consumer tails the streams to measure the
+end-to-end lag of every record, from the generation of its oldest reading
+until it is read back (or, with --local, until the handler has processed it).
+
+    python test/simulator.py --stream_name SENSOR_STREAM --duration_minutes 5 \\
+        --probability 0.05 --sensors 1000 --rate 1
+    python test/simulator.py --local --shards 2 --sensors 2000 --rooms 100 \\
+        --duration_minutes 0.5 --probability 0.05
+
+Readings are aggregated in the binary wire format into records of up to
+--record_bytes, sent within --linger_seconds, or sent as one JSON record each
+with --wire_format json.
+"""
+import argparse
+import base64
+from collections import Counter
+from pathlib import Path
 import random
+import sys
+import threading
 import time
-import argparse
-
 
-kinesis_client = boto3.client('kinesis')
+# The producer and wire format are shared with the pages and the handlers
+# through the Lambda layer
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'layer' / 'python'))
+import aws_clients  # noqa: E402
+from kinesis_producer import KinesisProducer  # noqa: E402
+import wire_format  # noqa: E402
 
-# Write a method to simulate temperature, humidity and air quality index
+# Records are generated in ticks of this many seconds
+TICK = 0.1
+# GetRecords may be called at most 5 times per second per shard
+POLL_INTERVAL = 0.2
 
 
-def generate_data(probability):
+def generate_data(probability, sensor_id=0):
 
     temperature = random.randint(0, 30)
     humidity = random.randint(40, 59)
@@ -23,44 +51,246 @@ def generate_data(probability):
         air_quality_index = random.randint(101, 200)
 
     data = {
+        'sensor_id': sensor_id,
         'temperature': temperature,
         'humidity': humidity,
         'air_quality_index': air_quality_index,
         'timestamp': int(time.time())
     }
 
-    return json.dumps(data)
+    return data
 
 
-def send_data_to_kinesis(stream_name, data):
+def generate_activity(room_id):
+    return {
+        'room_id': room_id,
+        'headcount': random.randint(0, 20),
+        'timestamp': int(time.time()),
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.put_latencies = []
+        self.lags = []
+        # Records acknowledged but not yet read back, and the other way round
+        self.acked = {}
+        self.received = {}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counts[name] += value
+
+    def ack(self, key, generated_at, latency, readings):
+        with self.lock:
+            self.counts['sent'] += 1
+            self.counts['readings'] += readings
+            self.put_latencies.append(latency)
+            if key in self.received:
+                self.lags.append(self.received.pop(key) - generated_at)
+            else:
+                self.acked[key] = generated_at
+
+    def receive(self, key, received_at):
+        with self.lock:
+            self.counts['received'] += 1
+            if key in self.acked:
+                self.lags.append(received_at - self.acked.pop(key))
+            else:
+                self.received[key] = received_at
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.counts), list(self.lags)
 
-    # Put simulated data into Kinesis stream
-    response = kinesis_client.put_record(
-        StreamName=stream_name,
-        Data=data,
-        PartitionKey='partition_key'
-    )
 
-    print(response)
-    print(f"Data sent to Kinesis. ShardId: {response['ShardId']}, SequenceNumber: {response['SequenceNumber']}, Data: {data}")
+class Consumer(threading.Thread):
+    def __init__(self, client, stream_name, stats, deliver=None):
+        """
+        :param deliver: callable, handles the payloads read back before the
+            lag is taken, as the Lambda consumer would
+        """
+        super().__init__(daemon=True)
+        self.client = client
+        self.stream_name = stream_name
+        self.stats = stats
+        self.deliver = deliver
+        self.stopped = threading.Event()
+        shards = client.list_shards(StreamName=stream_name)['Shards']
+        self.iterators = {
+            shard['ShardId']: client.get_shard_iterator(
+                StreamName=stream_name,
+                ShardId=shard['ShardId'],
+                ShardIteratorType='LATEST',
+            )['ShardIterator']
+            for shard in shards
+        }
 
+    def run(self):
+        while not self.stopped.is_set():
+            for (shard, iterator) in self.iterators.items():
+                response = self.client.get_records(ShardIterator=iterator, Limit=10000)
+                self.iterators[shard] = response['NextShardIterator']
+                records = response['Records']
+                if not records:
+                    continue
+                if self.deliver is not None:
+                    self.deliver([record['Data'] for record in records])
+                received_at = time.time()
+                for record in records:
+                    self.stats.receive((self.stream_name, shard, record['SequenceNumber']), received_at)
+            self.stopped.wait(POLL_INTERVAL)
 
-def simulate_data_for_duration(stream_name, duration_minutes, probability):
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def local_streams(shards):
+    """
+    In-process Kinesis stand-ins whose consumers drive the handlers of the
+    monitor_sensors and detect_activities Lambda functions.
+    """
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'bench'))
+    from standins import FakeKinesis, install, kinesis_event, load_lambda
+
+    clients, handlers = {}, {}
+    for (stream_name, name) in [('SensorKinesisStream', 'monitor_sensors'),
+                                ('ActivityKinesisStream', 'detect_activities')]:
+        module = load_lambda(name)
+        install(module)
+        clients[stream_name] = FakeKinesis(shards)
+        handlers[stream_name] = lambda data, module=module: module.lambda_handler(kinesis_event(data), None)
+    return clients, handlers
+
+
+def report(stats, producers, elapsed, target_rate):
+    counts, lags = stats.snapshot()
+    for producer in producers:
+        counts.update(producer.counts)
+    print(f"{elapsed:7.1f} s  {counts['readings'] / elapsed:9.0f} readings/s (target {target_rate:.0f})  "
+          f"{counts['sent'] / elapsed:9.0f} records/s  {counts['bytes_sent'] / max(counts['readings'], 1):5.1f} B/reading  "
+          f"{counts['put_records']:6d} PutRecords  {counts['throttled']:6d} throttled  "
+          f"{counts['failed']:4d} failed  lag p50 {1000 * percentile(lags, 50):7.1f} ms  "
+          f"p95 {1000 * percentile(lags, 95):7.1f} ms  p99 {1000 * percentile(lags, 99):7.1f} ms")
+
+
+def simulate_data_for_duration(stream_name, duration_minutes, probability, sensors=1, rooms=0,
+                               rate=1.0, activity_stream_name=None, workers=8, endpoint_url=None,
+                               local=False, shards=1, report_interval=5.0, wire_format_name='binary',
+                               record_bytes=25 << 10, linger_seconds=0.5):
+    """
+    Publish readings of every sensor and headcounts of every room at the
+    given rate until the duration is over, then wait for the records in
+    flight to be read back and print the throughput and lag.
+    :param rate: float, the readings per second of every sensor and room
+    :param wire_format_name: str, 'binary' or 'json'
+    :param record_bytes: int, the size budget of an aggregated record
+    :param linger_seconds: float, the latency budget of a reading
+    """
+    if local:
+        clients, handlers = local_streams(shards)
+        stream_name, activity_stream_name = 'SensorKinesisStream', 'ActivityKinesisStream'
+    else:
+        client = aws_clients.client('kinesis', endpoint_url=endpoint_url)
+        clients = {stream_name: client, activity_stream_name: client}
+        handlers = {}
+
+    stats = Stats()
+    streams = [(stream_name, sensors, 'sensor', lambda i: generate_data(probability, i))]
+    if rooms and activity_stream_name:
+        streams.append((activity_stream_name, rooms, 'room', generate_activity))
+    kinds = {'sensor': wire_format.SENSOR, 'room': wire_format.ACTIVITY}
+
+    def acknowledge(name):
+        def on_record(result, put_at, readings):
+            stats.ack((name, result['ShardId'], result['SequenceNumber']), put_at, time.time() - put_at, readings)
+        return on_record
+
+    producers = {
+        name: KinesisProducer(
+            clients[name], name, None if wire_format_name == 'json' else kinds[prefix],
+            record_bytes=record_bytes, linger_seconds=linger_seconds, workers=workers,
+            on_record=acknowledge(name),
+        )
+        for (name, _, prefix, _) in streams
+    }
+    consumers = [Consumer(clients[name], name, stats, handlers.get(name)) for (name, *_) in streams]
+    for consumer in consumers:
+        consumer.start()
+
+    target_rate = rate * sum(count for (_, count, _, _) in streams)
     start_time = time.time()
     end_time = start_time + (duration_minutes * 60)
-
+    next_tick = next_report = start_time
+    owed = {name: 0.0 for (name, *_) in streams}
+    cursor = {name: 0 for (name, *_) in streams}
     while time.time() < end_time:
-        simulated_data = generate_data(probability)
-        send_data_to_kinesis(stream_name, simulated_data)
-        time.sleep(1)
+        for (name, count, prefix, generate) in streams:
+            # Carry the fractional readings over to the next tick
+            owed[name] += rate * count * TICK
+            for _ in range(int(owed[name])):
+                i = cursor[name] = (cursor[name] + 1) % count
+                producers[name].put(generate(i), f'{prefix}-{i}')
+                owed[name] -= 1
+
+        if time.time() >= next_report:
+            if next_report > start_time:
+                report(stats, producers.values(), time.time() - start_time, target_rate)
+            next_report += report_interval
+        next_tick += TICK
+        time.sleep(max(next_tick - time.time(), 0))
+    for producer in producers.values():
+        producer.close()
+
+    # Wait for the records in flight to be read back
+    drain_deadline = time.time() + 10
+    while stats.snapshot()[0]['received'] < stats.snapshot()[0]['sent'] and time.time() < drain_deadline:
+        time.sleep(POLL_INTERVAL)
+    for consumer in consumers:
+        consumer.stop()
+    report(stats, producers.values(), time.time() - start_time, target_rate)
+    counts, _ = stats.snapshot()
+    if counts['received'] < counts['sent']:
+        print(f"{counts['sent'] - counts['received']} records were not read back")
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Simulate data and send it to Kinesis.")
-    parser.add_argument("--stream_name", required=True, help="Name of the Kinesis stream.")
-    parser.add_argument("--duration_minutes", type=int, required=True, help="Duration of the simulation in minutes.")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stream_name", help="Name of the sensor Kinesis stream.")
+    parser.add_argument("--duration_minutes", type=float, required=True, help="Duration of the simulation in minutes.")
     parser.add_argument("--probability", type=float, required=True, help="Probability of occasionally generate higher values for temperature, humidity, air quality index")
+    parser.add_argument("--sensors", type=int, default=1, help="Number of simulated sensors.")
+    parser.add_argument("--rooms", type=int, default=0, help="Number of simulated rooms publishing headcounts.")
+    parser.add_argument("--activity_stream_name", help="Name of the activity Kinesis stream, required with --rooms.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Readings per second of every sensor and room.")
+    parser.add_argument("--wire_format", choices=["binary", "json"], default="binary", help="Encoding of the readings.")
+    parser.add_argument("--record_bytes", type=int, default=25 << 10, help="Size budget of an aggregated record.")
+    parser.add_argument("--linger_seconds", type=float, default=0.5, help="Latency budget of a reading.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent PutRecords calls.")
+    parser.add_argument("--endpoint_url", help="Kinesis endpoint, e.g. of a local kinesalite or LocalStack.")
+    parser.add_argument("--local", action="store_true", help="Use in-process stand-ins and handlers instead of AWS.")
+    parser.add_argument("--shards", type=int, default=1, help="Shards of every stream with --local.")
+    parser.add_argument("--report_interval", type=float, default=5.0, help="Seconds between progress reports.")
 
     args = parser.parse_args()
+    if not args.local and args.stream_name is None:
+        parser.error("--stream_name is required unless --local is given")
 
-    simulate_data_for_duration(args.stream_name, args.duration_minutes, args.probability)
+    simulate_data_for_duration(
+        args.stream_name, args.duration_minutes, args.probability,
+        sensors=args.sensors, rooms=args.rooms, rate=args.rate,
+        activity_stream_name=args.activity_stream_name, workers=args.workers,
+        endpoint_url=args.endpoint_url, local=args.local, shards=args.shards,
+        report_interval=args.report_interval, wire_format_name=args.wire_format,
+        record_bytes=args.record_bytes, linger_seconds=args.linger_seconds,
+    )